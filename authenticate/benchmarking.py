@@ -0,0 +1,379 @@
+"""
+This file contains the helpers used by the benchmark management commands.
+It seeds a synthetic set of books (chart of accounts, journal entries, General Ledger, rollup and event log)
+and users at a configurable scale, using bulk inserts so a million entries can be loaded in a few minutes,
+and measures the latency and query count of the site's pages through the test client.
+
+Only run these against a scratch database: seeding adds thousands of rows to the configured database.
+"""
+
+import gc
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, reset_queries, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import (
+    ChartOfAccounts,
+    CoAEventLog,
+    CustomUser,
+    GeneralLedger,
+    JournalEntry,
+    JournalEntryGroup,
+)
+
+# (account name, category, normal side) for the synthetic chart of accounts
+BENCHMARK_ACCOUNTS = [
+    ("Cash", "Assets", "Left"),
+    ("Accounts Receivable", "Assets", "Left"),
+    ("Inventory", "Assets", "Left"),
+    ("Prepaid Expenses", "Assets", "Left"),
+    ("Accounts Payable", "Liabilities", "Right"),
+    ("Unearned Revenue", "Liabilities", "Right"),
+    ("Accrued Expense", "Liabilities", "Right"),
+    ("Common Stock", "Equity", "Right"),
+    ("Dividends", "Equity", "Left"),
+    ("Service Revenue", "Revenue", "Right"),
+    ("Interest Revenue", "Revenue", "Right"),
+    ("Net Sales", "Revenue", "Right"),
+    ("Supplies Expense", "Expenses", "Left"),
+    ("Salaries Expense", "Expenses", "Left"),
+    ("Utilities Expense", "Expenses", "Left"),
+    ("Cost of Goods Sold", "Expenses", "Left"),
+]
+
+# The statement lines the synthetic accounts are classified on (see AccountClassification)
+BENCHMARK_LINES = {
+    "Cash": ["ratio_cash"],
+    "Inventory": ["ratio_inventory"],
+    "Prepaid Expenses": ["income_expense"],
+    "Unearned Revenue": ["income_revenue"],
+    "Accrued Expense": ["income_expense"],
+    "Dividends": ["retained_dividends"],
+    "Service Revenue": ["retained_revenue"],
+    "Interest Revenue": ["retained_revenue"],
+    "Net Sales": ["ratio_net_sales"],
+    "Supplies Expense": ["retained_expense"],
+    "Salaries Expense": ["retained_expense"],
+    "Utilities Expense": ["retained_expense"],
+    "Cost of Goods Sold": ["ratio_cost_of_goods_sold"],
+}
+
+BENCHMARK_USERNAME = "benchmark"
+
+
+def get_benchmark_user():
+    """
+    Returns the staff user the seeded rows belong to, creating it the first time.
+    """
+    user, created = CustomUser.objects.get_or_create(
+        username=BENCHMARK_USERNAME,
+        defaults={"email": "benchmark@example.com", "is_staff": True},
+    )
+    if created:
+        user.set_password(BENCHMARK_USERNAME)
+        user.save()
+    return user
+
+
+def seed_books(
+    entries, pending_ratio=0.1, days=730, batch_size=5000, seed=0, stdout=None
+):
+    """
+    Seeds a synthetic set of books with the given number of journal entries (two lines per group).
+
+    Parameters:
+        entries (int): The number of JournalEntry rows to create.
+        pending_ratio (float): The share of groups left pending; the rest are approved and posted.
+        days (int): The number of days, ending today, the entries are spread over.
+        batch_size (int): The number of rows per bulk insert.
+        seed (int): The random seed, so runs are reproducible.
+        stdout (OutputWrapper): Where to write progress, usually the command's stdout.
+
+    Returns:
+        CustomUser: The user that owns the seeded data.
+    """
+    rng = random.Random(seed)
+    user = get_benchmark_user()
+
+    accounts = []
+    for number, (name, category, side) in enumerate(BENCHMARK_ACCOUNTS, start=90100):
+        account, created = ChartOfAccounts.objects.get_or_create(
+            account_name=name,
+            defaults={
+                "account_number": number,
+                "account_description": f"Benchmark {name} account",
+                "normal_side": side,
+                "account_category": category,
+                "account_subcategory": category,
+                "initial_balance": 0,
+                "debit": 0,
+                "credit": 0,
+                "balance": 0,
+                "user_id": user,
+                "order": str(number),
+                "statement": (
+                    "BS" if category in ("Assets", "Liabilities", "Equity") else "IS"
+                ),
+                "comment": "",
+            },
+        )
+        if created:
+            account.set_statement_lines(BENCHMARK_LINES.get(name, []))
+        accounts.append(account)
+    left = [account for account in accounts if account.normal_side == "Left"]
+    right = [account for account in accounts if account.normal_side == "Right"]
+    first_day = date.today() - timedelta(days=days)
+
+    groups_total = entries // 2
+    created = 0
+    while created < groups_total:
+        count = min(batch_size, groups_total - created)
+        with transaction.atomic():
+            groups = JournalEntryGroup.objects.bulk_create(
+                JournalEntryGroup() for _ in range(count)
+            )
+            journal_rows = []
+            for group in groups:
+                amount = Decimal(rng.randint(100, 10000)) / 100
+                day = first_day + timedelta(days=rng.randint(0, days))
+                status = "Pending" if rng.random() < pending_ratio else "Approved"
+                journal_rows.append(
+                    JournalEntry(
+                        group=group,
+                        account=rng.choice(left),
+                        debit=amount,
+                        date=day,
+                        status=status,
+                    )
+                )
+                journal_rows.append(
+                    JournalEntry(
+                        group=group,
+                        account=rng.choice(right),
+                        credit=amount,
+                        date=day,
+                        status=status,
+                    )
+                )
+            journal_rows = JournalEntry.objects.bulk_create(journal_rows)
+            GeneralLedger.objects.bulk_create(
+                GeneralLedger(
+                    account_id=entry.account_id,
+                    journal_entry=entry,
+                    date_of_journal_entry=entry.date,
+                    description=f"Approved Journal Entry: {entry.pk}",
+                    debit=entry.debit,
+                    credit=entry.credit,
+                    balance=0,
+                )
+                for entry in journal_rows
+                if entry.status == "Approved"
+            )
+        created += count
+        if stdout:
+            stdout.write(f"Seeded {created * 2} of {entries} journal entries.")
+
+    # A few modifications per account for the event log
+    events = []
+    for account in accounts:
+        state = CoAEventLog.snapshot_of(account)
+        for number in range(50):
+            before, state = state, dict(state, comment=f"Benchmark change {number + 1}")
+            events.append((account, "modified", user, before, state))
+        account.log_events += 50
+    CoAEventLog.record_many(events)
+
+    # Bring the account totals, running balances and rollup in line with the seeded ledger
+    for account in accounts:
+        totals = GeneralLedger.objects.filter(account=account).aggregate(
+            debit=Sum("debit"), credit=Sum("credit")
+        )
+        ChartOfAccounts.objects.filter(pk=account.pk).update(
+            debit=totals["debit"] or 0,
+            credit=totals["credit"] or 0,
+            balance=account.initial_balance
+            + (totals["debit"] or 0)
+            - (totals["credit"] or 0),
+            log_events=account.log_events,
+        )
+    call_command("rebuild_ledger_balances", stdout=stdout)
+    call_command("rebuild_account_balances", stdout=stdout)
+    return user
+
+
+def seed_users(count, batch_size=5000):
+    """
+    Seeds the given number of active users (named benchmark_user_<n>), skipping the ones that already exist.
+    They all share one password hash, so seeding does not spend its time hashing.
+    """
+    password = make_password(BENCHMARK_USERNAME)
+    CustomUser.objects.bulk_create(
+        (
+            CustomUser(
+                username=f"benchmark_user_{number}",
+                email=f"benchmark_user_{number}@example.com",
+                password=password,
+            )
+            for number in range(count)
+        ),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+# The named routes of authenticate/urls.py that are benchmarked, with the GET parameters each one is requested with.
+# Routes taking an id are given the id of a seeded row (see benchmark_requests).
+BENCHMARK_ROUTES = {
+    "login": {},
+    "register": {},
+    "forgot_password": {},
+    "question": {},
+    "reset_password": {},
+    "home": {},
+    "help": {},
+    "chart_of_accounts": {},
+    "add_account": {},
+    "edit_account": {},
+    "ledger": {},
+    "view_coa_logs": {},
+    "journal_entry_page": {},
+    "add_journal_entry": {},
+    "import_journal_entries": {},
+    "entry_details": {},
+    "trial_balance": {"period_days": 365},
+    "income_statement": {"period_days": 365},
+    "balance_sheet": {"period_days": 365},
+    "retained_earnings": {"period_days": 365},
+    "comparative_statements": {"statement": "income_statement", "period_days": 365},
+    "export_to_pdf": {"statement": "balance_sheet", "period_days": 365},
+    "export_journal_entries": {"period_days": 30},
+    "export_general_ledger": {"period_days": 30},
+    "profiling_stats": {},
+}
+
+# The named routes that are not benchmarked: they change data, send email or need a one-off token.
+# "contact" points at the email() helper, which needs more arguments than the URL provides.
+SKIPPED_ROUTES = {
+    "contact",
+    "logout",
+    "send_email",
+    "activate",
+    "deactivate_account",
+    "activate_account",
+    "addComment",
+    "email_report",
+    "report_job",
+}
+
+
+def benchmark_requests():
+    """
+    Returns the (route name, path, GET parameters) of every benchmarked route, resolved against the seeded data.
+    A "period_days" parameter is turned into a start_date/end_date range ending today.
+    """
+    cash = ChartOfAccounts.objects.get(account_name="Cash")
+    entry = JournalEntry.objects.order_by("id").first()
+    route_kwargs = {
+        "edit_account": {"account_id": cash.pk},
+        "ledger": {"account_id": cash.pk},
+        "entry_details": {"entry_id": entry.pk if entry else 0},
+    }
+
+    requests = []
+    for name, params in BENCHMARK_ROUTES.items():
+        params = dict(params)
+        period_days = params.pop("period_days", None)
+        if period_days:
+            params["end_date"] = date.today().isoformat()
+            params["start_date"] = (
+                date.today() - timedelta(days=period_days)
+            ).isoformat()
+        requests.append((name, reverse(name, kwargs=route_kwargs.get(name)), params))
+    return requests
+
+
+def percentile(values, percent):
+    """
+    Returns the given percentile (0-100) of the values, interpolating between the closest two.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def measure(client, path, params, repeat):
+    """
+    Requests a page repeat times (after one warm-up request) and returns its status code, query count and latency.
+    Streamed responses are read to the end, so the latency covers the whole download.
+    """
+    timings = []
+    query_counts = []
+    # The garbage collector is paused while timing, like timeit does, so a collection of garbage left by other
+    # routes (or by seeding) does not land on a random request of this one
+    gc.collect()
+    gc.disable()
+    try:
+        for run in range(repeat + 1):
+            # The query log holds at most 9000 queries, so it is emptied before each request to keep the count exact
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(path, params)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                elapsed = time.perf_counter() - started
+            if run:
+                timings.append(elapsed * 1000)
+                query_counts.append(len(queries))
+    finally:
+        gc.enable()
+    return {
+        "path": path,
+        "status": response.status_code,
+        "queries": max(query_counts),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+    }
+
+
+def find_regressions(results, baseline, tolerance=1.5, min_delta_ms=5):
+    """
+    Compares a benchmark run with a baseline run and returns a description of every regression.
+
+    A route regresses if it runs more queries than in the baseline, if its status code changed, or if its p95 latency
+    is both tolerance times and min_delta_ms milliseconds slower than in the baseline (so noise on very fast pages is ignored).
+    """
+    regressions = []
+    for name, before in baseline["routes"].items():
+        after = results["routes"].get(name)
+        if after is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        if after["status"] != before["status"]:
+            regressions.append(
+                f"{name}: status {before['status']} -> {after['status']}"
+            )
+        if after["queries"] > before["queries"]:
+            regressions.append(
+                f"{name}: {before['queries']} -> {after['queries']} queries"
+            )
+        if (
+            after["p95_ms"] > before["p95_ms"] * tolerance
+            and after["p95_ms"] - before["p95_ms"] > min_delta_ms
+        ):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']}ms -> {after['p95_ms']}ms"
+            )
+    return regressions
@@ -0,0 +1,120 @@
+"""
+This file contains the streaming exports of the journal and the General Ledger.
+Rows are read with values_list() and iterator(chunk_size=...), so no model instances are built and
+memory stays flat however many rows are exported.
+"""
+
+import csv
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from .models import GeneralLedger, JournalEntry
+from .reporting import filter_date_range, filter_journal
+
+EXPORT_CHUNK_SIZE = 2000
+
+JOURNAL_COLUMNS = [
+    ("id", "Entry ID"),
+    ("group_id", "Group ID"),
+    ("date", "Date"),
+    ("account__account_number", "Account Number"),
+    ("account__account_name", "Account Name"),
+    ("debit", "Debit"),
+    ("credit", "Credit"),
+    ("status", "Status"),
+    ("comments", "Comments"),
+]
+
+LEDGER_COLUMNS = [
+    ("id", "Ledger ID"),
+    ("journal_entry_id", "Entry ID"),
+    ("date_of_journal_entry", "Date"),
+    ("account__account_number", "Account Number"),
+    ("account__account_name", "Account Name"),
+    ("description", "Description"),
+    ("debit", "Debit"),
+    ("credit", "Credit"),
+    ("balance", "Balance"),
+]
+
+
+def journal_export(start_date=None, end_date=None, account_id=None, status=None):
+    """
+    Returns the header and the row iterator for a journal entry export.
+    """
+    entries = filter_journal(
+        JournalEntry.objects.all(), start_date, end_date, account_id, status
+    ).order_by("date", "id")
+    return export_rows(entries, JOURNAL_COLUMNS)
+
+
+def ledger_export(start_date=None, end_date=None, account_id=None):
+    """
+    Returns the header and the row iterator for a General Ledger export.
+    """
+    rows = filter_date_range(
+        GeneralLedger.objects.all(), start_date, end_date, "date_of_journal_entry"
+    )
+    if account_id:
+        rows = rows.filter(account_id=account_id)
+    rows = rows.order_by("account_id", "date_of_journal_entry", "id")
+    return export_rows(rows, LEDGER_COLUMNS)
+
+
+def export_rows(queryset, columns):
+    """
+    Returns the column headers and a lazy iterator of value tuples, read in chunks from the database.
+    """
+    header = [label for field, label in columns]
+    rows = queryset.values_list(*[field for field, label in columns]).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    return header, rows
+
+
+class Echo:
+    """
+    A file-like object that hands back what is written to it instead of storing it,
+    so csv.writer can produce one line at a time for a StreamingHttpResponse.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    """
+    Yields the CSV lines for the header and rows, one at a time.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(header, rows, sheet_name="Export"):
+    """
+    Writes the rows to an XLSX file and returns the open temporary file, ready to be streamed.
+
+    This needs the optional XlsxWriter package and raises ImportError without it. Its constant_memory mode
+    flushes each row to disk once it is written, so memory stays flat while the rows arrive in chunks from the database.
+    """
+    import xlsxwriter
+
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    worksheet = workbook.add_worksheet(sheet_name)
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    worksheet.write_row(0, 0, header)
+    for row_number, row in enumerate(rows, start=1):
+        for column, value in enumerate(row):
+            if isinstance(value, Decimal):
+                worksheet.write_number(row_number, column, float(value))
+            elif isinstance(value, date):
+                worksheet.write_datetime(row_number, column, value, date_format)
+            else:
+                worksheet.write(row_number, column, value)
+    workbook.close()
+    output.seek(0)
+    return output
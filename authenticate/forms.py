@@ -2,7 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta
-from .models import ChartOfAccounts, JournalEntry
+from .models import AccountClassification, ChartOfAccounts, CoAEventLog, JournalEntry
 from django.contrib import admin
 
 User = get_user_model()
@@ -173,6 +173,7 @@ class ChartOfAccountForm(forms.ModelForm):
 
     If we need to remove a field from the table then we can use the exclude attribute and specify the field name like the user_id field in this case.
 
+    The statement lines field sets where the account shows up in the financial statements and ratios (see AccountClassification).
     """
 
     CATEGORY_CHOICES = [
@@ -193,6 +194,12 @@ class ChartOfAccountForm(forms.ModelForm):
     credit = forms.DecimalField(initial=0)
     balance = forms.DecimalField(initial=0)
     is_active = forms.BooleanField(required=False)
+    statement_lines = forms.MultipleChoiceField(
+        choices=AccountClassification.LINE_CHOICES,
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+        help_text="The statement and ratio lines this account is included in.",
+    )
 
     class Meta:
         model = ChartOfAccounts
@@ -205,8 +212,18 @@ class ChartOfAccountForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for _, field in self.fields.items():
-            if not isinstance(field, forms.BooleanField):
+            if not isinstance(field, (forms.BooleanField, forms.MultipleChoiceField)):
                 field.widget.attrs["class"] = "form-control"
+        if self.instance.pk:
+            self.initial["statement_lines"] = list(
+                self.instance.classifications.values_list("line", flat=True)
+            )
+
+    def save(self, commit=True):
+        account = super().save(commit)
+        if commit:
+            account.set_statement_lines(self.cleaned_data["statement_lines"])
+        return account
 
 
 class JournalEntryForm(forms.ModelForm):
@@ -249,3 +266,69 @@ class ContactFormAdmin(forms.Form):
         # This is where we access the database to get the user choices
         self.fields['To'].choices = [(user.email, user.email) for user in User.objects.filter(is_active=True)]
 
+
+
+class JournalFilterForm(forms.Form):
+    """
+    The filters of the journal entry list. Every field is optional.
+
+    Attributes:
+    status (ChoiceField): Only show entries with this status.
+    start_date (DateField): Only show entries on or after this date.
+    end_date (DateField): Only show entries on or before this date.
+    account (ModelChoiceField): Only show entries posted to this account.
+    """
+
+    # Rejected entries are stored with the status "Rejected" by the journal entry page
+    STATUS_CHOICES = [("", "All statuses")] + list(JournalEntry.STATUS_CHOICES) + [("Rejected", "Rejected")]
+
+    status = forms.ChoiceField(choices=STATUS_CHOICES, required=False)
+    start_date = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    end_date = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    account = forms.ModelChoiceField(
+        queryset=ChartOfAccounts.objects.order_by("account_name"),
+        required=False,
+        empty_label="All accounts",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for _, field in self.fields.items():
+            field.widget.attrs["class"] = "form-control"
+
+
+class JournalImportForm(forms.Form):
+    """
+    The upload form of the journal import page.
+
+    Attributes:
+    file (FileField): The CSV file of journal entries, with the columns group, date, account, debit, credit and comments.
+    """
+
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv"}))
+
+
+class CoALogFilterForm(forms.Form):
+    """
+    The filters of the Chart of Accounts event log. Every field is optional.
+
+    Attributes:
+    account (ModelChoiceField): Only show events of this account.
+    action (ChoiceField): Only show events with this action.
+    start_date (DateField): Only show events on or after this date.
+    end_date (DateField): Only show events on or before this date.
+    """
+
+    account = forms.ModelChoiceField(
+        queryset=ChartOfAccounts.objects.order_by("account_name"),
+        required=False,
+        empty_label="All accounts",
+    )
+    action = forms.ChoiceField(choices=[("", "All actions")] + CoAEventLog.ACTION_CHOICES, required=False)
+    start_date = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    end_date = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for _, field in self.fields.items():
+            field.widget.attrs["class"] = "form-control"
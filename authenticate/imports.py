@@ -0,0 +1,221 @@
+"""
+This file contains the bulk journal import from CSV files, used by the import_journal management command
+and the staff upload page.
+
+The file is read one row at a time. The rows of a group are checked as soon as the group ends, against the
+account names of the Chart of Accounts registry, and the valid groups are written with bulk_create in chunked
+transactions. Memory stays flat however long the file is, and a bad group only rejects its own rows.
+"""
+
+import csv
+from decimal import Decimal, InvalidOperation
+from itertools import groupby
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .models import JournalEntry, JournalEntryGroup
+from .posting import line_error
+from .registry import get_registry
+
+# The columns of an import file. Rows with the same group value make one journal entry and must be next to each other.
+IMPORT_COLUMNS = ["group", "date", "account", "debit", "credit", "comments"]
+REQUIRED_COLUMNS = {"group", "date", "account", "debit", "credit"}
+
+# Number of journal entry lines written per transaction
+IMPORT_BATCH_SIZE = 5000
+
+# Number of rejected rows listed on the upload page; the full list can be very long
+IMPORT_REJECTS_SHOWN = 100
+
+# The largest amount the JournalEntry debit and credit columns can hold (10 digits, 2 of them decimals)
+MAX_AMOUNT = Decimal("99999999.99")
+
+
+class ImportReport:
+    """
+    The outcome of an import: how many groups and lines were written, and the rejected rows
+    as (row number, group, reason) tuples. Row numbers count the header as row 1, like a spreadsheet.
+    """
+
+    def __init__(self):
+        self.groups = 0
+        self.lines = 0
+        self.rejected = []
+
+
+def parse_amount(value):
+    """
+    Reads a debit or credit cell. An empty cell is 0.
+
+    Raises:
+        ValueError: If the cell is not an amount the journal can store.
+    """
+    try:
+        amount = Decimal(value.strip() or "0")
+    except InvalidOperation:
+        raise ValueError(f"has an invalid amount {value!r}")
+    if not amount.is_finite() or amount.as_tuple().exponent < -2:
+        raise ValueError(f"has an invalid amount {value!r}")
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError(f"has an amount larger than {MAX_AMOUNT}")
+    return amount
+
+
+def read_row(row, accounts):
+    """
+    Turns one CSV row into an unsaved JournalEntry (without its group).
+
+    Raises:
+        ValueError: With the reason, if the row cannot be posted.
+    """
+    account_name = (row.get("account") or "").strip()
+    try:
+        entry_date = parse_date((row.get("date") or "").strip())
+    except ValueError:
+        entry_date = None
+    line = {
+        "account_name": account_name,
+        "debit": parse_amount(row.get("debit") or ""),
+        "credit": parse_amount(row.get("credit") or ""),
+        "date": entry_date,
+    }
+    error = line_error(line)
+    if error:
+        raise ValueError(error)
+    if account_name not in accounts:
+        raise ValueError(f"has an account not in the Chart of Accounts: {account_name}")
+    return JournalEntry(
+        account_id=accounts[account_name].id,
+        debit=line["debit"],
+        credit=line["credit"],
+        date=line["date"],
+        comments=(row.get("comments") or "").strip() or None,
+        status="Pending",
+    )
+
+
+def check_group(key, rows, accounts):
+    """
+    Checks the rows of one group.
+
+    Parameters:
+        key (str): The group value shared by the rows.
+        rows (list): (row number, CSV row) tuples.
+        accounts (dict): The registry accounts keyed by name (see registry.py).
+
+    Returns:
+        tuple: The unsaved JournalEntry lines (None if the group is rejected) and the rejected rows.
+    """
+    lines, rejected = [], []
+    for row_number, row in rows:
+        try:
+            lines.append(read_row(row, accounts))
+        except ValueError as error:
+            rejected.append((row_number, key, f"Row {error}."))
+    if rejected:
+        # One bad row rejects the whole group, so the rest of its rows are reported too
+        rejected_numbers = {row_number for row_number, *rest in rejected}
+        rejected += [
+            (row_number, key, "Another row of the group was rejected.")
+            for row_number, row in rows
+            if row_number not in rejected_numbers
+        ]
+        return None, sorted(rejected)
+
+    if len(lines) < 2:
+        reason = "A journal entry needs at least two lines."
+    else:
+        total_debit = sum(line.debit for line in lines)
+        total_credit = sum(line.credit for line in lines)
+        if total_debit == total_credit:
+            return lines, []
+        reason = (
+            f"The group does not balance: debits {total_debit}, credits {total_credit}."
+        )
+    return None, [(row_number, key, reason) for row_number, row in rows]
+
+
+def write_groups(groups):
+    """
+    Writes a batch of checked groups in one transaction: one bulk insert for the groups and one for their lines.
+    The lines are pending, which no cached report or ratio reads, so the ledger version is left alone.
+    """
+    with transaction.atomic():
+        created = JournalEntryGroup.objects.bulk_create(
+            [JournalEntryGroup() for lines in groups]
+        )
+        if created and created[0].pk is None:
+            # Databases that cannot return the ids of a bulk insert (MySQL) save the groups one by one
+            for group in created:
+                group.save()
+        entries = []
+        for group, lines in zip(created, groups):
+            for line in lines:
+                line.group = group
+                entries.append(line)
+        JournalEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def import_journal(csv_file, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports the journal entries of a CSV file (see IMPORT_COLUMNS) as pending entries.
+
+    Every group is checked on its own: its rows must each have a known account, a date and either a debit or a credit,
+    and its debits must equal its credits. Valid groups are written in transactions of about batch_size lines,
+    and rejected groups are reported row by row without stopping the import.
+
+    Parameters:
+        csv_file (file): A text file object opened with newline="".
+        batch_size (int): The number of lines written per transaction.
+
+    Returns:
+        ImportReport: The number of groups and lines written and the rejected rows.
+
+    Raises:
+        ValidationError: If the file does not have the required columns.
+    """
+    reader = csv.DictReader(csv_file)
+    missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+    if missing:
+        raise ValidationError(
+            "The file is missing the columns: " + ", ".join(sorted(missing))
+        )
+
+    accounts = get_registry().by_name
+    report = ImportReport()
+    pending, pending_lines = [], 0
+    seen = set()
+    rows = enumerate(reader, start=2)
+    for key, group_rows in groupby(
+        rows, key=lambda item: (item[1]["group"] or "").strip()
+    ):
+        group_rows = list(group_rows)
+        if not key:
+            reason = "Row has no group."
+            report.rejected += [(number, key, reason) for number, row in group_rows]
+            continue
+        if key in seen:
+            reason = "The rows of a group must be next to each other; this group appeared earlier in the file."
+            report.rejected += [(number, key, reason) for number, row in group_rows]
+            continue
+        seen.add(key)
+
+        lines, rejected = check_group(key, group_rows, accounts)
+        report.rejected += rejected
+        if lines is None:
+            continue
+        pending.append(lines)
+        pending_lines += len(lines)
+        if pending_lines >= batch_size:
+            write_groups(pending)
+            report.groups += len(pending)
+            report.lines += pending_lines
+            pending, pending_lines = [], 0
+
+    if pending:
+        write_groups(pending)
+        report.groups += len(pending)
+        report.lines += pending_lines
+    return report
@@ -0,0 +1,146 @@
+import json
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from authenticate import vectorized
+from authenticate.benchmarking import percentile, seed_books
+from authenticate.models import JournalEntry
+from authenticate.reporting import STATEMENT_CONTEXTS
+from authenticate.views import calculate_ratios
+
+# The reporting engines compared, by their REPORTING_ENGINE setting
+ENGINES = ["orm", "numpy"]
+
+
+def statement_runs():
+    """
+    Returns the reports timed for each engine, as (name, function) pairs: every statement over the whole books,
+    the last year and the last month, and the dashboard ratios.
+    """
+    today = date.today()
+    ranges = {
+        "all time": (None, None),
+        "last year": (today - timedelta(days=365), today),
+        "last month": (today - timedelta(days=30), today),
+    }
+    runs = []
+    for statement, build_context in STATEMENT_CONTEXTS.items():
+        for label, (start_date, end_date) in ranges.items():
+            runs.append(
+                (
+                    f"{statement} ({label})",
+                    lambda build=build_context, start=start_date, end=end_date: build(
+                        start, end
+                    ),
+                )
+            )
+    runs.append(("ratios", calculate_ratios))
+    return runs
+
+
+def in_cents(value):
+    """
+    Returns a report with every amount rounded to the cent, for comparing the engines. SQLite sums decimal
+    columns as floats, so the ORM engine can be off by a fraction of a cent where the NumPy engine is exact.
+    """
+    if isinstance(value, dict):
+        return {key: in_cents(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [in_cents(item) for item in value]
+    if isinstance(value, (Decimal, float)):
+        return round(Decimal(value), 2)
+    return value
+
+
+# section for comparing the speed and results of the ORM and NumPy reporting engines
+class Command(BaseCommand):
+    help = "Time every financial statement and the dashboard ratios with the ORM and the NumPy reporting engines, check they give the same numbers, and write the timings as JSON. Run on a scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            action="store_true",
+            help="Seed synthetic books first (writes to the configured database).",
+        )
+        parser.add_argument(
+            "--entries",
+            type=int,
+            default=1000000,
+            help="Number of journal entries to seed with --seed.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=10,
+            help="Number of timed runs per report and engine (after one warm-up run).",
+        )
+        parser.add_argument(
+            "--output",
+            default="reporting_engines.json",
+            help="File the results are written to as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed_books(options["entries"], stdout=self.stdout)
+        approved = JournalEntry.objects.filter(status="Approved").count()
+        if not approved:
+            raise CommandError("No approved journal entries. Run with --seed first.")
+
+        # Reading the extract is the cost the NumPy engine pays once per ledger version
+        started = time.perf_counter()
+        vectorized._extract = None
+        vectorized.get_extract()
+        extract_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.stdout.write(
+            f"Read {approved} approved entries into the NumPy extract in {extract_ms}ms."
+        )
+
+        reports, mismatches = {}, []
+        for name, run in statement_runs():
+            results, timings = {}, {}
+            for engine in ENGINES:
+                with override_settings(REPORTING_ENGINE=engine):
+                    results[engine] = run()
+                    durations = []
+                    for _ in range(options["repeat"]):
+                        started = time.perf_counter()
+                        run()
+                        durations.append((time.perf_counter() - started) * 1000)
+                timings[engine] = {
+                    "p50_ms": round(percentile(durations, 50), 2),
+                    "p95_ms": round(percentile(durations, 95), 2),
+                }
+            if in_cents(results["orm"]) != in_cents(results["numpy"]):
+                mismatches.append(name)
+            reports[name] = timings
+            speedup = timings["orm"]["p50_ms"] / max(timings["numpy"]["p50_ms"], 0.01)
+            self.stdout.write(
+                f"{name}: orm p50 {timings['orm']['p50_ms']}ms, numpy p50 {timings['numpy']['p50_ms']}ms ({speedup:.1f}x)"
+            )
+
+        with open(options["output"], "w") as output:
+            json.dump(
+                {
+                    "database": connection.vendor,
+                    "approved_entries": approved,
+                    "repeat": options["repeat"],
+                    "extract_ms": extract_ms,
+                    "reports": reports,
+                },
+                output,
+                indent=2,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Results written to {options['output']}.")
+        )
+
+        if mismatches:
+            raise CommandError(
+                "The engines gave different numbers for: " + ", ".join(mismatches)
+            )
+        self.stdout.write(self.style.SUCCESS("Both engines gave the same numbers."))
@@ -0,0 +1,145 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from authenticate import urls
+from authenticate.benchmarking import (
+    BENCHMARK_ROUTES,
+    SKIPPED_ROUTES,
+    benchmark_requests,
+    find_regressions,
+    get_benchmark_user,
+    measure,
+    seed_books,
+    seed_users,
+)
+from authenticate.models import ChartOfAccounts, JournalEntry
+
+
+# section for benchmarking the latency and query count of every page against a committed baseline
+class Command(BaseCommand):
+    help = "Request every named route through the test client, record p50/p95 latency and query counts as JSON, and fail on a regression against the baseline. Run on a scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            action="store_true",
+            help="Seed synthetic books and users first (writes to the configured database).",
+        )
+        parser.add_argument(
+            "--entries",
+            type=int,
+            default=10000,
+            help="Number of journal entries to seed with --seed (e.g. 10000, 100000 or 1000000).",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=100,
+            help="Number of users to seed with --seed.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of timed requests per route (after one warm-up request).",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark_results.json",
+            help="File the results are written to as JSON.",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json"),
+            help="Baseline results to compare with. The comparison is skipped if the file does not exist.",
+        )
+        parser.add_argument(
+            "--update-baseline",
+            action="store_true",
+            help="Write this run to the baseline file instead of comparing with it.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=1.5,
+            help="How many times slower than the baseline p95 a route may get before it counts as a regression.",
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed_books(options["entries"], stdout=self.stdout)
+            seed_users(options["users"])
+        if not ChartOfAccounts.objects.filter(account_name="Cash").exists():
+            raise CommandError("No Cash account found. Run with --seed first.")
+
+        # Routes added to urls.py must be benchmarked or skipped on purpose
+        names = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+        for name in sorted(names - set(BENCHMARK_ROUTES) - SKIPPED_ROUTES):
+            self.stdout.write(self.style.WARNING(f"Route {name} is not benchmarked."))
+
+        setup_test_environment()
+        try:
+            # A page that raises is recorded with its 500 status instead of stopping the run
+            client = Client(raise_request_exception=False)
+            client.force_login(get_benchmark_user())
+            routes = {}
+            for name, path, params in benchmark_requests():
+                routes[name] = measure(client, path, params, options["repeat"])
+                self.stdout.write(
+                    f"{name}: {routes[name]['queries']} queries, p50 {routes[name]['p50_ms']}ms, p95 {routes[name]['p95_ms']}ms"
+                )
+        finally:
+            teardown_test_environment()
+
+        results = {
+            "database": connection.vendor,
+            "journal_entries": JournalEntry.objects.count(),
+            "repeat": options["repeat"],
+            "routes": routes,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Results written to {options['output']}.")
+        )
+
+        if options["update_baseline"]:
+            os.makedirs(os.path.dirname(options["baseline"]) or ".", exist_ok=True)
+            with open(options["baseline"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(
+                self.style.SUCCESS(f"Baseline updated: {options['baseline']}.")
+            )
+            return
+
+        if not os.path.exists(options["baseline"]):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"No baseline at {options['baseline']}, nothing to compare with."
+                )
+            )
+            return
+        with open(options["baseline"]) as baseline_file:
+            baseline = json.load(baseline_file)
+        if (baseline["database"], baseline["journal_entries"]) != (
+            results["database"],
+            results["journal_entries"],
+        ):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"The baseline was recorded on {baseline['database']} with {baseline['journal_entries']} entries; "
+                    f"this run is on {results['database']} with {results['journal_entries']}."
+                )
+            )
+
+        regressions = find_regressions(results, baseline, options["tolerance"])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f"{len(regressions)} regressions against the baseline.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from authenticate.models import FiscalPeriod
+from authenticate.periods import close_period
+
+
+# section for closing a fiscal period (creating it first if needed)
+class Command(BaseCommand):
+    help = "Close a fiscal period: store every account's closing totals at its end date and lock the entries dated in it against approval."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "end", help="End date of the period (YYYY-MM-DD), e.g. 2024-12-31."
+        )
+        parser.add_argument(
+            "--start",
+            default="",
+            help="Start date of the period, needed when the period does not exist yet.",
+        )
+        parser.add_argument(
+            "--name",
+            default="",
+            help="Name of the period when it is created, e.g. FY2024. Defaults to the date range.",
+        )
+        parser.add_argument(
+            "--user",
+            default="",
+            help="Username recorded as closing the period.",
+        )
+
+    def handle(self, *args, **options):
+        end_date = parse_date(options["end"])
+        if end_date is None:
+            raise CommandError(f"{options['end']} is not a valid date.")
+
+        period = FiscalPeriod.objects.filter(end_date=end_date).first()
+        if period is None:
+            start_date = parse_date(options["start"] or "")
+            if start_date is None or start_date > end_date:
+                raise CommandError(
+                    "There is no period ending on that date; give a valid --start date to create it."
+                )
+            period = FiscalPeriod.objects.create(
+                name=options["name"] or f"{start_date} to {end_date}",
+                start_date=start_date,
+                end_date=end_date,
+            )
+            self.stdout.write(f"Created the period {period.name}.")
+
+        user = None
+        if options["user"]:
+            user = get_user_model().objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']}.")
+
+        try:
+            balances = close_period(period, user)
+        except ValidationError as error:
+            raise CommandError(" ".join(error.messages))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Closed {period.name}: stored the closing totals of {len(balances)} accounts. "
+                f"Entries dated on or before {period.end_date} can no longer be approved."
+            )
+        )
@@ -0,0 +1,147 @@
+import json
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from authenticate.benchmarking import BENCHMARK_ACCOUNTS, seed_books
+from authenticate.models import ChartOfAccounts, CoAEventLog
+
+
+def legacy_size(account_id, state):
+    """
+    Returns the size of one snapshot in the old format: serialize("json", [account]) of the full row.
+    """
+    if state is None:
+        return 0
+    return len(
+        json.dumps(
+            [
+                {
+                    "model": "authenticate.chartofaccounts",
+                    "pk": account_id,
+                    "fields": state,
+                }
+            ]
+        )
+    )
+
+
+# section for measuring the size of the Chart of Accounts event log, compared with the old two-snapshot format
+class Command(BaseCommand):
+    help = "Measure the size of the CoAEventLog table (diffs and checkpoints) against the size the old full before/after snapshots would take. Run on a scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--saves",
+            type=int,
+            default=0,
+            help="Number of account saves (like approvals) to make first, through the CoA signals.",
+        )
+        parser.add_argument(
+            "--output",
+            default="",
+            help="Also write the results to this file as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["saves"]:
+            self.make_saves(options["saves"])
+
+        results = self.measure()
+        for name, value in results.items():
+            self.stdout.write(f"{name}: {value}")
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"The log takes {results['stored_bytes']} bytes of JSON, against {results['legacy_bytes']} bytes "
+                f"in the old format ({results['reduction_percent']}% smaller)."
+            )
+        )
+
+    def make_saves(self, saves):
+        """
+        Saves the benchmark accounts the given number of times, changing their totals like an approval does.
+        """
+        names = [name for name, category, side in BENCHMARK_ACCOUNTS]
+        if not ChartOfAccounts.objects.filter(account_name__in=names).exists():
+            seed_books(0, stdout=self.stdout)
+        accounts = list(ChartOfAccounts.objects.filter(account_name__in=names))
+        rng = random.Random(0)
+        for _ in range(saves):
+            account = rng.choice(accounts)
+            amount = Decimal(rng.randint(100, 10000)) / 100
+            account.debit += amount
+            account.balance += amount
+            account.save()
+
+    def measure(self):
+        """
+        Returns the row counts and sizes of the event log.
+        The old format's size is worked out by replaying every account's history from its checkpoints.
+        """
+        rows = checkpoints = stored_bytes = legacy_bytes = 0
+        states = {}
+        logs = CoAEventLog.objects.order_by(
+            "chart_of_account_id", "timestamp", "id"
+        ).values_list("chart_of_account_id", "changes", "snapshot")
+        for account_id, changes, snapshot in logs.iterator(chunk_size=2000):
+            rows += 1
+            stored_bytes += len(json.dumps(changes))
+            if snapshot is not None:
+                checkpoints += 1
+                stored_bytes += len(json.dumps(snapshot))
+                after = dict(snapshot)
+                before = dict(snapshot)
+                for field, (old, new) in changes.items():
+                    before[field] = old
+                if all(old is None for old, new in changes.values()) and changes:
+                    before = None
+            else:
+                before = states.get(account_id)
+                after = dict(before or {})
+                for field, (old, new) in changes.items():
+                    after[field] = new
+            legacy_bytes += legacy_size(account_id, before) + legacy_size(
+                account_id, after
+            )
+            states[account_id] = after
+
+        results = {
+            "database": connection.vendor,
+            "rows": rows,
+            "checkpoints": checkpoints,
+            "stored_bytes": stored_bytes,
+            "legacy_bytes": legacy_bytes,
+            "reduction_percent": (
+                round(100 * (1 - stored_bytes / legacy_bytes), 1) if legacy_bytes else 0
+            ),
+        }
+        table_bytes = self.table_size()
+        if table_bytes is not None:
+            results["table_bytes"] = table_bytes
+        return results
+
+    def table_size(self):
+        """
+        Returns the size of the table on disk (with its indexes) where the database can tell, otherwise None.
+        """
+        table = CoAEventLog._meta.db_table
+        with connection.cursor() as cursor:
+            try:
+                if connection.vendor == "postgresql":
+                    cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+                elif connection.vendor == "sqlite":
+                    # dbstat is only there if SQLite was built with it
+                    cursor.execute(
+                        "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                        "(SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                        [table],
+                    )
+                else:
+                    return None
+            except Exception:
+                return None
+            return cursor.fetchone()[0]
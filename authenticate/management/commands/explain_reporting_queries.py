@@ -0,0 +1,145 @@
+import json
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from authenticate.benchmarking import seed_books
+from authenticate.models import (
+    AccountBalance,
+    ChartOfAccounts,
+    CoAEventLog,
+    GeneralLedger,
+    JournalEntry,
+)
+from authenticate.reporting import filter_date_range
+
+# The indexes added for the reporting hot paths, by model
+REPORTING_INDEXES = {
+    AccountBalance: ["account_balance_date_idx"],
+    ChartOfAccounts: ["coa_category_idx"],
+    CoAEventLog: ["coa_log_account_time_idx", "coa_log_time_idx"],
+    GeneralLedger: ["gl_account_date_idx"],
+    JournalEntry: [
+        "journal_entry_pending_idx",
+        "journal_entry_status_date_idx",
+        "journal_entry_account_date_idx",
+    ],
+}
+
+
+def hot_queries():
+    """
+    Returns the queries behind the reporting pages, keyed by a short description.
+    """
+    cash = ChartOfAccounts.objects.get(account_name="Cash")
+    end_date = date.today()
+    start_date = end_date - timedelta(days=30)
+    return {
+        "home: pending entries": JournalEntry.objects.filter(status="Pending").order_by(
+            "date", "id"
+        )[:50],
+        "journal: status and date range": JournalEntry.objects.filter(
+            status="Approved", date__range=[start_date, end_date]
+        ),
+        "journal: account and date range": JournalEntry.objects.filter(
+            account=cash, date__gte=start_date
+        ),
+        "journal: category totals": JournalEntry.objects.filter(
+            account__account_category="Assets", date__range=[start_date, end_date]
+        )
+        .values("account__account_name")
+        .annotate(total_debit=Sum("debit")),
+        # The query behind reporting.account_totals (the accounts are named from the registry afterwards)
+        "statements: rollup totals": filter_date_range(
+            AccountBalance.objects.all(), start_date, end_date
+        )
+        .values("account_id")
+        .annotate(total_debit=Sum("debit"), total_credit=Sum("credit"))
+        .order_by("account_id"),
+        "ledger: first page": GeneralLedger.objects.filter(account=cash).order_by(
+            "date_of_journal_entry", "id"
+        )[:51],
+        "coa log: account history": CoAEventLog.objects.filter(
+            chart_of_account=cash
+        ).order_by("-timestamp")[:50],
+    }
+
+
+# section for recording the EXPLAIN plans of the reporting queries with and without the reporting indexes
+class Command(BaseCommand):
+    help = "Record EXPLAIN plans (and a timing) for the reporting hot paths, before and after the reporting indexes. Run on a scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            action="store_true",
+            help="Seed synthetic books first (writes to the configured database).",
+        )
+        parser.add_argument(
+            "--entries",
+            type=int,
+            default=1000000,
+            help="Number of journal entries to seed with --seed.",
+        )
+        parser.add_argument(
+            "--output",
+            default="explain_reporting_queries.json",
+            help="File the plans are written to as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed_books(options["entries"], stdout=self.stdout)
+        if not ChartOfAccounts.objects.filter(account_name="Cash").exists():
+            raise CommandError("No Cash account found. Run with --seed first.")
+
+        self.set_indexes(enabled=False)
+        try:
+            before = self.capture()
+        finally:
+            self.set_indexes(enabled=True)
+        after = self.capture()
+
+        report = {
+            "database": connection.vendor,
+            "journal_entries": JournalEntry.objects.count(),
+            "queries": {
+                name: {"before": before[name], "after": after[name]} for name in before
+            },
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+
+        for name, plans in report["queries"].items():
+            self.stdout.write(
+                f"{name}: {plans['before']['seconds']:.4f}s -> {plans['after']['seconds']:.4f}s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Plans written to {options['output']}."))
+
+    def set_indexes(self, enabled):
+        """
+        Drops or recreates the reporting indexes, leaving every other schema object alone.
+        """
+        with connection.schema_editor() as editor:
+            for model, names in REPORTING_INDEXES.items():
+                for index in model._meta.indexes:
+                    if index.name in names:
+                        if enabled:
+                            editor.add_index(model, index)
+                        else:
+                            editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def capture(self):
+        results = {}
+        for name, queryset in hot_queries().items():
+            started = time.perf_counter()
+            list(queryset)
+            results[name] = {
+                "seconds": time.perf_counter() - started,
+                "plan": queryset.explain(),
+            }
+        return results
@@ -0,0 +1,63 @@
+import csv
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from authenticate.imports import IMPORT_BATCH_SIZE, import_journal
+
+
+# section for importing journal entries in bulk from a CSV file (columns: group, date, account, debit, credit, comments)
+class Command(BaseCommand):
+    help = "Import journal entries from a CSV file as pending entries. Rows with the same group value make one entry and must balance; rejected groups are reported without stopping the import."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The CSV file to import.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Number of journal entry lines written per transaction.",
+        )
+        parser.add_argument(
+            "--rejects",
+            default="",
+            help="Write the rejected rows, with their reasons, to this CSV file.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as csv_file:
+                report = import_journal(csv_file, batch_size=options["batch_size"])
+        except OSError as error:
+            raise CommandError(f"Cannot read {options['path']}: {error}")
+        except ValidationError as error:
+            raise CommandError(" ".join(error.messages))
+        elapsed = time.perf_counter() - started
+
+        if report.rejected:
+            if options["rejects"]:
+                with open(options["rejects"], "w", newline="") as rejects_file:
+                    writer = csv.writer(rejects_file)
+                    writer.writerow(["row", "group", "reason"])
+                    writer.writerows(report.rejected)
+            for row_number, group, reason in report.rejected[:20]:
+                self.stdout.write(f"Row {row_number} (group {group}): {reason}")
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{len(report.rejected)} rows rejected"
+                    + (
+                        f", written to {options['rejects']}."
+                        if options["rejects"]
+                        else "."
+                    )
+                )
+            )
+
+        lines_per_minute = report.lines / elapsed * 60 if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.groups} journal entries ({report.lines} lines) in {elapsed:.1f}s "
+                f"({lines_per_minute:,.0f} lines per minute)."
+            )
+        )
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from authenticate.models import AccountBalance, GeneralLedger
+
+
+# section for rebuilding (or checking) the per-day account balance rollup from the General Ledger
+class Command(BaseCommand):
+    help = "Rebuild the AccountBalance rollup from the GeneralLedger table, or check it for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report rollup rows that do not match the General Ledger, without writing anything.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rollup rows to insert per query when rebuilding.",
+        )
+
+    def handle(self, *args, **options):
+        # Sum the General Ledger per account per day in the database
+        expected = {
+            (row["account_id"], row["date_of_journal_entry"]): (
+                row["total_debit"],
+                row["total_credit"],
+            )
+            for row in GeneralLedger.objects.values(
+                "account_id", "date_of_journal_entry"
+            ).annotate(total_debit=Sum("debit"), total_credit=Sum("credit"))
+        }
+
+        if options["check"]:
+            self.check_rollup(expected)
+            return
+
+        with transaction.atomic():
+            AccountBalance.objects.all().delete()
+            AccountBalance.objects.bulk_create(
+                (
+                    AccountBalance(
+                        account_id=account_id, date=date, debit=debit, credit=credit
+                    )
+                    for (account_id, date), (debit, credit) in expected.items()
+                ),
+                batch_size=options["batch_size"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(expected)} account balance rows from the General Ledger."
+            )
+        )
+
+    def check_rollup(self, expected):
+        actual = {
+            (row.account_id, row.date): (row.debit, row.credit)
+            for row in AccountBalance.objects.all()
+        }
+
+        mismatches = 0
+        for key in sorted(set(expected) | set(actual), key=str):
+            if expected.get(key, (0, 0)) != actual.get(key, (0, 0)):
+                mismatches += 1
+                account_id, date = key
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Account {account_id} on {date}: ledger {expected.get(key, (0, 0))}, rollup {actual.get(key, (0, 0))}"
+                    )
+                )
+
+        if mismatches:
+            self.stdout.write(
+                self.style.ERROR(f"{mismatches} account balance rows are out of date.")
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "The account balance rollup matches the General Ledger."
+                )
+            )
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from authenticate.models import ChartOfAccounts, GeneralLedger
+
+
+# section for recomputing the running balance stored on every General Ledger row
+class Command(BaseCommand):
+    help = "Recompute the running balance stored on each GeneralLedger row in (date, id) order, or check it with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report the accounts whose stored running balances are wrong, without writing anything.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of ledger rows to read and update per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total_fixed = 0
+
+        for account in ChartOfAccounts.objects.only("id", "initial_balance"):
+            balance = account.initial_balance
+            to_update = []
+            fixed = 0
+
+            with transaction.atomic():
+                rows = (
+                    GeneralLedger.objects.filter(account=account)
+                    .order_by("date_of_journal_entry", "id")
+                    .only("id", "debit", "credit", "balance")
+                )
+                for row in rows.iterator(chunk_size=batch_size):
+                    balance += row.debit - row.credit
+                    if row.balance == balance:
+                        continue
+                    fixed += 1
+                    if options["check"]:
+                        continue
+                    row.balance = balance
+                    to_update.append(row)
+                    if len(to_update) >= batch_size:
+                        GeneralLedger.objects.bulk_update(to_update, ["balance"])
+                        to_update = []
+                if to_update:
+                    GeneralLedger.objects.bulk_update(to_update, ["balance"])
+
+            if fixed:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Account {account.pk}: {fixed} ledger rows had a wrong running balance."
+                    )
+                )
+            total_fixed += fixed
+
+        if options["check"]:
+            message = f"{total_fixed} ledger rows have a wrong running balance."
+        else:
+            message = f"Updated the running balance of {total_fixed} ledger rows."
+        self.stdout.write(self.style.SUCCESS(message))
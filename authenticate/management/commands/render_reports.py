@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from authenticate.reports import prune_report_cache, render_pending
+
+
+# section for rendering the queued financial statement PDFs (run from cron, or as a long running worker with --loop)
+class Command(BaseCommand):
+    help = "Render the queued report jobs to PDF in a process pool, store them in the report cache, and remove expired PDFs from it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of rendering processes (defaults to the number of CPUs).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Number of jobs claimed at a time.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2,
+            help="Seconds to wait between polls of an empty queue with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        # The pool processes never use the database, but they must not inherit an open connection either
+        connections.close_all()
+
+        total_done = total_failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                done, failed = render_pending(
+                    executor, batch_size=options["batch_size"]
+                )
+                total_done += done
+                total_failed += failed
+                if done or failed:
+                    self.stdout.write(f"Rendered {done} reports, {failed} failed.")
+                    continue
+                # The queue is empty, so the cache folder is pruned before waiting or exiting
+                removed = prune_report_cache()
+                if removed:
+                    self.stdout.write(
+                        f"Removed {removed} expired reports from the cache."
+                    )
+                if not options["loop"]:
+                    break
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Report queue drained: {total_done} rendered, {total_failed} failed."
+            )
+        )
@@ -1,40 +1,77 @@
 from django.core.management.base import BaseCommand
 from django.utils.timezone import now
 from datetime import timedelta
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from authenticate.models import CustomUser, EmailNotification
+from authenticate.outbox import queue_mass_mail
 
-#section for notifying all users whose password is about to expire in 3 days
+#section for notifying all users whose password is about to expire in 3 days (or --days)
 class Command(BaseCommand):
-    help = 'Notify a user about password expiry and log the notification into emailnotification table.'
+    help = 'Notify users about password expiry and log the notifications into emailnotification table.'
 
-    def handle(self, *args, **kwargs):
-        target_date = now().date() + timedelta(days=3)
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3, help='Notify users whose password expires this many days from today.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of emails queued (and notifications logged) per batch.')
+        parser.add_argument('--dry-run', action='store_true', help='List the users that would be notified without sending anything.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+        today = now().date()
+        target_date = today + timedelta(days=days)
+
+        # Users already notified today are excluded by a subquery, so this is a single query
+        already_notified = EmailNotification.objects.filter(
+            notification_type='password-expiry',
+            sent_date__date=today
+        ).values('user_id')
         users_to_notify = CustomUser.objects.filter(
             password_expiry=target_date
         ).exclude(
-            emailnotification__notification_type='password-expiry',
-            emailnotification__sent_date__date=now().date()
-        )
+            pk__in=already_notified
+        ).only('id', 'username', 'email').order_by('id')
 
-        for user in users_to_notify:
-            if not EmailNotification.objects.filter(user=user, notification_type='password-expiry', sent_date__date=now().date()).exists():
-                send_mail(
+        if options['dry_run']:
+            count = 0
+            for user in users_to_notify.iterator(chunk_size=batch_size):
+                count += 1
+                self.stdout.write(f'Would notify {user.email} about password expiring in {days} days.')
+            self.stdout.write(self.style.SUCCESS(f'{count} users would be notified.'))
+            return
+
+        notified = 0
+        batch = []
+        for user in users_to_notify.iterator(chunk_size=batch_size):
+            batch.append(user)
+            if len(batch) >= batch_size:
+                notified += self.notify(batch, days)
+                batch = []
+        if batch:
+            notified += self.notify(batch, days)
+
+        self.stdout.write(self.style.SUCCESS(f'{notified} users have been notified about password expiring in {days} days; the emails are sent by send_queued_email.'))
+
+    def notify(self, users, days):
+        # The emails go through the outbox, queued in the same transaction as the notification log,
+        # so a notice is logged exactly when it is queued and a failed run never sends one twice
+        with transaction.atomic():
+            queue_mass_mail(
+                (
                     'Password Expiry Notice',
-                    f'Hi {user.username}, your password is about to expire in 3 days! Please update it as soon as possible.',
+                    f'Hi {user.username}, your password is about to expire in {days} days! Please update it as soon as possible.',
                     settings.DEFAULT_FROM_EMAIL,
                     [user.email],
-                    fail_silently=False,
-                )
-
-                EmailNotification.objects.create(
-                    user=user,
-                    notification_type='password-expiry',
-                    sent_date=now()
                 )
+                for user in users
+            )
 
-                self.stdout.write(self.style.SUCCESS(f'User {user.email} has been notified via email about password expiring in 3 days.'))
+            # Log every notification of the batch with one insert
+            EmailNotification.objects.bulk_create(
+                EmailNotification(user=user, notification_type='password-expiry')
+                for user in users
+            )
+        return len(users)
 
 
 #section for testing a single user already in the database: 'jonathanochoa'
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from authenticate.outbox import deliver_pending
+
+
+# section for draining the outbound email queue (run from cron, or as a long running worker with --loop)
+class Command(BaseCommand):
+    help = "Send the queued outbound emails in batches over one email connection, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of emails sent per connection.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Number of attempts before an email is marked Failed.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5,
+            help="Seconds to wait between polls of an empty queue with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_pending(
+                batch_size=options["batch_size"], max_attempts=options["max_attempts"]
+            )
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Outbox drained: {total_sent} sent, {total_failed} failed."
+            )
+        )
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authenticate", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "debit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "credit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_balances",
+                        to="authenticate.chartofaccounts",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="accountbalance",
+            constraint=models.UniqueConstraint(
+                fields=("account", "date"), name="unique_account_balance_per_day"
+            ),
+        ),
+    ]
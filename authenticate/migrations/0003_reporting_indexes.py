@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0002_accountbalance"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="accountbalance",
+            index=models.Index(
+                fields=["date", "account"], name="account_balance_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chartofaccounts",
+            index=models.Index(fields=["account_category"], name="coa_category_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="coaeventlog",
+            index=models.Index(
+                fields=["chart_of_account", "timestamp"],
+                name="coa_log_account_time_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="coaeventlog",
+            index=models.Index(fields=["timestamp"], name="coa_log_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="generalledger",
+            index=models.Index(
+                fields=["account", "date_of_journal_entry", "id"],
+                name="gl_account_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="journalentry",
+            index=models.Index(
+                condition=models.Q(("status", "Pending")),
+                fields=["date", "id"],
+                name="journal_entry_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="journalentry",
+            index=models.Index(
+                fields=["status", "date"], name="journal_entry_status_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="journalentry",
+            index=models.Index(
+                fields=["account", "date"], name="journal_entry_account_date_idx"
+            ),
+        ),
+    ]
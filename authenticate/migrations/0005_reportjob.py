@@ -0,0 +1,83 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0004_outboundemail"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "statement",
+                    models.CharField(
+                        choices=[
+                            ("trial_balance", "Trial Balance"),
+                            ("income_statement", "Income Statement"),
+                            ("balance_sheet", "Balance Sheet"),
+                            ("retained_earnings", "Retained Earnings"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("start_date", models.DateField(blank=True, null=True)),
+                ("end_date", models.DateField(blank=True, null=True)),
+                ("ledger_version", models.BigIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Pending", "Pending"),
+                            ("Running", "Running"),
+                            ("Done", "Done"),
+                            ("Failed", "Failed"),
+                        ],
+                        default="Pending",
+                        max_length=10,
+                    ),
+                ),
+                ("file_path", models.CharField(blank=True, max_length=500)),
+                ("error", models.TextField(blank=True)),
+                ("email_from", models.CharField(blank=True, max_length=255)),
+                ("email_to", models.JSONField(blank=True, default=list)),
+                ("email_subject", models.CharField(blank=True, max_length=255)),
+                ("email_body", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "Pending")),
+                        fields=["created_at", "id"],
+                        name="report_job_pending_idx",
+                    )
+                ],
+            },
+        ),
+    ]
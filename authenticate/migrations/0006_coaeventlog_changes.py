@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:32
+
+import json
+
+from django.db import migrations, models
+
+
+def snapshot_fields(snapshot):
+    # Same decoding as CoAEventLog.snapshot_fields, kept here so the migration does not depend on the model code
+    if not snapshot:
+        return {}
+    data = json.loads(snapshot)
+    if isinstance(data, list):
+        return data[0].get("fields", {}) if data else {}
+    return data
+
+
+def fill_changes(apps, schema_editor):
+    """
+    Works out the stored field-level changes of the existing log rows, in batches.
+    """
+    CoAEventLog = apps.get_model("authenticate", "CoAEventLog")
+    batch = []
+    for log in CoAEventLog.objects.only("id", "before_change", "after_change").iterator(
+        chunk_size=1000
+    ):
+        before = snapshot_fields(log.before_change)
+        after = snapshot_fields(log.after_change)
+        log.changes = {
+            field: [before.get(field), after.get(field)]
+            for field in sorted(before.keys() | after.keys())
+            if before.get(field) != after.get(field)
+        }
+        batch.append(log)
+        if len(batch) == 1000:
+            CoAEventLog.objects.bulk_update(batch, ["changes"])
+            batch = []
+    CoAEventLog.objects.bulk_update(batch, ["changes"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0005_reportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coaeventlog",
+            name="changes",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(fill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0006_coaeventlog_changes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coaeventlog",
+            name="snapshot",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="coaeventlog",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("added", "Added"),
+                    ("modified", "Modified"),
+                    ("activated", "Activated"),
+                    ("deactivated", "Deactivated"),
+                ],
+                max_length=11,
+            ),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:35
+
+import json
+
+from django.db import migrations
+
+# Same as CoAEventLog.CHECKPOINT_INTERVAL when this migration was written
+CHECKPOINT_INTERVAL = 50
+
+# The decimal fields of ChartOfAccounts, which serialize_account() stored as floats
+DECIMAL_FIELDS = ("initial_balance", "debit", "credit", "balance")
+
+
+def snapshot_fields(snapshot):
+    """
+    Decodes an old snapshot into the {field: value} shape of Django's serializer.
+    Snapshots written by serialize_account() are flat, with floats for decimals and a nested user.
+    """
+    if not snapshot:
+        return None
+    data = json.loads(snapshot)
+    if isinstance(data, list):
+        return data[0].get("fields", {}) if data else None
+    if isinstance(data.get("user_id"), dict):
+        data["user_id"] = data["user_id"].get("id")
+    for field in DECIMAL_FIELDS:
+        if isinstance(data.get(field), float):
+            data[field] = f"{data[field]:.2f}"
+    return data
+
+
+def compact(apps, schema_editor):
+    """
+    Keeps a full snapshot on every CHECKPOINT_INTERVAL-th event of each account (starting with its first),
+    before the old before_change/after_change columns are dropped. The changes column was filled by 0006.
+    """
+    CoAEventLog = apps.get_model("authenticate", "CoAEventLog")
+    account_ids = (
+        CoAEventLog.objects.values_list("chart_of_account_id", flat=True)
+        .order_by("chart_of_account_id")
+        .distinct()
+    )
+    for account_id in account_ids:
+        logs = (
+            CoAEventLog.objects.filter(chart_of_account_id=account_id)
+            .only("id", "before_change", "after_change")
+            .order_by("timestamp", "id")
+        )
+        checkpoints = []
+        for event_number, log in enumerate(logs.iterator(chunk_size=1000)):
+            if event_number % CHECKPOINT_INTERVAL == 0:
+                log.snapshot = snapshot_fields(log.after_change) or snapshot_fields(
+                    log.before_change
+                )
+                checkpoints.append(log)
+        CoAEventLog.objects.bulk_update(checkpoints, ["snapshot"], batch_size=1000)
+
+
+def snapshot_text(state):
+    """
+    Encodes a state the way the old snapshot columns stored it, or None if the account did not exist.
+    """
+    if not any(value is not None for value in state.values()):
+        return None
+    return json.dumps(state)
+
+
+def expand(apps, schema_editor):
+    """
+    Rebuilds the before_change/after_change snapshots (re-added empty by reversing 0009) by replaying each
+    account's changes from its first event, and clears the checkpoints again.
+    """
+    CoAEventLog = apps.get_model("authenticate", "CoAEventLog")
+    account_ids = (
+        CoAEventLog.objects.values_list("chart_of_account_id", flat=True)
+        .order_by("chart_of_account_id")
+        .distinct()
+    )
+    for account_id in account_ids:
+        logs = (
+            CoAEventLog.objects.filter(chart_of_account_id=account_id)
+            .only("id", "action", "changes", "snapshot")
+            .order_by("timestamp", "id")
+        )
+        state = {}
+        batch = []
+        for log in logs.iterator(chunk_size=1000):
+            before = state
+            state = dict(state)
+            state.update({field: after for field, (_, after) in log.changes.items()})
+            # A checkpoint holds the state after the event, except on a deactivation (the account is gone then)
+            if log.snapshot and log.action != "deactivated":
+                state = dict(log.snapshot)
+            log.before_change = snapshot_text(before)
+            log.after_change = snapshot_text(state)
+            log.snapshot = None
+            batch.append(log)
+        CoAEventLog.objects.bulk_update(
+            batch, ["before_change", "after_change", "snapshot"], batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0007_coaeventlog_snapshot"),
+    ]
+
+    operations = [
+        migrations.RunPython(compact, expand),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:35
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0008_compact_coaeventlog"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="coaeventlog",
+            name="after_change",
+        ),
+        migrations.RemoveField(
+            model_name="coaeventlog",
+            name="before_change",
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0009_remove_coaeventlog_before_after_change"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FiscalPeriod",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("start_date", models.DateField()),
+                ("end_date", models.DateField(unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("Open", "Open"), ("Closed", "Closed")],
+                        default="Open",
+                        max_length=10,
+                    ),
+                ),
+                ("closed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "closed_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="closed_periods",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PeriodBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "debit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "credit",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="period_balances",
+                        to="authenticate.chartofaccounts",
+                    ),
+                ),
+                (
+                    "period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balances",
+                        to="authenticate.fiscalperiod",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="fiscalperiod",
+            constraint=models.CheckConstraint(
+                check=models.Q(("start_date__lte", models.F("end_date"))),
+                name="fiscal_period_dates_in_order",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="periodbalance",
+            constraint=models.UniqueConstraint(
+                fields=("period", "account"), name="unique_period_balance_per_account"
+            ),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The account names the statements and ratios used to pick their accounts by, before the classification table
+CLASSIFIED_NAMES = {
+    "income_revenue": ["Unearned Revenue"],
+    "income_expense": ["Accrued Expense", "Prepaid Expenses"],
+    "retained_revenue": ["Interest Revenue", "Service Revenue"],
+    "retained_expense": ["Supplies Expense", "Salaries Expense", "Utilities Expense"],
+    "retained_dividends": ["Dividends"],
+    "ratio_cash": ["Cash"],
+    "ratio_operating_cash": ["Operating Cash"],
+    "ratio_total_debt_service": ["Total Debt Service"],
+    "ratio_operating_income": ["Operating Income"],
+    "ratio_interest_expense": ["Interest Expense"],
+    "ratio_net_sales": ["Net Sales"],
+    "ratio_cost_of_goods_sold": ["Cost of Goods Sold"],
+    "ratio_gross_profit": ["Gross Profit"],
+    "ratio_net_income": ["Net Income"],
+    "ratio_inventory": ["Inventory"],
+}
+
+
+def classify_existing_accounts(apps, schema_editor):
+    """
+    Classifies the existing accounts on the lines their names were hardcoded on, so the reports do not change.
+    """
+    ChartOfAccounts = apps.get_model("authenticate", "ChartOfAccounts")
+    AccountClassification = apps.get_model("authenticate", "AccountClassification")
+    accounts = dict(ChartOfAccounts.objects.values_list("account_name", "id"))
+    AccountClassification.objects.bulk_create(
+        AccountClassification(account_id=accounts[name], line=line)
+        for line, names in CLASSIFIED_NAMES.items()
+        for name in names
+        if name in accounts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0010_fiscal_periods"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountClassification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "line",
+                    models.CharField(
+                        choices=[
+                            ("income_revenue", "Income Statement: Revenue"),
+                            ("income_expense", "Income Statement: Expense"),
+                            ("retained_revenue", "Retained Earnings: Revenue"),
+                            ("retained_expense", "Retained Earnings: Expense"),
+                            ("retained_dividends", "Retained Earnings: Dividends"),
+                            ("ratio_cash", "Ratios: Cash"),
+                            ("ratio_operating_cash", "Ratios: Operating Cash Flow"),
+                            ("ratio_total_debt_service", "Ratios: Total Debt Service"),
+                            ("ratio_operating_income", "Ratios: Operating Income"),
+                            ("ratio_interest_expense", "Ratios: Interest Expense"),
+                            ("ratio_net_sales", "Ratios: Net Sales"),
+                            ("ratio_cost_of_goods_sold", "Ratios: Cost of Goods Sold"),
+                            ("ratio_gross_profit", "Ratios: Gross Profit"),
+                            ("ratio_net_income", "Ratios: Net Income"),
+                            ("ratio_inventory", "Ratios: Inventory"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="classifications",
+                        to="authenticate.chartofaccounts",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["line", "account"], name="classification_line_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="accountclassification",
+            constraint=models.UniqueConstraint(
+                fields=("account", "line"), name="unique_account_classification"
+            ),
+        ),
+        migrations.RunPython(classify_existing_accounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0011_account_classification"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chartofaccounts",
+            name="log_events",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
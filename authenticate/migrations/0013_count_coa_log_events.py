@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:41
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_log_events(apps, schema_editor):
+    """
+    Sets the event counter of the existing accounts to the number of their event log rows, in one UPDATE.
+    """
+    ChartOfAccounts = apps.get_model("authenticate", "ChartOfAccounts")
+    CoAEventLog = apps.get_model("authenticate", "CoAEventLog")
+    events = (
+        CoAEventLog.objects.filter(chart_of_account_id=models.OuterRef("pk"))
+        .order_by()
+        .values("chart_of_account_id")
+        .annotate(events=models.Count("id"))
+        .values("events")
+    )
+    ChartOfAccounts.objects.update(
+        log_events=Coalesce(models.Subquery(events), models.Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0012_chartofaccounts_log_events"),
+    ]
+
+    operations = [
+        # Nothing to undo: reversing 0012 drops the counter
+        migrations.RunPython(count_log_events, migrations.RunPython.noop),
+    ]
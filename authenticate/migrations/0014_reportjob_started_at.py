@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 22:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0013_count_coa_log_events"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportjob",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
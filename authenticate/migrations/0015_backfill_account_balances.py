@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-18 23:05
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def backfill_account_balances(apps, schema_editor):
+    """
+    Fills the per-day rollup from the General Ledger, as the rebuild_account_balances command does.
+    0002 created the table empty, so the statements (and any period closed from them) would otherwise see only
+    the entries approved since. The General Ledger is posted in the same transaction as the rollup, so rebuilding
+    every row from it is also right for databases where the command was already run.
+    """
+    AccountBalance = apps.get_model("authenticate", "AccountBalance")
+    GeneralLedger = apps.get_model("authenticate", "GeneralLedger")
+    AccountBalance.objects.all().delete()
+    AccountBalance.objects.bulk_create(
+        (
+            AccountBalance(
+                account_id=row["account_id"],
+                date=row["date_of_journal_entry"],
+                debit=row["total_debit"],
+                credit=row["total_credit"],
+            )
+            for row in GeneralLedger.objects.values(
+                "account_id", "date_of_journal_entry"
+            )
+            .order_by()
+            .annotate(total_debit=Sum("debit"), total_credit=Sum("credit"))
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authenticate", "0014_reportjob_started_at"),
+    ]
+
+    operations = [
+        # Nothing to undo: reversing 0002 drops the table
+        migrations.RunPython(backfill_account_balances, migrations.RunPython.noop),
+    ]
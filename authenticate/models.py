@@ -1,9 +1,27 @@
+import copy
+import json
+from collections import defaultdict
+from decimal import Decimal
+from itertools import groupby
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import JSONField
+from django.core.exceptions import ValidationError
+from django.core.serializers import serialize
+from django.db.models import (
+    Case,
+    F,
+    JSONField,
+    Subquery,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import Coalesce, RowNumber
 from django.db import models, transaction
+from .versioning import bump_version_on_commit
 
 
 class CustomUser(AbstractUser):
@@ -99,6 +117,133 @@ class EmailNotification(models.Model):
         return f"{self.notification_type} notification for {self.user.username} sent on {self.sent_date}"
 
 
+class OutboundEmail(models.Model):
+    """
+    A model for the outbound email queue (outbox).
+
+    Views add messages here instead of talking to the SMTP server during the request.
+    The send_queued_email management command delivers them in batches over one SMTP connection,
+    retrying failed messages with an exponential backoff.
+
+    Attributes:
+    subject (CharField): The subject of the email.
+    body (TextField): The plain text body of the email.
+    from_email (CharField): The sender address. Blank uses DEFAULT_FROM_EMAIL.
+    to (JSONField): The list of recipient addresses.
+    alternatives (JSONField): Alternative bodies, as [content, mimetype] pairs.
+    attachments (JSONField): Attachments, as [filename, content, mimetype, is_base64] lists.
+    status (CharField): Pending, Sent or Failed (gave up after the maximum number of attempts).
+    attempts (IntegerField): The number of delivery attempts so far.
+    next_attempt_at (DateTimeField): The earliest time the next delivery attempt may happen.
+    last_error (TextField): The error from the last failed attempt.
+    created_at (DateTimeField): When the email was queued.
+    sent_at (DateTimeField): When the email was delivered. Can be null.
+    """
+
+    STATUS_CHOICES = (
+        ("Pending", "Pending"),
+        ("Sent", "Sent"),
+        ("Failed", "Failed"),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = JSONField(default=list)
+    alternatives = JSONField(default=list, blank=True)
+    attachments = JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="Pending")
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker only ever looks for pending messages that are due
+            models.Index(
+                fields=["next_attempt_at", "id"],
+                condition=models.Q(status="Pending"),
+                name="outbound_email_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} - Status: {self.status}"
+
+
+class ReportJob(models.Model):
+    """
+    A model for the financial statement PDFs waiting to be rendered.
+
+    The export and email views add a job here instead of running xhtml2pdf during the request.
+    The render_reports management command renders the pending jobs in a process pool and stores
+    each PDF in the report cache, keyed by statement, date range and ledger version.
+
+    Attributes:
+    statement (CharField): The statement to render (trial_balance, income_statement, balance_sheet or retained_earnings).
+    start_date (DateField): The first day of the period. Can be null (no lower bound).
+    end_date (DateField): The last day of the period. Can be null (no upper bound).
+    ledger_version (BigIntegerField): The ledger version when the job was requested.
+    status (CharField): Pending, Running, Done or Failed.
+    file_path (CharField): The rendered PDF in the report cache, once Done.
+    error (TextField): The rendering error, if the job Failed.
+    email_from (CharField): The sender of the email the PDF is attached to, for emailed reports.
+    email_to (JSONField): The recipients of that email. Empty for plain downloads.
+    email_subject (CharField): The subject of that email.
+    email_body (TextField): The plain text body of that email.
+    requested_by (ForeignKey): The user who asked for the report. Can be null.
+    created_at (DateTimeField): When the job was queued.
+    started_at (DateTimeField): When a worker claimed the job, while it is Running. Can be null.
+    finished_at (DateTimeField): When the job was rendered or failed. Can be null.
+    """
+
+    STATEMENT_CHOICES = (
+        ("trial_balance", "Trial Balance"),
+        ("income_statement", "Income Statement"),
+        ("balance_sheet", "Balance Sheet"),
+        ("retained_earnings", "Retained Earnings"),
+    )
+    STATUS_CHOICES = (
+        ("Pending", "Pending"),
+        ("Running", "Running"),
+        ("Done", "Done"),
+        ("Failed", "Failed"),
+    )
+
+    statement = models.CharField(max_length=30, choices=STATEMENT_CHOICES)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    ledger_version = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="Pending")
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    email_from = models.CharField(max_length=255, blank=True)
+    email_to = JSONField(default=list, blank=True)
+    email_subject = models.CharField(max_length=255, blank=True)
+    email_body = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker only ever looks for pending jobs, oldest first
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(status="Pending"),
+                name="report_job_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_statement_display()} ({self.start_date} - {self.end_date}) - Status: {self.status}"
+
+
 LeftRight = (
     ("Left", ("Left")),
     ("Right", ("Right")),
@@ -109,6 +254,10 @@ class ChartOfAccounts(models.Model):
     """
     A model for storing chart of accounts in the database.
     This is the main database to be used in Sprint 2.
+
+    The field values an account was loaded with are remembered (see from_db), so the CoA signals can log
+    what a save changed without selecting the row again first.
+    Every logged change counts itself in log_events along with the change.
     """
 
     account_name = models.CharField(max_length=255, unique=True)
@@ -127,37 +276,249 @@ class ChartOfAccounts(models.Model):
     order = models.CharField(max_length=255)
     statement = models.CharField(max_length=255)
     comment = models.TextField()
+    # The number of CoAEventLog rows of the account, kept with every logged change so the event log
+    # can place its checkpoints without counting the account's history (see CoAEventLog.record_many)
+    log_events = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # The statements and ratios group and filter accounts by category
+            models.Index(fields=["account_category"], name="coa_category_idx"),
+        ]
 
     def __str__(self):
         return self.account_name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def remember_loaded_state(self):
+        """
+        Marks the current field values as the saved state, after a save.
+        """
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
+    def loaded_instance(self):
+        """
+        Returns a copy of the account as it was loaded (or last saved), or None if that state is not known,
+        e.g. for an instance built by hand or loaded with deferred fields.
+        """
+        loaded_values = getattr(self, "_loaded_values", None)
+        if loaded_values is None or len(loaded_values) < len(
+            self._meta.concrete_fields
+        ):
+            return None
+        instance = copy.copy(self)
+        instance.__dict__.update(loaded_values)
+        return instance
+
+    def add_to_totals(self, debit, credit, user=None):
+        """
+        Adds posted amounts to the account's debit, credit and balance with one UPDATE of just those columns.
+
+        The totals are applied with F() expressions in the UPDATE, which also locks the row for the rest of the
+        transaction, so concurrent approvals against the same account (from several workers) queue up instead of
+        overwriting each other's totals, and whatever else the caller posts for the account in the same
+        transaction (the General Ledger running balances) sees the totals in order.
+
+        This is the opt-out from the CoA signals for internal balance updates: the save is not logged field by field,
+        and a single audit row with the changed totals, credited to the given user (or user id), is written instead.
+        The audit row is built from the values the account was loaded with, so no query is needed to read them back;
+        load the account with select_for_update in the same transaction so those values are current.
+        """
+        before = self.loaded_instance() or copy.copy(self)
+        with transaction.atomic(savepoint=False):
+            ChartOfAccounts.objects.filter(pk=self.pk).update(
+                debit=F("debit") + debit,
+                credit=F("credit") + credit,
+                balance=F("balance") + debit - credit,
+                log_events=F("log_events") + 1,
+            )
+            self.debit = before.debit + debit
+            self.credit = before.credit + credit
+            self.balance = before.balance + debit - credit
+            self.log_events = before.log_events + 1
+            self.remember_loaded_state()
+            CoAEventLog.record(
+                self,
+                "modified",
+                user or self.user_id_id,
+                CoAEventLog.snapshot_of(before),
+                CoAEventLog.snapshot_of(self),
+            )
+
+    def set_statement_lines(self, lines):
+        """
+        Sets the statement lines the account is classified on (see AccountClassification), adding and removing rows as needed.
+        """
+        lines = set(lines)
+        with transaction.atomic():
+            current = set(self.classifications.values_list("line", flat=True))
+            # Deleted and created one by one, so the signals bump the CoA version (a handful of rows at most)
+            for classification in self.classifications.filter(line__in=current - lines):
+                classification.delete()
+            for line in sorted(lines - current):
+                AccountClassification.objects.create(account=self, line=line)
+
 
 class CoAEventLog(models.Model):
     """
     A model for storing chart of accounts event log in the database.
+
+    Each row stores only the fields the event changed, in changes as {field: [before, after]}.
+    Every CHECKPOINT_INTERVAL-th event of an account (starting with its first) also stores the full state of the
+    account after the event in snapshot, so any historical state can be rebuilt from the nearest checkpoint
+    (see state_at) without storing two full copies of the account on every save.
     """
 
     ACTION_CHOICES = [
         ("added", "Added"),
         ("modified", "Modified"),
+        ("activated", "Activated"),
         ("deactivated", "Deactivated"),
     ]
+
+    # A full snapshot is stored on every CHECKPOINT_INTERVAL-th event of an account
+    CHECKPOINT_INTERVAL = 50
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     action = models.CharField(max_length=11, choices=ACTION_CHOICES)
     timestamp = models.DateTimeField(auto_now_add=True)
-    before_change = models.TextField(
-        blank=True, null=True
-    )  # Stores the snapshot before change
-    after_change = models.TextField(
-        blank=True, null=True
-    )  # Stores the snapshot after change
     chart_of_account = models.ForeignKey("ChartOfAccounts", on_delete=models.CASCADE)
+    changes = JSONField(default=dict, blank=True)  # {field: [before, after]}
+    snapshot = JSONField(
+        null=True, blank=True
+    )  # Full state after the event, on checkpoints only
+
+    class Meta:
+        indexes = [
+            # The log page lists an account's history newest first
+            models.Index(
+                fields=["chart_of_account", "timestamp"],
+                name="coa_log_account_time_idx",
+            ),
+            models.Index(fields=["timestamp"], name="coa_log_time_idx"),
+        ]
 
     def __str__(self):
         return (
             f"{self.chart_of_account.account_name} - {self.action} - {self.timestamp}"
         )
 
+    @staticmethod
+    def snapshot_of(account):
+        """
+        Returns the state of an account as a {field: value} dictionary of JSON values, as Django's serializer writes them.
+        Decimals are written with their field's decimal places, so an unsaved 0 and a loaded 0.00 compare equal.
+        The log_events counter is left out, as it is bookkeeping of the log itself.
+        """
+        fields = json.loads(serialize("json", [account]))[0]["fields"]
+        fields.pop("log_events", None)
+        for field in account._meta.concrete_fields:
+            if (
+                isinstance(field, models.DecimalField)
+                and fields.get(field.name) is not None
+            ):
+                fields[field.name] = str(
+                    Decimal(str(fields[field.name])).quantize(
+                        Decimal(1).scaleb(-field.decimal_places)
+                    )
+                )
+        return fields
+
+    @staticmethod
+    def diff(before, after):
+        """
+        Returns the fields that differ between two states, as {field: [before, after]}.
+        A missing state (an added or deleted account) counts as None for every field.
+        """
+        before = before or {}
+        after = after or {}
+        return {
+            field: [before.get(field), after.get(field)]
+            for field in sorted(before.keys() | after.keys())
+            if before.get(field) != after.get(field)
+        }
+
+    @classmethod
+    def record(cls, account, action, user, before=None, after=None):
+        """
+        Saves one event of an account, given its state before and after the event (see snapshot_of).
+        """
+        return cls.record_many([(account, action, user, before, after)])[0]
+
+    @classmethod
+    def record_many(cls, events):
+        """
+        Saves several events with one bulk insert.
+
+        The events are numbered from the accounts' log_events counters, which the callers save along with
+        the changes, so no query is needed to tell which events are checkpoints.
+
+        Parameters:
+            events (list): (account, action, user, before, after) tuples, in the order they happened.
+                The user may be given as a user or a user id. The log_events of each account must already count its events in the list.
+
+        Returns:
+            list: The saved CoAEventLog rows.
+        """
+        # The number of each account's first event in the list
+        event_numbers = {account.pk: account.log_events for account, *rest in events}
+        for account, *rest in events:
+            event_numbers[account.pk] -= 1
+
+        logs = []
+        for account, action, user, before, after in events:
+            event_number = event_numbers[account.pk]
+            event_numbers[account.pk] = event_number + 1
+            logs.append(
+                cls(
+                    user_id=user.pk if isinstance(user, models.Model) else user,
+                    action=action,
+                    chart_of_account=account,
+                    changes=cls.diff(before, after),
+                    snapshot=(
+                        (after or before)
+                        if event_number % cls.CHECKPOINT_INTERVAL == 0
+                        else None
+                    ),
+                )
+            )
+        return cls.objects.bulk_create(logs)
+
+    def state_at(self):
+        """
+        Rebuilds the full state of the account right after this event, starting from the nearest checkpoint
+        at or before it and applying the changes of the events in between.
+        """
+        history = CoAEventLog.objects.filter(
+            chart_of_account_id=self.chart_of_account_id
+        ).filter(
+            models.Q(timestamp__lt=self.timestamp)
+            | models.Q(timestamp=self.timestamp, id__lte=self.id)
+        )
+        checkpoint = (
+            history.filter(snapshot__isnull=False).order_by("-timestamp", "-id").first()
+        )
+        state = dict(checkpoint.snapshot) if checkpoint else {}
+        if checkpoint:
+            history = history.filter(
+                models.Q(timestamp__gt=checkpoint.timestamp)
+                | models.Q(timestamp=checkpoint.timestamp, id__gt=checkpoint.id)
+            )
+        for changes in history.order_by("timestamp", "id").values_list(
+            "changes", flat=True
+        ):
+            for field, (before, after) in changes.items():
+                state[field] = after
+        return state
+
 
 class ErrorMessages(models.Model):
     """
@@ -201,10 +562,348 @@ class GeneralLedger(models.Model):
         max_digits=10, decimal_places=2, editable=False
     )  # Calculated field, not user-editable
 
+    class Meta:
+        indexes = [
+            # Ledger pages and running balance lookups seek on (account, date, id)
+            models.Index(
+                fields=["account", "date_of_journal_entry", "id"],
+                name="gl_account_date_idx",
+            ),
+        ]
+
+    @classmethod
+    def post(cls, entries, opening_balances):
+        """
+        Creates the General Ledger rows for a batch of approved journal entries.
+
+        The balance stored on each row is the account's running balance in (date, id) order, which is
+        the order the ledger page shows. A backdated entry takes the balance of the row before it,
+        and the rows after it are shifted by one UPDATE per account, so the ledger page never
+        has to recompute balances.
+
+        Parameters:
+            entries (list): The approved JournalEntry instances.
+            opening_balances (dict): The initial balance of every account touched, keyed by account id.
+
+        Returns:
+            list: The GeneralLedger rows that were created.
+        """
+        entries = sorted(
+            entries, key=lambda entry: (entry.account_id, entry.date, entry.pk)
+        )
+        first_days, last_days = {}, {}
+        for entry in entries:
+            first_days.setdefault(entry.account_id, entry.date)
+            last_days[entry.account_id] = entry.date
+
+        # Read the balance at the end of each day with ledger rows, from the last day before each account's first
+        # posted day through its last one, before anything in this batch is written. One query for the whole
+        # batch: the window keeps the last row of every day.
+        days_read = models.Q()
+        for account_id, first_day in first_days.items():
+            day_before = (
+                cls.objects.filter(
+                    account_id=account_id, date_of_journal_entry__lt=first_day
+                )
+                .order_by("-date_of_journal_entry")
+                .values("date_of_journal_entry")[:1]
+            )
+            days_read |= models.Q(
+                account_id=account_id,
+                date_of_journal_entry__gte=Coalesce(
+                    Subquery(day_before), Value(first_day)
+                ),
+                date_of_journal_entry__lte=last_days[account_id],
+            )
+        day_balances = defaultdict(
+            list
+        )  # {account_id: [(date, balance)]} in date order
+        for account_id, date, balance in (
+            cls.objects.filter(days_read)
+            .annotate(
+                last_of_day=Window(
+                    RowNumber(),
+                    partition_by=[F("account_id"), F("date_of_journal_entry")],
+                    order_by=F("id").desc(),
+                )
+            )
+            .filter(last_of_day=1)
+            .order_by("account_id", "date_of_journal_entry")
+            .values_list("account_id", "date_of_journal_entry", "balance")
+        ):
+            day_balances[account_id].append((date, balance))
+
+        rows = []
+        shifts = defaultdict(
+            list
+        )  # {account_id: [(date, activity posted up to that day)]}
+        for account_id, account_entries in groupby(entries, key=lambda e: e.account_id):
+            balances = day_balances[account_id]
+            position = 0
+            previous = None  # balance at the end of the last day with ledger rows
+            carried = 0  # activity from this batch posted on earlier days
+            for date, day_entries in groupby(account_entries, key=lambda e: e.date):
+                while position < len(balances) and balances[position][0] <= date:
+                    previous = balances[position][1]
+                    position += 1
+                balance = (
+                    opening_balances[account_id] if previous is None else previous
+                ) + carried
+                for entry in day_entries:
+                    balance += entry.debit - entry.credit
+                    carried += entry.debit - entry.credit
+                    rows.append(
+                        cls(
+                            account_id=account_id,
+                            journal_entry=entry,
+                            date_of_journal_entry=date,
+                            description=f"Approved Journal Entry: {entry.pk}",
+                            debit=entry.debit,
+                            credit=entry.credit,
+                            balance=balance,
+                        )
+                    )
+                shifts[account_id].append((date, carried))
+
+        # Shift the running balance of the existing rows dated after the posted days: a row moves by
+        # the activity posted on the days before it, so each account takes one UPDATE
+        for account_id, account_shifts in shifts.items():
+            if not any(amount for date, amount in account_shifts):
+                continue
+            cls.objects.filter(
+                account_id=account_id,
+                date_of_journal_entry__gt=account_shifts[0][0],
+            ).update(
+                balance=F("balance")
+                + Case(
+                    *(
+                        When(date_of_journal_entry__gt=date, then=Value(amount))
+                        for date, amount in reversed(account_shifts)
+                    ),
+                    default=Value(Decimal("0")),
+                    output_field=models.DecimalField(max_digits=10, decimal_places=2),
+                )
+            )
+
+        return cls.objects.bulk_create(rows)
+
     def __str__(self):
         return f"{self.date_of_journal_entry} - {self.account.account_name} - {self.description}"
 
 
+class AccountBalance(models.Model):
+    """
+    A per-account, per-day rollup of the approved activity posted to the General Ledger.
+    The financial statements sum these rows instead of scanning every journal entry.
+    Rows are kept current by JournalEntry.approve() and can be rebuilt from the General Ledger
+    with the rebuild_account_balances management command.
+    """
+
+    account = models.ForeignKey(
+        "ChartOfAccounts",
+        on_delete=models.CASCADE,
+        related_name="daily_balances",
+    )
+    date = models.DateField()
+    debit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "date"], name="unique_account_balance_per_day"
+            )
+        ]
+        indexes = [
+            # Statements sum every account over a date range
+            models.Index(fields=["date", "account"], name="account_balance_date_idx"),
+        ]
+
+    @classmethod
+    def record(cls, account_id, date, debit, credit):
+        """
+        Adds the debit and credit amounts to the rollup row for the given account and day.
+        The increment is done in the database so concurrent approvals do not overwrite each other.
+        """
+        rollup, created = cls.objects.get_or_create(account_id=account_id, date=date)
+        cls.objects.filter(pk=rollup.pk).update(
+            debit=F("debit") + debit, credit=F("credit") + credit
+        )
+
+    @classmethod
+    def record_many(cls, deltas):
+        """
+        Adds a batch of amounts to the rollup, where deltas maps (account_id, date) to (debit, credit).
+        Existing rows are locked and updated with one bulk_update and missing rows are inserted with one bulk_create.
+        """
+        if not deltas:
+            return
+        account_ids = {account_id for account_id, date in deltas}
+        dates = {date for account_id, date in deltas}
+        existing = {
+            (rollup.account_id, rollup.date): rollup
+            for rollup in cls.objects.select_for_update().filter(
+                account_id__in=account_ids, date__in=dates
+            )
+        }
+
+        to_update = []
+        to_create = []
+        for (account_id, date), (debit, credit) in deltas.items():
+            rollup = existing.get((account_id, date))
+            if rollup is None:
+                to_create.append(
+                    cls(account_id=account_id, date=date, debit=debit, credit=credit)
+                )
+            else:
+                rollup.debit += debit
+                rollup.credit += credit
+                to_update.append(rollup)
+
+        cls.objects.bulk_update(to_update, ["debit", "credit"])
+        cls.objects.bulk_create(to_create)
+
+    def __str__(self):
+        return f"{self.date} - {self.account.account_name} - Debit: {self.debit} Credit: {self.credit}"
+
+
+class FiscalPeriod(models.Model):
+    """
+    A fiscal period of the books, e.g. a month or a year.
+
+    Closing a period (see periods.close_period) stores the closing totals of every account in PeriodBalance.
+    From then on, entries dated on or before the end of the latest closed period cannot be approved, so the
+    closing totals never go stale, and the statements start from the nearest closed period and only sum the activity after it.
+    """
+
+    STATUS_CHOICES = (
+        ("Open", "Open"),
+        ("Closed", "Closed"),
+    )
+
+    name = models.CharField(max_length=100)
+    start_date = models.DateField()
+    end_date = models.DateField(unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="Open")
+    closed_at = models.DateTimeField(null=True, blank=True)
+    closed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="closed_periods",
+    )
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(start_date__lte=F("end_date")),
+                name="fiscal_period_dates_in_order",
+            )
+        ]
+
+    @classmethod
+    def locked_through(cls):
+        """
+        Returns the end date of the latest closed period (entries dated on or before it are locked), or None.
+        """
+        return (
+            cls.objects.filter(status="Closed")
+            .order_by("-end_date")
+            .values_list("end_date", flat=True)
+            .first()
+        )
+
+    @classmethod
+    def check_open(cls, dates):
+        """
+        Raises a ValidationError if any of the dates falls in a closed period (on or before the latest closed end date).
+        """
+        locked_through = cls.locked_through()
+        if locked_through and dates and min(dates) <= locked_through:
+            raise ValidationError(
+                f"The books are closed through {locked_through}; "
+                f"entries dated on or before it cannot be approved."
+            )
+
+    def __str__(self):
+        return f"{self.name} ({self.start_date} - {self.end_date}) - {self.status}"
+
+
+class PeriodBalance(models.Model):
+    """
+    The closing totals of one account at the end of a closed fiscal period: the debit and credit posted
+    since the start of the books, and the resulting balance (which is the opening balance of the next period).
+    """
+
+    period = models.ForeignKey(
+        "FiscalPeriod", on_delete=models.CASCADE, related_name="balances"
+    )
+    account = models.ForeignKey(
+        "ChartOfAccounts", on_delete=models.CASCADE, related_name="period_balances"
+    )
+    debit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "account"], name="unique_period_balance_per_account"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period.name} - {self.account.account_name} - Balance: {self.balance}"
+
+
+class AccountClassification(models.Model):
+    """
+    Puts an account of the Chart of Accounts on a line of the financial statements or the dashboard ratios,
+    e.g. the Service Revenue account on the revenue of the statement of retained earnings. An account can be on several lines.
+
+    The statements and ratios find the accounts of each line through the Chart of Accounts registry (see registry.py)
+    and sum them by account id, so a new account shows up in the reports once it is classified, without code changes.
+    """
+
+    LINE_CHOICES = (
+        ("income_revenue", "Income Statement: Revenue"),
+        ("income_expense", "Income Statement: Expense"),
+        ("retained_revenue", "Retained Earnings: Revenue"),
+        ("retained_expense", "Retained Earnings: Expense"),
+        ("retained_dividends", "Retained Earnings: Dividends"),
+        ("ratio_cash", "Ratios: Cash"),
+        ("ratio_operating_cash", "Ratios: Operating Cash Flow"),
+        ("ratio_total_debt_service", "Ratios: Total Debt Service"),
+        ("ratio_operating_income", "Ratios: Operating Income"),
+        ("ratio_interest_expense", "Ratios: Interest Expense"),
+        ("ratio_net_sales", "Ratios: Net Sales"),
+        ("ratio_cost_of_goods_sold", "Ratios: Cost of Goods Sold"),
+        ("ratio_gross_profit", "Ratios: Gross Profit"),
+        ("ratio_net_income", "Ratios: Net Income"),
+        ("ratio_inventory", "Ratios: Inventory"),
+    )
+
+    account = models.ForeignKey(
+        "ChartOfAccounts", on_delete=models.CASCADE, related_name="classifications"
+    )
+    line = models.CharField(max_length=30, choices=LINE_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "line"], name="unique_account_classification"
+            )
+        ]
+        indexes = [
+            # The accounts of a statement line are looked up by line
+            models.Index(fields=["line", "account"], name="classification_line_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_name} - {self.get_line_display()}"
+
+
 class JournalEntryGroup(models.Model):
     """
     Model for grouping Journal Entries.
@@ -243,6 +942,22 @@ class JournalEntry(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            # The home page lists the pending entries; the partial index only holds those rows
+            models.Index(
+                fields=["date", "id"],
+                condition=models.Q(status="Pending"),
+                name="journal_entry_pending_idx",
+            ),
+            models.Index(
+                fields=["status", "date"], name="journal_entry_status_date_idx"
+            ),
+            models.Index(
+                fields=["account", "date"], name="journal_entry_account_date_idx"
+            ),
+        ]
+
     @property
     def normal_side(self):
         return self.account.normal_side
@@ -262,32 +977,42 @@ class JournalEntry(models.Model):
     def approve(self):
         """
         this method is used to approve a journal entry
-        and update the account balance in ChartOfAccounts and create a corresponding entry in GeneralLedger
+        and update the account balance in ChartOfAccounts and create a corresponding entry in GeneralLedger.
+        It raises a ValidationError (and approves nothing) if the entry is dated in a closed fiscal period.
         """
         if self.status == "Pending":
             with transaction.atomic():
-                self.status = "Approved"
-                self.save()
-
-                # Update the account balance in ChartOfAccounts
-                account = self.account
-                account.debit += self.debit
-                account.credit += self.credit
-                account.balance = (
-                    account.initial_balance + account.debit - account.credit
+                # Claim the entry in the database, so an entry approved by two workers at once is only posted once
+                claimed = JournalEntry.objects.filter(
+                    pk=self.pk, status="Pending"
+                ).update(status="Approved")
+                if not claimed:
+                    # Another worker approved (or denied) it first, so take its status from the database
+                    self.refresh_from_db(fields=["status"])
+                    return
+
+                # Lock and load the account, then update its balance in ChartOfAccounts (one UPDATE and one audit row)
+                account = ChartOfAccounts.objects.select_for_update().get(
+                    pk=self.account_id
                 )
-                account.save()
-
-                # Create a corresponding entry in GeneralLedger
-                GeneralLedger.objects.create(
-                    account=self.account,
-                    journal_entry=self,  # Link to the JournalEntry instance
-                    date_of_journal_entry=self.date,
-                    description=f"Approved Journal Entry: {self.pk}",
-                    debit=self.debit,
-                    credit=self.credit,
-                    balance=account.balance,
+                self.account = account
+                account.add_to_totals(self.debit, self.credit)
+
+                # Checked once the account row is locked, so it cannot interleave with a period close
+                # (which locks every account); raising rolls the approval back and leaves the entry pending
+                FiscalPeriod.check_open([self.date])
+                self.status = "Approved"
+
+                # Create a corresponding entry in GeneralLedger with its running balance
+                GeneralLedger.post([self], {account.pk: account.initial_balance})
+
+                # Keep the per-day rollup used by the financial statements current
+                AccountBalance.record(
+                    self.account_id, self.date, self.debit, self.credit
                 )
 
+                # Invalidate the cached ratios and reports once the posting commits
+                bump_version_on_commit()
+
     def __str__(self):
         return f"{self.date} - {self.account.account_name} - Status: {self.status}"
@@ -0,0 +1,185 @@
+"""
+This file contains the outbound email queue (outbox) helpers.
+Views queue their emails with queue_mail(), queue_mass_mail() or queue_message() so the request never waits on the SMTP server,
+and the send_queued_email management command calls deliver_pending() to send them in batches.
+"""
+
+import base64
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+from .profiling import profiled
+
+# Delay before the first retry, doubled after each failed attempt up to the maximum
+RETRY_BACKOFF_SECONDS = 60
+MAX_RETRY_BACKOFF_SECONDS = 3600
+# How long a claimed email stays hidden from other workers while it is being sent
+SEND_LEASE_SECONDS = 600
+
+
+@profiled("email")
+def queue_mail(subject, message, from_email, recipient_list):
+    """
+    Queues a plain text email. Takes the same main arguments as django.core.mail.send_mail.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or "",
+        to=list(recipient_list),
+    )
+
+
+@profiled("email")
+def queue_mass_mail(datatuple):
+    """
+    Queues several plain text emails with one insert. Takes the same datatuple as django.core.mail.send_mass_mail:
+    one (subject, message, from_email, recipient_list) tuple per email.
+    """
+    return OutboundEmail.objects.bulk_create(
+        OutboundEmail(
+            subject=subject,
+            body=message,
+            from_email=from_email or "",
+            to=list(recipient_list),
+        )
+        for subject, message, from_email, recipient_list in datatuple
+    )
+
+
+@profiled("email")
+def queue_message(message):
+    """
+    Queues an EmailMessage or EmailMultiAlternatives that would otherwise be sent with message.send().
+    """
+    attachments = []
+    for filename, content, mimetype in message.attachments:
+        if isinstance(content, bytes):
+            attachments.append(
+                [filename, base64.b64encode(content).decode("ascii"), mimetype, True]
+            )
+        else:
+            attachments.append([filename, content, mimetype, False])
+
+    return OutboundEmail.objects.create(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email or "",
+        to=list(message.to) + list(message.cc) + list(message.bcc),
+        alternatives=[list(pair) for pair in getattr(message, "alternatives", [])],
+        attachments=attachments,
+    )
+
+
+def build_message(email, connection=None):
+    """
+    Turns a queued OutboundEmail back into an EmailMultiAlternatives ready to send.
+    """
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.body,
+        email.from_email or settings.DEFAULT_FROM_EMAIL,
+        email.to,
+        connection=connection,
+    )
+    for content, mimetype in email.alternatives:
+        message.attach_alternative(content, mimetype)
+    for filename, content, mimetype, is_base64 in email.attachments:
+        if is_base64:
+            content = base64.b64decode(content)
+        message.attach(filename, content, mimetype)
+    return message
+
+
+def retry_delay(attempts):
+    """
+    Returns how long to wait before the next attempt after the given number of failed attempts.
+    """
+    return timedelta(
+        seconds=min(
+            RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_RETRY_BACKOFF_SECONDS
+        )
+    )
+
+
+def claim_batch(batch_size):
+    """
+    Claims up to batch_size due emails for this worker in one short transaction.
+
+    The claimed rows get their attempt counted and their next_attempt_at moved SEND_LEASE_SECONDS ahead, so other workers
+    skip them while they are being sent. If the worker dies before recording the outcome, the lease simply runs out
+    and the emails are due again.
+
+    Returns:
+        list: The claimed OutboundEmail objects, with attempts already counted.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="Pending", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if emails:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                attempts=F("attempts") + 1,
+                next_attempt_at=now + timedelta(seconds=SEND_LEASE_SECONDS),
+            )
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def deliver_pending(batch_size=100, max_attempts=5):
+    """
+    Sends one batch of due emails over a single reused email connection.
+
+    Each message is sent on its own so one bad address does not fail the batch. A failed message is retried
+    later with an exponential backoff, and marked Failed once it reaches max_attempts.
+    The batch is claimed with claim_batch(), so several workers can run side by side, and the sending happens
+    outside any transaction: no rows stay locked while the SMTP server is talked to, and the outcome of each message
+    is saved right after it is sent, so a crash halfway through the batch does not send the delivered ones again.
+
+    Returns:
+        tuple: The number of messages sent and the number that failed in this batch.
+    """
+    sent = failed = 0
+    emails = claim_batch(batch_size)
+    if not emails:
+        return sent, failed
+
+    connection = get_connection()
+    try:
+        connection.open()
+        connection_error = None
+    except Exception as error:
+        connection_error = error
+
+    for email in emails:
+        try:
+            if connection_error:
+                raise connection_error
+            build_message(email, connection=connection).send()
+        except Exception as error:
+            failed += 1
+            outcome = {"last_error": str(error)}
+            if email.attempts >= max_attempts:
+                outcome["status"] = "Failed"
+            else:
+                outcome["next_attempt_at"] = timezone.now() + retry_delay(
+                    email.attempts
+                )
+        else:
+            sent += 1
+            outcome = {"status": "Sent", "sent_at": timezone.now(), "last_error": ""}
+        OutboundEmail.objects.filter(pk=email.pk).update(**outcome)
+
+    if not connection_error:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,109 @@
+"""
+This file contains the keyset (seek) pagination used by the long list pages.
+Instead of OFFSET, each page continues from the (value, id) of the last row on the previous page,
+so opening any page is a single indexed query no matter how far into the list it is.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+class KeysetPage:
+    """
+    A page of rows with the cursors for the pages before and after it (None when there is no such page).
+    """
+
+    def __init__(self, rows, next_cursor=None, previous_cursor=None):
+        self.rows = rows
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def make_cursor(row, field):
+    """
+    Builds the cursor string for a row, made from the ordering field and the primary key.
+    """
+    return f"{getattr(row, field)}|{row.pk}"
+
+
+def parse_cursor(cursor, model_field):
+    """
+    Splits a cursor string back into the ordering value (converted to the type of the model field) and the primary key.
+    Returns None for a cursor that make_cursor did not build, e.g. one edited by hand or cut short.
+    """
+    try:
+        value, pk = cursor.rsplit("|", 1)
+        value, pk = model_field.to_python(value), int(pk)
+    except (ValueError, ValidationError):
+        return None
+    # Ids past the 64-bit integer range cannot be sent to the database
+    return (value, pk) if 0 <= pk < 2**63 else None
+
+
+def keyset_paginate(
+    queryset, field, after=None, before=None, page_size=PAGE_SIZE, descending=False
+):
+    """
+    Returns one KeysetPage of the queryset ordered by (field, id).
+
+    Parameters:
+        queryset (QuerySet): The rows to paginate.
+        field (str): The main ordering field, e.g. "date_of_journal_entry". The primary key breaks ties.
+        after (str): Cursor of the last row of the previous page, to move forward.
+        before (str): Cursor of the first row of the next page, to move back.
+        page_size (int): The number of rows on a page.
+        descending (bool): Whether the list is ordered newest first.
+
+    An invalid cursor is ignored, so a tampered or truncated link opens the first page.
+    """
+    model_field = queryset.model._meta.get_field(field)
+    after = after and parse_cursor(after, model_field)
+    before = before and parse_cursor(before, model_field)
+
+    forward = "lt" if descending else "gt"
+    backward = "gt" if descending else "lt"
+    ordering = (f"-{field}", "-pk") if descending else (field, "pk")
+    reverse_ordering = (field, "pk") if descending else (f"-{field}", "-pk")
+
+    if before:
+        value, pk = before
+        rows = list(
+            queryset.filter(
+                Q(**{f"{field}__{backward}": value})
+                | Q(**{field: value, f"pk__{backward}": pk})
+            ).order_by(*reverse_ordering)[: page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size]
+        rows.reverse()
+        return KeysetPage(
+            rows,
+            next_cursor=make_cursor(rows[-1], field) if rows else None,
+            previous_cursor=(
+                make_cursor(rows[0], field) if rows and has_previous else None
+            ),
+        )
+
+    if after:
+        value, pk = after
+        queryset = queryset.filter(
+            Q(**{f"{field}__{forward}": value})
+            | Q(**{field: value, f"pk__{forward}": pk})
+        )
+    rows = list(queryset.order_by(*ordering)[: page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    return KeysetPage(
+        rows,
+        next_cursor=make_cursor(rows[-1], field) if rows and has_next else None,
+        # Coming from a previous page means there is always something to go back to
+        previous_cursor=make_cursor(rows[0], field) if rows and after else None,
+    )
@@ -0,0 +1,35 @@
+"""
+This file contains the xhtml2pdf rendering step of the report PDFs.
+It is run inside the render_reports process pool, so it only works on HTML strings and file paths
+and never touches Django's models or database connections.
+"""
+
+import os
+import tempfile
+from io import BytesIO
+
+from xhtml2pdf import pisa
+
+
+def render_pdf(html, path):
+    """
+    Renders the HTML to a PDF file at the given path.
+
+    The PDF is written to a temporary file in the same folder first and then moved into place,
+    so a half-written file is never served from the report cache.
+
+    Returns:
+        str: The error message, or an empty string if the PDF was written.
+    """
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode("ISO-8859-1", "replace")), result)
+    if pdf.err:
+        return "Error generating PDF"
+
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    handle, temporary_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(handle, "wb") as output:
+        output.write(result.getvalue())
+    os.replace(temporary_path, path)
+    return ""
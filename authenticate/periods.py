@@ -0,0 +1,68 @@
+"""
+This file contains the fiscal period close.
+Closing a period freezes the totals of every account at its end date in PeriodBalance. The statements then start
+from the nearest closed period and only sum the activity after it (see reporting.period_totals), and entries dated
+on or before the latest closed period can no longer be approved (see FiscalPeriod.check_open), so the frozen
+totals stay correct.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChartOfAccounts, FiscalPeriod, PeriodBalance
+from .reporting import cumulative_totals
+from .versioning import bump_version_on_commit
+
+
+def close_period(period, user=None):
+    """
+    Closes a fiscal period, storing the closing totals and balance of every account at its end date.
+
+    Every account row is locked first, the same rows the approvals lock, so approvals in progress finish before
+    the totals are read and approvals waiting behind the close see the period as closed.
+
+    Parameters:
+        period (FiscalPeriod): The period to close.
+        user (CustomUser): The user closing the period, if any.
+
+    Returns:
+        list: The PeriodBalance rows that were created.
+
+    Raises:
+        ValidationError: If the period is already closed.
+    """
+    with transaction.atomic():
+        period = FiscalPeriod.objects.select_for_update().get(pk=period.pk)
+        if period.status == "Closed":
+            raise ValidationError(f"{period.name} is already closed.")
+
+        opening_balances = dict(
+            ChartOfAccounts.objects.select_for_update()
+            .order_by("pk")
+            .values_list("pk", "initial_balance")
+        )
+        totals = cumulative_totals(period.end_date)
+        balances = PeriodBalance.objects.bulk_create(
+            [
+                PeriodBalance(
+                    period=period,
+                    account_id=account_id,
+                    debit=totals[account_id][0],
+                    credit=totals[account_id][1],
+                    balance=initial_balance
+                    + totals[account_id][0]
+                    - totals[account_id][1],
+                )
+                for account_id, initial_balance in opening_balances.items()
+            ]
+        )
+
+        period.status = "Closed"
+        period.closed_at = timezone.now()
+        period.closed_by = user
+        period.save(update_fields=["status", "closed_at", "closed_by"])
+
+        # The statements are read differently from now on; the cached ones are rebuilt on the next request
+        bump_version_on_commit()
+    return balances
@@ -0,0 +1,199 @@
+"""
+This file contains the opt-in request profiler.
+
+When settings.PROFILING_ENABLED is on, ProfilingMiddleware profiles a sample of the requests
+(settings.PROFILING_SAMPLE_RATE) and records, per request, the total time, the number and time of the SQL queries,
+the template render time and the time spent on email and PDF work. Each profile is appended as one JSON line to
+settings.PROFILING_LOG_FILE (if set) and added to in-process totals per view, shown to staff by the profiling_stats view.
+
+When profiling is disabled the middleware removes itself at startup (MiddlewareNotUsed), so it costs nothing.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+# The profile of the request being handled, or None when it is not sampled
+_current_profile = ContextVar("current_profile", default=None)
+
+# Totals per view since the process started: view name -> field -> value
+_stats = defaultdict(lambda: defaultdict(float))
+_stats_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+PROFILE_SECTIONS = ("sql", "template", "email", "pdf")
+
+# Requests that match no URL pattern are added up under one name, so probing random paths cannot grow the totals
+UNRESOLVED_VIEW = "<unresolved>"
+
+
+class RequestProfile:
+    """
+    The timings collected for one request, in milliseconds.
+    """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.milliseconds = defaultdict(float)
+        # The sections being timed right now, so nested calls are not counted twice
+        self.open_sections = set()
+
+    def add(self, section, started):
+        self.milliseconds[section] += (time.perf_counter() - started) * 1000
+
+
+@contextmanager
+def timed(section):
+    """
+    Adds the time spent in the block to the given section of the current request's profile.
+    Does nothing when the request is not being profiled.
+    """
+    profile = _current_profile.get()
+    if profile is None or section in profile.open_sections:
+        yield
+        return
+    profile.open_sections.add(section)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.open_sections.discard(section)
+        profile.add(section, started)
+
+
+def profiled(section):
+    """
+    Decorator that times every call of the function under the given section (e.g. "email" or "pdf").
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(section):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper that counts and times every query of a profiled request.
+    """
+    profile = _current_profile.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_count += 1
+        profile.add("sql", started)
+
+
+def instrument_templates():
+    """
+    Times the rendering of every Django template. Only called when profiling is enabled.
+    Templates rendered inside another one (like form widgets) are part of the outer render and are not counted twice.
+    """
+    if getattr(Template.render, "profiled", False):
+        return
+    Template.render = profiled("template")(Template.render)
+    Template.render.profiled = True
+
+
+def record(view_name, status_code, total_ms, profile):
+    """
+    Writes the profile of one request to the JSON lines log and adds it to the per view totals.
+    """
+    entry = {
+        "time": time.time(),
+        "view": view_name,
+        "status": status_code,
+        "total_ms": round(total_ms, 3),
+        "sql_count": profile.sql_count,
+    }
+    for section in PROFILE_SECTIONS:
+        entry[f"{section}_ms"] = round(profile.milliseconds[section], 3)
+
+    with _stats_lock:
+        stats = _stats[view_name]
+        stats["requests"] += 1
+        stats["max_total_ms"] = max(stats["max_total_ms"], entry["total_ms"])
+        for field in ("total_ms", "sql_count") + tuple(
+            f"{section}_ms" for section in PROFILE_SECTIONS
+        ):
+            stats[field] += entry[field]
+
+    if settings.PROFILING_LOG_FILE:
+        with _log_lock, open(settings.PROFILING_LOG_FILE, "a") as log:
+            log.write(json.dumps(entry) + "\n")
+
+
+def stats_summary():
+    """
+    Returns the per view totals as averages per request, slowest views first.
+    """
+    with _stats_lock:
+        rows = []
+        for view_name, stats in _stats.items():
+            requests = stats["requests"]
+            row = {"view": view_name, "requests": int(requests)}
+            for field, value in stats.items():
+                if field.endswith("_ms") and not field.startswith("max"):
+                    row[f"avg_{field}"] = round(value / requests, 3)
+            row["avg_sql_count"] = round(stats["sql_count"] / requests, 2)
+            row["max_total_ms"] = stats["max_total_ms"]
+            rows.append(row)
+    return sorted(rows, key=lambda row: row["avg_total_ms"], reverse=True)
+
+
+def reset_stats():
+    """
+    Clears the per view totals.
+    """
+    with _stats_lock:
+        _stats.clear()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of the requests. Put it first in MIDDLEWARE so the total time covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        instrument_templates()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        view_name = match.view_name if match else UNRESOLVED_VIEW
+        record(view_name, response.status_code, total_ms, profile)
+        return response
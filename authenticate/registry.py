@@ -0,0 +1,124 @@
+"""
+This file contains the process-local Chart of Accounts registry.
+The Chart of Accounts is small and rarely changes, so each worker process keeps the fields used to look up and
+classify accounts (name, number, category, subcategory, normal side, statement) in memory, and the hot views use it
+instead of querying or joining the Chart of Accounts on every request.
+
+Each account also carries the statement lines it is classified on (see AccountClassification), read in the same query,
+so the statements and ratios pick their accounts by id rather than by name.
+
+The registry is tied to the CoA version counter (see versioning.py). The CoA signals bump the counter once a
+transaction that added, edited or deactivated an account commits, and since the counter lives in the shared cache,
+every gunicorn worker reloads its copy (one query) on its next lookup. The worker that made the change drops its copy
+at once instead (see forget_registry). Balances are not kept here, as they change with every approval.
+"""
+
+from collections import namedtuple
+from itertools import groupby
+
+from django.db import connection, transaction
+
+from .models import ChartOfAccounts
+from .routers import read_from_primary
+from .versioning import COA_VERSION_KEY, get_version
+
+# The Chart of Accounts fields kept in the registry, one tuple per account, and the account's statement lines
+AccountInfo = namedtuple(
+    "AccountInfo",
+    [
+        "id",
+        "account_name",
+        "account_number",
+        "account_category",
+        "account_subcategory",
+        "normal_side",
+        "statement",
+        "is_active",
+        "lines",
+    ],
+)
+
+
+class AccountRegistry:
+    """
+    The accounts of one CoA version, looked up by id or by name.
+    """
+
+    def __init__(self, version, accounts):
+        self.version = version
+        self.accounts = accounts
+        self.by_id = {account.id: account for account in accounts}
+        self.by_name = {account.account_name: account for account in accounts}
+
+    def ids_on_line(self, line):
+        """
+        Returns the ids of the accounts classified on the given statement line, e.g. "retained_revenue".
+        """
+        return [account.id for account in self.accounts if line in account.lines]
+
+    def ids_in_categories(self, categories):
+        """
+        Returns the ids of the accounts in the given categories, e.g. ["Assets"].
+        """
+        return [
+            account.id
+            for account in self.accounts
+            if account.account_category in categories
+        ]
+
+
+_registry = None
+
+# True from a Chart of Accounts change made in a transaction until that transaction ends (see forget_registry)
+_changed_in_transaction = False
+
+
+def forget_registry():
+    """
+    Drops this process's registry after a Chart of Accounts change, so the rest of the transaction sees the change.
+
+    Until the transaction commits, the registry is reloaded on every lookup and not kept, as the transaction may still
+    be rolled back and the CoA version is only bumped when it commits.
+    """
+    global _registry, _changed_in_transaction
+    _registry = None
+    if connection.in_atomic_block:
+        _changed_in_transaction = True
+        transaction.on_commit(changes_committed)
+
+
+def changes_committed():
+    # The CoA version is bumped right after, so the registry can be kept again
+    global _changed_in_transaction
+    _changed_in_transaction = False
+
+
+def get_registry():
+    """
+    Returns the registry of the current CoA version, loading it with one query if an account changed since the last call.
+    """
+    global _registry, _changed_in_transaction
+    if _changed_in_transaction and not connection.in_atomic_block:
+        # The transaction that changed the accounts was rolled back
+        _changed_in_transaction = False
+    # The version is read before the accounts, so a change made in between only causes one extra reload later
+    version = get_version(COA_VERSION_KEY)
+    registry = _registry
+    if registry is None or registry.version != version:
+        # One row per account and statement line (or one row with no line), next to each other.
+        # Read from the primary, as a lagging replica would be cached under the new version.
+        with read_from_primary():
+            rows = list(
+                ChartOfAccounts.objects.order_by("account_name", "id").values_list(
+                    *AccountInfo._fields[:-1], "classifications__line"
+                )
+            )
+        accounts = []
+        for account_id, account_rows in groupby(rows, key=lambda row: row[0]):
+            account_rows = list(account_rows)
+            lines = frozenset(row[-1] for row in account_rows if row[-1])
+            accounts.append(AccountInfo(*account_rows[0][:-1], lines))
+        registry = AccountRegistry(version, accounts)
+        if not _changed_in_transaction:
+            _registry = registry
+    return registry
@@ -0,0 +1,595 @@
+"""
+This file contains the reporting helpers shared by the financial statement views.
+The statements are computed from the AccountBalance rollup (one row per account per day)
+instead of scanning the whole JournalEntry table on every request, starting from the closing totals of the
+nearest closed fiscal period (see period_totals), so only the activity since the last close is summed.
+All the sums are done by the database, so the views only ever handle one compact row per account.
+
+Accounts are named and classified with the in-memory Chart of Accounts registry (see registry.py), including the
+statement lines they are classified on (see AccountClassification), so the statement queries only read the rollup
+table by account id and never join or match names in the Chart of Accounts.
+
+The *_context functions build each statement once, for both the statement pages and the rendered PDFs.
+comparative_context builds a statement for several months, quarters or years side by side from one grouped query.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncQuarter, TruncYear
+from django.utils.dateparse import parse_date
+
+from .models import AccountBalance, FiscalPeriod, PeriodBalance
+from .registry import get_registry
+
+
+def filter_date_range(queryset, start_date=None, end_date=None, field="date"):
+    """
+    Filters a queryset on an inclusive date range. Either end of the range can be left empty.
+    """
+    if start_date:
+        queryset = queryset.filter(**{f"{field}__gte": start_date})
+    if end_date:
+        queryset = queryset.filter(**{f"{field}__lte": end_date})
+    return queryset
+
+
+def filter_journal(queryset, start_date=None, end_date=None, account=None, status=None):
+    """
+    Applies the journal entry list filters (date range, account and status) to a JournalEntry queryset.
+    Empty filters are skipped.
+    """
+    queryset = filter_date_range(queryset, start_date, end_date)
+    if account:
+        queryset = queryset.filter(account=account)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def as_date(value):
+    """
+    Returns the value as a date. Strings (like the start_date/end_date GET parameters) are parsed, and empty values give None.
+    """
+    if not value or isinstance(value, date):
+        return value or None
+    try:
+        parsed = parse_date(value)
+    except ValueError:  # well formed, but not a real date, like 2024-02-30
+        parsed = None
+    if parsed is None:
+        raise ValidationError(f"{value} is not a valid date.")
+    return parsed
+
+
+def rollup_sums(start_date=None, end_date=None, account_ids=None):
+    """
+    Sums the daily balance rollup per account over the date range, as {account_id: [debit, credit]}.
+    """
+    rollups = filter_date_range(AccountBalance.objects.all(), start_date, end_date)
+    if account_ids is not None:
+        rollups = rollups.filter(account_id__in=account_ids)
+    rows = (
+        rollups.values("account_id")
+        .annotate(total_debit=Sum("debit"), total_credit=Sum("credit"))
+        .order_by("account_id")
+    )
+    return defaultdict(
+        lambda: [Decimal("0"), Decimal("0")],
+        {row["account_id"]: [row["total_debit"], row["total_credit"]] for row in rows},
+    )
+
+
+def closed_snapshots():
+    """
+    Returns the (end date, period id) of every closed fiscal period, oldest first.
+    """
+    return list(
+        FiscalPeriod.objects.filter(status="Closed")
+        .order_by("end_date")
+        .values_list("end_date", "id")
+    )
+
+
+def nearest_snapshot(snapshots, as_of):
+    """
+    Returns the latest of the snapshots ending on or before as_of (or the latest of all if as_of is None), or None.
+    """
+    eligible = [
+        snapshot for snapshot in snapshots if as_of is None or snapshot[0] <= as_of
+    ]
+    return eligible[-1] if eligible else None
+
+
+def cumulative_totals(as_of=None, account_ids=None, snapshots=None):
+    """
+    Returns the total debit and credit posted to each account from the start of the books through as_of
+    (or through the last posting if as_of is None), as {account_id: [debit, credit]}.
+
+    They are the closing totals of the nearest closed fiscal period plus the rollup of the days after it,
+    so only the activity since that close is summed.
+    """
+    if snapshots is None:
+        snapshots = closed_snapshots()
+    snapshot = nearest_snapshot(snapshots, as_of)
+    if snapshot is None:
+        return rollup_sums(None, as_of, account_ids)
+
+    end_date, period_id = snapshot
+    totals = rollup_sums(end_date + timedelta(days=1), as_of, account_ids)
+    closing = PeriodBalance.objects.filter(period_id=period_id)
+    if account_ids is not None:
+        closing = closing.filter(account_id__in=account_ids)
+    for account_id, debit, credit in closing.values_list(
+        "account_id", "debit", "credit"
+    ):
+        totals[account_id][0] += debit
+        totals[account_id][1] += credit
+    return totals
+
+
+def period_totals(start_date=None, end_date=None, account_ids=None):
+    """
+    Returns the total debit and credit posted to each account in the date range, as {account_id: [debit, credit]}.
+
+    A range starting at the beginning of the books (no start date) is read from the nearest closed fiscal period plus
+    the activity after it. Otherwise the totals come from whichever reads fewer days of the rollup: the range itself,
+    or the difference of the cumulative totals at both ends of the range. Either way, the cost follows the activity
+    since the last close rather than the age of the books.
+
+    With settings.REPORTING_ENGINE set to "numpy", the totals come from the in-memory journal extract instead (see vectorized.py).
+    A range that ends before it starts has no activity.
+    """
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    if start_date and end_date and end_date < start_date:
+        return defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    if settings.REPORTING_ENGINE == "numpy":
+        from .vectorized import period_totals as vectorized_totals
+
+        return vectorized_totals(start_date, end_date, account_ids)
+
+    snapshots = closed_snapshots()
+    if start_date is None:
+        return cumulative_totals(end_date, account_ids, snapshots)
+
+    day_before = start_date - timedelta(days=1)
+    before_snapshot = nearest_snapshot(snapshots, day_before)
+    if before_snapshot is not None:
+        last_day = end_date or date.today()
+        # The end snapshot is at least the start one, as the range is in order
+        end_snapshot = nearest_snapshot(snapshots, end_date) or before_snapshot
+        tail_days = (last_day - end_snapshot[0]).days + (
+            day_before - before_snapshot[0]
+        ).days
+        if tail_days < (last_day - start_date).days:
+            totals = cumulative_totals(end_date, account_ids, snapshots)
+            for account_id, (debit, credit) in cumulative_totals(
+                day_before, account_ids, snapshots
+            ).items():
+                totals[account_id][0] -= debit
+                totals[account_id][1] -= credit
+            return totals
+    return rollup_sums(start_date, end_date, account_ids)
+
+
+def account_totals(start_date=None, end_date=None, account_ids=None, sums=None):
+    """
+    Returns the total debit and credit posted to each account in the date range, ordered by account name.
+
+    Each row is a dictionary with the keys account__account_name, account__account_category,
+    total_debit and total_credit, which is the shape the statement templates expect.
+    The totals are summed per account id (see period_totals) and named from the registry, so the Chart of Accounts is not read.
+    Accounts with no activity in the range are left out. Pass account_ids to only include those accounts, and sums
+    to name totals that were already summed (like one column of a comparative report) instead of querying them.
+    """
+    registry = get_registry()
+    if sums is None:
+        sums = period_totals(start_date, end_date, account_ids)
+    wanted = None if account_ids is None else set(account_ids)
+    rows = []
+    for account_id, (debit, credit) in sums.items():
+        if wanted is not None and account_id not in wanted:
+            continue
+        account = registry.by_id.get(account_id)
+        if account is None:
+            continue  # added after the registry was loaded; it shows up once the new CoA version is read
+        if not debit and not credit:
+            continue
+        rows.append(
+            {
+                "account__account_name": account.account_name,
+                "account__account_category": account.account_category,
+                "total_debit": debit,
+                "total_credit": credit,
+            }
+        )
+    rows.sort(key=lambda row: row["account__account_name"])
+    return rows
+
+
+def accounts_by_category(start_date=None, end_date=None, categories=(), sums=None):
+    """
+    Returns the per-account totals for the given account categories, grouped into a dictionary
+    keyed by category.
+    """
+    sections = defaultdict(list)
+    account_ids = get_registry().ids_in_categories(categories)
+    for row in account_totals(start_date, end_date, account_ids, sums):
+        sections[row["account__account_category"]].append(row)
+    return sections
+
+
+def trial_balance_context(start_date=None, end_date=None, sums=None):
+    """
+    Builds the trial balance: the total debit and credit of each account, and the grand totals.
+    """
+    # Per-account debit and credit totals from the daily balance rollup
+    accounts = account_totals(start_date, end_date, sums=sums)
+
+    # Calculate total debit and credit
+    total_debit = sum(account["total_debit"] for account in accounts)
+    total_credit = sum(account["total_credit"] for account in accounts)
+
+    return {
+        "accounts": accounts,
+        "total_debit": total_debit,
+        "total_credit": total_credit,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+
+def income_statement_context(start_date=None, end_date=None, sums=None):
+    """
+    Builds the income statement: the revenue and expense accounts, their totals, and the net income.
+    """
+    # The revenue and expense accounts are the ones classified on those lines of the income statement
+    registry = get_registry()
+    revenue_ids = registry.ids_on_line("income_revenue")
+    expense_ids = registry.ids_on_line("income_expense")
+
+    # Per-account debit and credit totals from the daily balance rollup, read together
+    if sums is None:
+        sums = period_totals(start_date, end_date, revenue_ids + expense_ids)
+    revenue_accounts = account_totals(account_ids=revenue_ids, sums=sums)
+    expense_accounts = account_totals(account_ids=expense_ids, sums=sums)
+
+    # Calculate total revenue
+    total_revenue = sum(
+        account["total_credit"] - account["total_debit"] for account in revenue_accounts
+    )
+
+    # Calculate total expenses
+    total_expenses = sum(
+        account["total_debit"] - account["total_credit"] for account in expense_accounts
+    )
+
+    # Calculate net income
+    net_income = total_revenue - total_expenses
+
+    return {
+        "revenue_accounts": revenue_accounts,
+        "expense_accounts": expense_accounts,
+        "total_revenue": total_revenue,
+        "total_expenses": total_expenses,
+        "net_income": net_income,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+
+def balance_sheet_context(start_date=None, end_date=None, sums=None):
+    """
+    Builds the balance sheet: the asset, liability and equity accounts and their totals.
+    """
+    # Define categories
+    assets_categories = ["Assets"]
+    liabilities_categories = ["Liabilities"]
+    equity_categories = ["Equity"]
+
+    # Per-account rows for the three sections
+    sections = accounts_by_category(
+        start_date,
+        end_date,
+        assets_categories + liabilities_categories + equity_categories,
+        sums,
+    )
+    asset_entries = [row for c in assets_categories for row in sections[c]]
+    liability_entries = [row for c in liabilities_categories for row in sections[c]]
+    equity_entries = [row for c in equity_categories for row in sections[c]]
+
+    # Calculate totals from the rows: debit balances for assets, credit balances for liabilities and equity
+    totals = {
+        "total_assets": sum(
+            (row["total_debit"] - row["total_credit"] for row in asset_entries),
+            Decimal("0"),
+        ),
+        "total_liabilities": sum(
+            (row["total_credit"] - row["total_debit"] for row in liability_entries),
+            Decimal("0"),
+        ),
+        "total_equity": sum(
+            (row["total_credit"] - row["total_debit"] for row in equity_entries),
+            Decimal("0"),
+        ),
+    }
+
+    return {
+        "asset_entries": asset_entries,
+        "liability_entries": liability_entries,
+        "equity_entries": equity_entries,
+        "total_assets": totals["total_assets"],
+        "total_liabilities": totals["total_liabilities"],
+        "total_equity": totals["total_equity"],
+        # Total Liabilities and Stockholders' Equity
+        "total_liabilities_and_equity": totals["total_liabilities"]
+        + totals["total_equity"],
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+
+def retained_earnings_context(start_date=None, end_date=None, sums=None):
+    """
+    Builds the statement of retained earnings: the net income, the dividends, and the retained earnings.
+    """
+    # Per-account totals of the accounts classified on the three lines of the statement, read together
+    registry = get_registry()
+    revenue_ids = registry.ids_on_line("retained_revenue")
+    expense_ids = registry.ids_on_line("retained_expense")
+    dividends_ids = registry.ids_on_line("retained_dividends")
+    if sums is None:
+        sums = period_totals(
+            start_date, end_date, revenue_ids + expense_ids + dividends_ids
+        )
+    amounts = defaultdict(lambda: [Decimal("0"), Decimal("0")], sums)
+    totals = {
+        "total_revenue": sum(
+            (amounts[account_id][1] for account_id in revenue_ids), Decimal("0")
+        ),
+        "total_expenses": sum(
+            (amounts[account_id][0] for account_id in expense_ids), Decimal("0")
+        ),
+        "total_dividends": sum(
+            (amounts[account_id][0] for account_id in dividends_ids), Decimal("0")
+        ),
+    }
+
+    # Calculate net income and retained earnings
+    net_income = totals["total_revenue"] - totals["total_expenses"]
+    retained_earnings = net_income - totals["total_dividends"]
+
+    return {
+        "net_income": net_income,
+        "total_dividends": totals["total_dividends"],
+        "retained_earnings": retained_earnings,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+
+# The context builder of each financial statement, by ReportJob.statement
+STATEMENT_CONTEXTS = {
+    "trial_balance": trial_balance_context,
+    "income_statement": income_statement_context,
+    "balance_sheet": balance_sheet_context,
+    "retained_earnings": retained_earnings_context,
+}
+
+
+# The periods a comparative report can be split into, with the database function that truncates a date to the start of its period
+COMPARATIVE_PERIODS = {
+    "month": TruncMonth,
+    "quarter": TruncQuarter,
+    "year": TruncYear,
+}
+
+# The most columns a comparative report may have, e.g. three years of months
+MAX_COMPARATIVE_COLUMNS = 36
+
+# How each statement is laid out in a comparative report: its title, its sections as
+# (title, context key of the account rows, 1 to show debit balances or -1 for credit balances, context key of the section total),
+# and its summary lines as (label, context key)
+COMPARATIVE_LAYOUTS = {
+    "trial_balance": (
+        "Trial Balance",
+        [("Accounts", "accounts", 1, None)],
+        [("Total Debit", "total_debit"), ("Total Credit", "total_credit")],
+    ),
+    "income_statement": (
+        "Income Statement",
+        [
+            ("Revenues", "revenue_accounts", -1, "total_revenue"),
+            ("Expenses", "expense_accounts", 1, "total_expenses"),
+        ],
+        [("Net Income", "net_income")],
+    ),
+    "balance_sheet": (
+        "Balance Sheet",
+        [
+            ("Assets", "asset_entries", 1, "total_assets"),
+            ("Liabilities", "liability_entries", -1, "total_liabilities"),
+            ("Equity", "equity_entries", -1, "total_equity"),
+        ],
+        [
+            (
+                "Total Liabilities and Stockholders' Equity",
+                "total_liabilities_and_equity",
+            )
+        ],
+    ),
+    "retained_earnings": (
+        "Retained Earnings",
+        [],
+        [
+            ("Net Income", "net_income"),
+            ("Dividends", "total_dividends"),
+            ("Retained Earnings", "retained_earnings"),
+        ],
+    ),
+}
+
+
+def period_start(day, period):
+    """
+    Returns the first day of the month, quarter or year the day falls in.
+    """
+    if period == "year":
+        return date(day.year, 1, 1)
+    if period == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return date(day.year, day.month, 1)
+
+
+def next_period_start(day, period):
+    """
+    Returns the first day of the month, quarter or year after the one the day falls in.
+    """
+    start = period_start(day, period)
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def period_label(start, period):
+    """
+    Returns the column heading of a period, e.g. "Mar 2024", "2024 Q1" or "2024".
+    """
+    if period == "year":
+        return str(start.year)
+    if period == "quarter":
+        return f"{start.year} Q{(start.month - 1) // 3 + 1}"
+    return start.strftime("%b %Y")
+
+
+def comparative_columns(start_date, end_date, period):
+    """
+    Splits the date range into its months, quarters or years, as (start, end) pairs.
+    The first and last columns are cut at the ends of the range.
+    """
+    columns = []
+    start = start_date
+    while start <= end_date:
+        end = min(next_period_start(start, period) - timedelta(days=1), end_date)
+        columns.append((start, end))
+        start = end + timedelta(days=1)
+    return columns
+
+
+def bucketed_sums(start_date, end_date, period):
+    """
+    Returns the total debit and credit posted to each account in each period of the date range, as
+    {period start: {account_id: [debit, credit]}}, with one grouped query over the daily balance rollup.
+    """
+    if settings.REPORTING_ENGINE == "numpy":
+        from .vectorized import period_totals as vectorized_totals
+
+        return {
+            start: vectorized_totals(start, end)
+            for start, end in comparative_columns(start_date, end_date, period)
+        }
+
+    rows = (
+        filter_date_range(AccountBalance.objects.all(), start_date, end_date)
+        .annotate(bucket=COMPARATIVE_PERIODS[period]("date"))
+        .values("bucket", "account_id")
+        .annotate(total_debit=Sum("debit"), total_credit=Sum("credit"))
+        .order_by("bucket", "account_id")
+    )
+    sums = defaultdict(dict)
+    for row in rows:
+        # The first period can start before the range; its column is keyed by the start of the range
+        start = max(row["bucket"], start_date)
+        sums[start][row["account_id"]] = [row["total_debit"], row["total_credit"]]
+    return sums
+
+
+def comparative_context(statement, start_date, end_date, period="month"):
+    """
+    Builds a statement for every month, quarter or year of the date range, side by side.
+
+    All the columns are summed with one grouped query (see bucketed_sums), so a 12-month comparative costs about
+    the same as the statement over the whole year. Each column is then built by the statement's own *_context
+    function, so it shows the same numbers as the statement over that period.
+
+    Returns:
+        dict: The title, the columns (label, start_date and end_date), the sections (title, rows of account name
+        and amounts, and total amounts) and the summary lines (label and amounts), with one amount per column.
+
+    Raises:
+        ValidationError: If the statement, the period or the date range is not valid.
+    """
+    if statement not in COMPARATIVE_LAYOUTS:
+        raise ValidationError(f"Unknown statement {statement}.")
+    if period not in COMPARATIVE_PERIODS:
+        raise ValidationError(f"Unknown period {period}.")
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    if not start_date or not end_date or start_date > end_date:
+        raise ValidationError("Choose a start date on or before the end date.")
+    columns = comparative_columns(start_date, end_date, period)
+    if len(columns) > MAX_COMPARATIVE_COLUMNS:
+        raise ValidationError(
+            f"A comparative report can have at most {MAX_COMPARATIVE_COLUMNS} columns; choose a shorter range or a longer period."
+        )
+
+    title, section_layouts, summary_layouts = COMPARATIVE_LAYOUTS[statement]
+    build_context = STATEMENT_CONTEXTS[statement]
+    sums = bucketed_sums(start_date, end_date, period)
+    contexts = [
+        build_context(start, end, sums=sums.get(start, {})) for start, end in columns
+    ]
+
+    sections = []
+    for section_title, rows_key, sign, total_key in section_layouts:
+        # Amounts by account name, one dictionary per column
+        amounts = [
+            {
+                row["account__account_name"]: sign
+                * (row["total_debit"] - row["total_credit"])
+                for row in context[rows_key]
+            }
+            for context in contexts
+        ]
+        names = sorted({name for column in amounts for name in column})
+        sections.append(
+            {
+                "title": section_title,
+                "rows": [
+                    {
+                        "name": name,
+                        "amounts": [
+                            column.get(name, Decimal("0")) for column in amounts
+                        ],
+                    }
+                    for name in names
+                ],
+                "totals": (
+                    [context[total_key] for context in contexts] if total_key else None
+                ),
+            }
+        )
+
+    return {
+        "statement": statement,
+        "title": title,
+        "period": period,
+        "columns": [
+            {
+                "label": period_label(period_start(start, period), period),
+                "start_date": start,
+                "end_date": end,
+            }
+            for start, end in columns
+        ],
+        "sections": sections,
+        "summary": [
+            {"label": label, "amounts": [context[key] for context in contexts]}
+            for label, key in summary_layouts
+        ],
+        "start_date": start_date,
+        "end_date": end_date,
+    }
@@ -0,0 +1,264 @@
+"""
+This file contains the background rendering of the financial statement PDFs.
+The views call request_report() to queue a ReportJob, and the render_reports management command calls
+render_pending() to render the jobs in a process pool, off the request path.
+
+Rendered PDFs are kept in the report cache folder (settings.REPORT_CACHE_DIR), keyed by statement,
+date range and ledger version, so repeat downloads of the same period are served straight from disk
+until the next posting bumps the ledger version. The render_reports worker prunes the folder whenever the queue is empty:
+a PDF is removed once it is older than settings.REPORT_CACHE_MAX_AGE, or once it is a few minutes old if a newer
+ledger version has made it unreachable (see prune_report_cache).
+
+A claimed job records when it started. A job still Running after settings.REPORT_JOB_TIMEOUT is taken to belong to a
+worker that died (OOM, SIGKILL, a deploy): it is no longer handed out to new requests, and the next worker queues it again.
+"""
+
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import ReportJob
+from .outbox import queue_message
+from .pdf import render_pdf
+from .profiling import profiled
+from .reporting import STATEMENT_CONTEXTS
+from .versioning import get_version
+
+# Seconds a PDF of an older ledger version is kept, so a job rendered just before a posting can still be downloaded
+STALE_REPORT_GRACE_SECONDS = 600
+
+# The PDF template of each financial statement, by ReportJob.statement
+STATEMENT_TEMPLATES = {
+    "trial_balance": "main_page/pdf/trial_balance.html",
+    "income_statement": "main_page/pdf/income_statement.html",
+    "balance_sheet": "main_page/pdf/balance_sheet.html",
+    "retained_earnings": "main_page/pdf/retained_earnings.html",
+}
+
+
+def stalled_before():
+    """
+    Returns the time before which a Running job is taken to belong to a dead worker (see settings.REPORT_JOB_TIMEOUT).
+    """
+    return timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+
+
+def requeue_stalled_jobs():
+    """
+    Puts the jobs that have been Running for longer than settings.REPORT_JOB_TIMEOUT back in the queue.
+
+    Returns:
+        int: The number of jobs queued again.
+    """
+    return ReportJob.objects.filter(
+        status="Running", started_at__lt=stalled_before()
+    ).update(status="Pending", started_at=None)
+
+
+def cache_path(statement, start_date, end_date, ledger_version):
+    """
+    Returns the path of the cached PDF for a statement, date range and ledger version.
+    """
+    filename = (
+        f"{statement}_{start_date or 'start'}_{end_date or 'end'}_v{ledger_version}.pdf"
+    )
+    return os.path.join(settings.REPORT_CACHE_DIR, filename)
+
+
+def prune_report_cache(max_age=None):
+    """
+    Removes the PDFs that can no longer be served from the report cache folder: the ones older than max_age seconds
+    (settings.REPORT_CACHE_MAX_AGE by default), and the ones of an older ledger version after STALE_REPORT_GRACE_SECONDS.
+
+    Returns:
+        int: The number of files removed.
+    """
+    if max_age is None:
+        max_age = settings.REPORT_CACHE_MAX_AGE
+    current_suffix = f"_v{get_version()}.pdf"
+    now = time.time()
+    removed = 0
+    try:
+        entries = list(os.scandir(settings.REPORT_CACHE_DIR))
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        if not entry.name.endswith(".pdf") or not entry.is_file():
+            continue
+        try:
+            age = now - entry.stat().st_mtime
+            stale = not entry.name.endswith(current_suffix)
+            if age > max_age or (stale and age > STALE_REPORT_GRACE_SECONDS):
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # removed by another worker
+    return removed
+
+
+@profiled("pdf")
+def cached_report(statement, start_date=None, end_date=None):
+    """
+    Returns the path of the cached PDF for the current ledger version, or None if it has not been rendered yet.
+    """
+    path = cache_path(statement, start_date, end_date, get_version())
+    return path if os.path.exists(path) else None
+
+
+@profiled("pdf")
+def request_report(
+    statement,
+    start_date=None,
+    end_date=None,
+    user=None,
+    email_from="",
+    email_to=(),
+    email_subject="",
+    email_body="",
+):
+    """
+    Queues a statement PDF to be rendered by the render_reports worker.
+
+    A download reuses the pending or running job for the same statement, period and ledger version if there is one,
+    unless that job has been running for so long that its worker is taken to be dead.
+    An emailed report always gets its own job, and the email is queued in the outbox once the PDF is ready.
+
+    Parameters:
+        statement (str): One of the keys of STATEMENT_TEMPLATES.
+        start_date (date): The first day of the period, or None.
+        end_date (date): The last day of the period, or None.
+        user (CustomUser): The user asking for the report, or None.
+
+    Returns:
+        ReportJob: The queued job.
+    """
+    ledger_version = get_version()
+    if not email_to:
+        job = (
+            ReportJob.objects.filter(
+                statement=statement,
+                start_date=start_date,
+                end_date=end_date,
+                ledger_version=ledger_version,
+                email_to=[],
+            )
+            .filter(
+                Q(status="Pending")
+                | Q(status="Running", started_at__gte=stalled_before())
+            )
+            .order_by("id")
+            .first()
+        )
+        if job:
+            return job
+
+    return ReportJob.objects.create(
+        statement=statement,
+        start_date=start_date,
+        end_date=end_date,
+        ledger_version=ledger_version,
+        requested_by=user,
+        email_from=email_from,
+        email_to=list(email_to),
+        email_subject=email_subject,
+        email_body=email_body,
+    )
+
+
+def render_html(job):
+    """
+    Renders the PDF template of a job's statement to HTML, with the statement computed from the books.
+    """
+    context = STATEMENT_CONTEXTS[job.statement](job.start_date, job.end_date)
+    return render_to_string(STATEMENT_TEMPLATES[job.statement], context)
+
+
+def send_report(job):
+    """
+    Queues the email of an emailed report, with the rendered PDF attached.
+    """
+    message = EmailMultiAlternatives(
+        job.email_subject, job.email_body, job.email_from, job.email_to
+    )
+    with open(job.file_path, "rb") as pdf:
+        message.attach(f"{job.statement}.pdf", pdf.read(), "application/pdf")
+    queue_message(message)
+
+
+def render_pending(executor, batch_size=10):
+    """
+    Renders one batch of pending report jobs.
+
+    Running jobs left behind by a dead worker are queued again first (see requeue_stalled_jobs).
+    The jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED and marked Running, so several workers can run side by side.
+    The statements are computed and rendered to HTML here, and the CPU-heavy xhtml2pdf step is handed to the executor
+    (a process pool), which only ever sees HTML strings and file paths.
+    A job whose PDF is already in the report cache is finished without rendering it again.
+
+    The statement is computed from the current books, so a job queued before a posting moves to the current ledger
+    version (read before the books) and its PDF is cached under that version rather than the one it was queued at.
+
+    Returns:
+        tuple: The number of jobs finished and the number that failed in this batch.
+    """
+    requeue_stalled_jobs()
+    with transaction.atomic():
+        jobs = list(
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(status="Pending")
+            .order_by("created_at", "id")[:batch_size]
+        )
+        ReportJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status="Running", started_at=timezone.now()
+        )
+    if not jobs:
+        return 0, 0
+
+    futures = {}
+    for job in jobs:
+        job.ledger_version = get_version()
+        job.file_path = cache_path(
+            job.statement, job.start_date, job.end_date, job.ledger_version
+        )
+        if os.path.exists(job.file_path):
+            continue
+        try:
+            html = render_html(job)
+        except Exception as error:
+            job.error = str(error)
+            continue
+        futures[job.pk] = executor.submit(render_pdf, html, job.file_path)
+
+    done = failed = 0
+    for job in jobs:
+        if job.pk in futures:
+            try:
+                job.error = futures[job.pk].result()
+            except Exception as error:
+                job.error = str(error)
+        if not job.error and job.email_to:
+            try:
+                send_report(job)
+            except Exception as error:
+                job.error = str(error)
+
+        job.finished_at = timezone.now()
+        if job.error:
+            failed += 1
+            job.status = "Failed"
+            job.file_path = ""
+        else:
+            done += 1
+            job.status = "Done"
+
+    ReportJob.objects.bulk_update(
+        jobs, ["status", "ledger_version", "file_path", "error", "finished_at"]
+    )
+    return done, failed
@@ -0,0 +1,142 @@
+"""
+This file contains the database router that sends the read-only reporting traffic to a read replica.
+
+The replica is the "replica" database alias, configured with REPLICA_DATABASE_URL (see settings.py). Views marked with
+the replica_reads decorator (the statements, the ledger and the CoA logs), and the dashboard ratios, read the books
+from it, so heavy reports do not slow down approvals, logins and CoA edits on the primary. Everything else, all writes,
+and the session and user tables (which must never be stale) stay on the primary.
+
+A replica lags behind the primary, so a user who just approved entries has their reporting reads pinned to the
+primary for REPLICA_LAG_SECONDS (see pin_to_primary), and sees their own approval in the reports right away.
+Data cached under the ledger or CoA version (the registry, the NumPy extract) is always read from the primary with
+read_from_primary, so a lagging replica can never be cached under a newer version.
+"""
+
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = "replica"
+
+# The models the reporting reads may take from the replica: the books, not the users or sessions
+REPLICA_MODELS = {
+    "accountbalance",
+    "accountclassification",
+    "chartofaccounts",
+    "coaeventlog",
+    "fiscalperiod",
+    "generalledger",
+    "journalentry",
+    "journalentrygroup",
+    "periodbalance",
+}
+
+# The database alias the reads of the current request (or thread) go to; None means the primary
+_read_alias = contextvars.ContextVar("read_alias", default=None)
+
+
+def replica_configured():
+    """
+    Returns True if a read replica is configured.
+    """
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def pin_key(user_id):
+    return f"replica_pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """
+    Keeps the user's reporting reads on the primary for REPLICA_LAG_SECONDS, so they see their own write
+    (like an approval) before the replica has caught up.
+    """
+    if replica_configured() and user is not None and user.is_authenticated:
+        cache.set(pin_key(user.pk), True, settings.REPLICA_LAG_SECONDS)
+
+
+def is_pinned(user):
+    """
+    Returns True if the user wrote recently and must read from the primary.
+    """
+    return user.is_authenticated and bool(cache.get(pin_key(user.pk)))
+
+
+@contextmanager
+def read_from(alias):
+    """
+    Sends the reads of the routed models to the given alias (None for the primary) inside the block.
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def read_from_primary():
+    """
+    Reads from the primary inside the block, e.g. to load data that is cached under a version counter.
+    """
+    return read_from(None)
+
+
+def reading_replica():
+    """
+    Returns True if the reads are currently going to the replica.
+    """
+    return _read_alias.get() == REPLICA_ALIAS
+
+
+def read_replica_for(request):
+    """
+    Reads from the replica inside the block, unless none is configured, the request is not a GET,
+    or the user is pinned to the primary after a recent write.
+    """
+    use_replica = (
+        replica_configured()
+        and request.method in ("GET", "HEAD")
+        and not is_pinned(request.user)
+    )
+    return read_from(REPLICA_ALIAS if use_replica else None)
+
+
+def replica_reads(view):
+    """
+    Marks a read-only view: its queries on the books go to the replica (see read_replica_for).
+    """
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with read_replica_for(request):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Routes the reads of the books to the alias chosen for the current request, and everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.model_name in REPLICA_MODELS:
+            return _read_alias.get() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary through replication
+        if db == REPLICA_ALIAS:
+            return False
+        return None
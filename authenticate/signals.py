@@ -1,46 +1,64 @@
 """
 This file contains the signals for the Chart of Accounts model.
 This will be called before and after a ChartOfAccounts instance is saved (or deleted, for deactivation). 
-These handlers will create a CoAEventLog entry.
+These handlers will create a CoAEventLog entry, and move the CoA version so every worker reloads its account registry (see registry.py).
+Changing the statement lines of an account (AccountClassification) moves the CoA version too, as the registry holds them.
 """
 
-from django.db.models.signals import pre_save, post_save, pre_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.forms.models import model_to_dict
-from django.core.serializers import serialize
 from django.utils import timezone
-from .models import ChartOfAccounts, CoAEventLog
+from .models import AccountClassification, ChartOfAccounts, CoAEventLog
+from .registry import forget_registry
+from .versioning import COA_VERSION_KEY, bump_version_on_commit
+
+def bump_coa_version():
+    # This process drops its registry at once, so the rest of the transaction sees the change,
+    # and every worker reloads it once the change commits (nothing is bumped if it rolls back)
+    forget_registry()
+    bump_version_on_commit(COA_VERSION_KEY)
 
 @receiver(pre_save, sender=ChartOfAccounts)
 def log_pre_change(sender, instance, **kwargs):
+    # The event logged after the save is counted in the same save (see CoAEventLog.record_many)
+    instance.log_events += 1
     if instance.pk:
-        try:
-            old_instance = sender.objects.get(pk=instance.pk)
-            instance._pre_save_instance = old_instance
-        except sender.DoesNotExist:
-            pass  # This is an add, not an update
+        # The state the account was loaded with, so no extra SELECT is needed
+        old_instance = instance.loaded_instance()
+        if old_instance is None:
+            try:
+                old_instance = sender.objects.get(pk=instance.pk)
+            except sender.DoesNotExist:
+                pass  # This is an add, not an update
+        instance._pre_save_instance = old_instance
 
 @receiver(post_save, sender=ChartOfAccounts)
 def log_post_change(sender, instance, created, **kwargs):
-    action = 'added' if created else 'modified'
-    before_change = serialize('json', [instance._pre_save_instance]) if hasattr(instance, '_pre_save_instance') else None
-    after_change = serialize('json', [instance])
-    
-    CoAEventLog.objects.create(
-        user=instance.user_id, 
-        action=action,
-        before_change=before_change,
-        after_change=after_change,
-        chart_of_account=instance
-    )
+    # Cached ratios and reports are built from the accounts
+    bump_version_on_commit()
+    instance.remember_loaded_state()
+    bump_coa_version()
+
+    # Views set _log_action and _log_user on the instance to record who did what (e.g. "deactivated" by the admin)
+    action = 'added' if created else getattr(instance, '_log_action', 'modified')
+    user = getattr(instance, '_log_user', None) or instance.user_id
+    old_instance = getattr(instance, '_pre_save_instance', None)
+    before = CoAEventLog.snapshot_of(old_instance) if old_instance else None
+
+    # Only the changed fields are stored, plus a full snapshot on every CHECKPOINT_INTERVAL-th event
+    CoAEventLog.record(instance, action, user, before, CoAEventLog.snapshot_of(instance))
     
 @receiver(pre_delete, sender=ChartOfAccounts)
 def log_pre_delete(sender, instance, **kwargs):
-    before_change = serialize('json', [instance])
-    
-    CoAEventLog.objects.create(
-        user=instance.user_id, 
-        action='deactivated',
-        before_change=before_change,
-        chart_of_account=instance
-    )
\ No newline at end of file
+    instance.log_events += 1
+    CoAEventLog.record(instance, 'deactivated', instance.user_id, CoAEventLog.snapshot_of(instance))
+    bump_version_on_commit()
+    bump_coa_version()
+
+@receiver(post_save, sender=AccountClassification)
+@receiver(post_delete, sender=AccountClassification)
+def classification_changed(sender, instance, **kwargs):
+    # The statements and ratios read the statement lines from the registry, and the cached ratios are built from them
+    bump_version_on_commit()
+    bump_coa_version()
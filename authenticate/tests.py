@@ -1,3 +1,1594 @@
-from django.test import TestCase
+import csv
+import multiprocessing
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from smtplib import SMTPRecipientsRefused
 
-# Create your tests here.
+from django.core import mail
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.mail import EmailMessage
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import vectorized
+from .exports import JOURNAL_COLUMNS, LEDGER_COLUMNS
+from .models import (
+    AccountBalance,
+    ChartOfAccounts,
+    CoAEventLog,
+    CustomUser,
+    EmailNotification,
+    FiscalPeriod,
+    GeneralLedger,
+    JournalEntry,
+    JournalEntryGroup,
+    OutboundEmail,
+    ReportJob,
+)
+from .imports import IMPORT_COLUMNS, import_journal
+from .outbox import deliver_pending, queue_mail, queue_message
+from .periods import close_period
+from .posting import approve_groups
+from .profiling import (
+    UNRESOLVED_VIEW,
+    ProfilingMiddleware,
+    reset_stats,
+    stats_summary,
+)
+from .reporting import (
+    COMPARATIVE_LAYOUTS,
+    STATEMENT_CONTEXTS,
+    comparative_context,
+    period_totals,
+)
+from .reports import cache_path, prune_report_cache, render_pending, request_report
+from .registry import get_registry
+from .routers import REPLICA_ALIAS, ReplicaRouter, read_from, replica_configured
+from .versioning import COA_VERSION_KEY, bump_version, get_version
+from .views import cached_ratios, calculate_ratios
+
+# The most queries the journal entry page may run, whatever the number of entries:
+# the session, the user, the account choices of the filter form, the selected account
+# filter and the page of entries (with their accounts and groups joined in)
+JOURNAL_PAGE_QUERY_BUDGET = 5
+
+
+# The most queries adding a journal entry may run, whatever the number of lines: loading the Chart of
+# Accounts registry (the accounts were just created, so it is not cached yet),
+# the savepoint around the insert and its release, the group, the lines (SQLite splits a bulk insert
+# into batches of about 100 rows, so 200 lines take two) and the queued email
+JOURNAL_ENTRY_CREATE_QUERY_BUDGET = 7
+
+# The most queries a comparative statement page may run, whatever the number of columns: the session,
+# the user, loading the Chart of Accounts registry (if it is not cached yet) and the grouped rollup query
+COMPARATIVE_PAGE_QUERY_BUDGET = 4
+
+# Number of worker processes and entries per worker in the concurrent approval test
+APPROVAL_WORKERS = 4
+APPROVALS_PER_WORKER = 25
+
+
+def create_account(user, name, number, normal_side, category, lines=()):
+    # Committed as far as the CoA signals can tell, so the registry is cached as it is between requests
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        return create_uncommitted_account(
+            user, name, number, normal_side, category, lines
+        )
+
+
+def create_uncommitted_account(user, name, number, normal_side, category, lines=()):
+    account = ChartOfAccounts.objects.create(
+        account_name=name,
+        account_number=number,
+        account_description=name,
+        normal_side=normal_side,
+        account_category=category,
+        account_subcategory=category,
+        initial_balance=0,
+        debit=0,
+        credit=0,
+        balance=0,
+        user_id=user,
+        order=str(number),
+        statement="BS",
+        comment="",
+    )
+    account.set_statement_lines(lines)
+    return account
+
+
+def approve_entries(entry_ids):
+    """
+    Approves the given journal entries one by one, the way a single worker process would.
+    """
+    try:
+        for entry_id in entry_ids:
+            JournalEntry.objects.get(pk=entry_id).approve()
+    finally:
+        connections.close_all()
+    return len(entry_ids)
+
+
+class JournalEntryPageQueryBudgetTests(TestCase):
+    """
+    Checks that the journal entry list runs a fixed number of queries at any data size (no N+1 queries per row).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.cash = cls.create_account("Cash", 101, "Left", "Assets")
+        cls.revenue = cls.create_account("Service Revenue", 401, "Right", "Revenue")
+
+    @classmethod
+    def create_account(cls, name, number, normal_side, category):
+        return create_account(cls.user, name, number, normal_side, category)
+
+    def add_groups(self, count):
+        """
+        Adds the given number of balanced two-line journal entry groups.
+        """
+        entries = []
+        for number in range(count):
+            group = JournalEntryGroup.objects.create()
+            entry_date = date(2024, 1, 1) + timedelta(days=number % 365)
+            entries.append(
+                JournalEntry(
+                    group=group,
+                    account=self.cash,
+                    debit=Decimal("10.00"),
+                    date=entry_date,
+                )
+            )
+            entries.append(
+                JournalEntry(
+                    group=group,
+                    account=self.revenue,
+                    credit=Decimal("10.00"),
+                    date=entry_date,
+                )
+            )
+        JournalEntry.objects.bulk_create(entries)
+
+    def assert_within_budget(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("journal_entry_page"), params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries),
+            JOURNAL_PAGE_QUERY_BUDGET,
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        return response
+
+    def test_query_count_does_not_grow_with_entries(self):
+        self.client.force_login(self.user)
+        for count in (1, 30, 300):
+            with self.subTest(groups=count):
+                self.add_groups(count)
+                self.assert_within_budget()
+
+    def test_filtered_pages_stay_within_budget(self):
+        self.client.force_login(self.user)
+        self.add_groups(100)
+        filters = {
+            "status": "Pending",
+            "account": self.cash.pk,
+            "start_date": "2024-01-01",
+            "end_date": "2024-12-31",
+        }
+        response = self.assert_within_budget(filters)
+        self.assertTrue(
+            all(entry.account_id == self.cash.pk for entry in response.context["page"])
+        )
+
+        # The second page, reached through the Next cursor, costs the same
+        cursor = response.context["page"].next_cursor
+        self.assertIsNotNone(cursor)
+        response = self.assert_within_budget({**filters, "after": cursor})
+        self.assertEqual(len(response.context["page"]), 50)
+
+
+class PaginationCursorTests(TransactionTestCase):
+    """
+    Checks that the paginated pages open their first page for a tampered or truncated cursor.
+    The ledger page reads from the read replica when one is configured, which only sees committed rows; hence a TransactionTestCase.
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        self.cash = create_account(self.user, "Cash", 101, "Left", "Assets")
+        revenue = create_account(self.user, "Service Revenue", 401, "Right", "Revenue")
+        group = JournalEntryGroup.objects.create()
+        JournalEntry.objects.bulk_create(
+            [
+                JournalEntry(
+                    group=group, account=self.cash, debit=10, date=date(2024, 1, 2)
+                ),
+                JournalEntry(
+                    group=group, account=revenue, credit=10, date=date(2024, 1, 2)
+                ),
+            ]
+        )
+        approve_groups([group.pk])
+
+    def test_invalid_cursors_open_the_first_page(self):
+        self.client.force_login(self.user)
+        pages = [
+            reverse("journal_entry_page"),
+            reverse("ledger", args=[self.cash.pk]),
+            reverse("view_coa_logs"),
+        ]
+        for url in pages:
+            first_page = list(self.client.get(url).context["page"])
+            self.assertTrue(first_page)
+            for cursor in (
+                "garbage",
+                "2024-01-02",
+                "2024-01-02|",
+                "2024-13-45|1",
+                "2024-01-02|1.5",
+                "2024-01-02|99999999999999999999",
+            ):
+                for direction in ("after", "before"):
+                    with self.subTest(url=url, cursor=cursor, direction=direction):
+                        response = self.client.get(url, {direction: cursor})
+                        self.assertEqual(response.status_code, 200)
+                        self.assertEqual(list(response.context["page"]), first_page)
+
+
+class AddJournalEntryTests(TestCase):
+    """
+    Checks that a compound journal entry is validated and saved with a fixed number of queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.cash = create_account(cls.user, "Cash", 101, "Left", "Assets")
+        cls.revenue = create_account(
+            cls.user, "Service Revenue", 401, "Right", "Revenue"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def entry_form(self, lines):
+        """
+        Returns the form data for a balanced entry of the given number of lines, alternating debits and credits.
+        """
+        data = {}
+        for number in range(1, lines + 1):
+            debit = number % 2
+            data[f"account{number}"] = "Cash" if debit else "Service Revenue"
+            data[f"{'debit' if debit else 'credit'}{number}"] = "12.50"
+            data[f"date{number}"] = "2024-03-01"
+        return data
+
+    def test_large_entry_costs_a_constant_number_of_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("add_journal_entry"), self.entry_form(200)
+            )
+        self.assertLessEqual(
+            len(queries),
+            JOURNAL_ENTRY_CREATE_QUERY_BUDGET,
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        self.assertRedirects(response, reverse("journal_entry_page"))
+        entries = JournalEntry.objects.all()
+        self.assertEqual(entries.count(), 200)
+        self.assertEqual(entries.values("group").distinct().count(), 1)
+        self.assertEqual(
+            entries.aggregate(Sum("debit")), {"debit__sum": Decimal("1250.00")}
+        )
+
+    def test_unbalanced_entry_is_rejected(self):
+        data = self.entry_form(3)
+        response = self.client.post(reverse("add_journal_entry"), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "The total debit and credit values must match.")
+        self.assertFalse(JournalEntry.objects.exists())
+
+    def test_unknown_account_is_rejected(self):
+        data = self.entry_form(2)
+        data["account2"] = "Unearned Revenue"
+        response = self.client.post(reverse("add_journal_entry"), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Unearned Revenue")
+        self.assertFalse(JournalEntry.objects.exists())
+
+    def test_non_finite_amounts_are_rejected(self):
+        for amount in ("NaN", "Infinity", "-Infinity", "sNaN"):
+            with self.subTest(amount=amount):
+                data = self.entry_form(2)
+                data["debit1"] = data["credit2"] = amount
+                response = self.client.post(reverse("add_journal_entry"), data)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(
+                    response, "Line 1 has an invalid debit or credit value."
+                )
+                self.assertFalse(JournalEntry.objects.exists())
+
+
+class JournalImportTests(TestCase):
+    """
+    Checks that a CSV import writes the valid groups in batches, reports the rejected rows,
+    and leaves the ledger version alone, as it only adds pending entries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        create_account(cls.user, "Cash", 101, "Left", "Assets")
+        create_account(cls.user, "Service Revenue", 401, "Right", "Revenue")
+
+    def csv_file(self, rows):
+        csv_file = StringIO(newline="")
+        writer = csv.writer(csv_file)
+        writer.writerow(IMPORT_COLUMNS)
+        writer.writerows(rows)
+        csv_file.seek(0)
+        return csv_file
+
+    def test_import_writes_valid_groups_in_batches(self):
+        rows = []
+        for number in range(1, 8):
+            amount = f"{number}.50"
+            rows += [
+                [f"G{number}", "2024-02-01", "Cash", amount, "", ""],
+                [f"G{number}", "2024-02-01", "Service Revenue", "", amount, "Sale"],
+            ]
+        rows += [
+            # Unbalanced, unknown account, invalid amount, single line and no group
+            ["B1", "2024-02-01", "Cash", "5", "", ""],
+            ["B1", "2024-02-01", "Service Revenue", "", "4", ""],
+            ["B2", "2024-02-01", "Petty Cash", "5", "", ""],
+            ["B2", "2024-02-01", "Service Revenue", "", "5", ""],
+            ["B3", "2024-02-01", "Cash", "NaN", "", ""],
+            ["B3", "2024-02-01", "Service Revenue", "", "5", ""],
+            ["B4", "2024-02-01", "Cash", "5", "", ""],
+            ["", "2024-02-01", "Cash", "5", "", ""],
+            # Split from its first rows
+            ["G1", "2024-02-01", "Cash", "1", "", ""],
+        ]
+        version = get_version()
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                report = import_journal(self.csv_file(rows), batch_size=4)
+
+        self.assertEqual((report.groups, report.lines), (7, 14))
+        self.assertEqual(
+            [(row_number, group) for row_number, group, reason in report.rejected],
+            [
+                (16, "B1"),
+                (17, "B1"),
+                (18, "B2"),
+                (19, "B2"),
+                (20, "B3"),
+                (21, "B3"),
+                (22, "B4"),
+                (23, ""),
+                (24, "G1"),
+            ],
+        )
+        # Two groups (four lines) per batch, the last batch holding the odd group
+        group_inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "authenticate_journalentrygroup"')
+        ]
+        self.assertEqual(len(group_inserts), 4)
+        for group in JournalEntryGroup.objects.all():
+            lines = list(JournalEntry.objects.filter(group=group).order_by("id"))
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(lines[0].debit, lines[1].credit)
+        self.assertFalse(JournalEntry.objects.exclude(status="Pending").exists())
+        self.assertEqual(get_version(), version)
+
+    def test_missing_columns_are_refused(self):
+        with self.assertRaises(ValidationError):
+            import_journal(StringIO("group,date,account\n"))
+
+
+class GeneralLedgerPostingTests(TestCase):
+    """
+    Checks the running balances stored on the General Ledger after approvals over several accounts and days,
+    including entries dated before rows that are already posted, and the per-day rollup rebuilt from them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.cash = create_account(cls.user, "Cash", 101, "Left", "Assets")
+        cls.revenue = create_account(
+            cls.user, "Service Revenue", 401, "Right", "Revenue"
+        )
+        ChartOfAccounts.objects.filter(pk=cls.cash.pk).update(
+            initial_balance=100, balance=100
+        )
+
+    def add_groups(self, days):
+        """
+        Adds a pending two-line group on each of the given days (counted from 2024-01-01) and returns their ids.
+        """
+        group_ids = []
+        for number, day in enumerate(days):
+            group = JournalEntryGroup.objects.create()
+            amount = Decimal(number % 9 + 1) + Decimal("0.25")
+            entry_date = date(2024, 1, 1) + timedelta(days=day)
+            JournalEntry.objects.bulk_create(
+                [
+                    JournalEntry(
+                        group=group, account=self.cash, debit=amount, date=entry_date
+                    ),
+                    JournalEntry(
+                        group=group,
+                        account=self.revenue,
+                        credit=amount,
+                        date=entry_date,
+                    ),
+                ]
+            )
+            group_ids.append(group.pk)
+        return group_ids
+
+    def assert_running_balances(self):
+        for account in (self.cash, self.revenue):
+            account.refresh_from_db()
+            balance = account.initial_balance
+            for row in GeneralLedger.objects.filter(account=account).order_by(
+                "date_of_journal_entry", "id"
+            ):
+                balance += row.debit - row.credit
+                self.assertEqual(row.balance, balance, row)
+            self.assertEqual(balance, account.balance)
+
+    def test_backdated_batch_keeps_the_running_balances(self):
+        approve_groups(self.add_groups([10, 20, 30, 40]))
+
+        # Before, between, on and after the posted days, several on the same day
+        group_ids = self.add_groups([5, 5, 15, 20, 20, 35, 45, 45])
+        with CaptureQueriesContext(connection) as queries:
+            approve_groups(group_ids)
+        ledger_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "generalledger" in query["sql"] and not query["sql"].startswith("INSERT")
+        ]
+        # One read of the previous balances for the batch and one shift per account
+        self.assertLessEqual(len(ledger_queries), 3, "\n".join(ledger_queries))
+        self.assert_running_balances()
+
+        # Entries approved one at a time take the same path
+        for entry in JournalEntry.objects.filter(
+            group__in=self.add_groups([1, 25, 50])
+        ).order_by("id"):
+            entry.approve()
+        self.assert_running_balances()
+
+    def test_rebuild_account_balances_reports_and_fixes_drift(self):
+        approve_groups(self.add_groups([1, 1, 2]))
+        expected = set(
+            AccountBalance.objects.values_list("account", "date", "debit", "credit")
+        )
+        self.assertEqual(len(expected), 4)
+
+        AccountBalance.objects.filter(account=self.cash, date=date(2024, 1, 2)).delete()
+        AccountBalance.objects.filter(
+            account=self.revenue, date=date(2024, 1, 3)
+        ).update(credit=1)
+
+        output = StringIO()
+        call_command("rebuild_account_balances", "--check", stdout=output)
+        self.assertIn(f"Account {self.cash.pk} on 2024-01-02", output.getvalue())
+        self.assertIn(f"Account {self.revenue.pk} on 2024-01-03", output.getvalue())
+        self.assertIn("2 account balance rows are out of date.", output.getvalue())
+        # Checking writes nothing
+        self.assertEqual(AccountBalance.objects.count(), 3)
+
+        call_command("rebuild_account_balances", stdout=StringIO())
+        self.assertEqual(
+            set(
+                AccountBalance.objects.values_list("account", "date", "debit", "credit")
+            ),
+            expected,
+        )
+        output = StringIO()
+        call_command("rebuild_account_balances", "--check", stdout=output)
+        self.assertIn("matches the General Ledger", output.getvalue())
+
+
+class SingleApprovalTests(TestCase):
+    """
+    Checks that approving one entry reads the account once and writes its audit row from the values it loaded,
+    and that an entry dated in a closed period is left pending.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.cash = create_account(cls.user, "Cash", 101, "Left", "Assets")
+
+    def add_entry(self, entry_date):
+        return JournalEntry.objects.create(
+            group=JournalEntryGroup.objects.create(),
+            account=self.cash,
+            debit=10,
+            date=entry_date,
+        )
+
+    def test_approval_reads_the_account_once(self):
+        entry = JournalEntry.objects.get(pk=self.add_entry(date(2024, 1, 2)).pk)
+        with CaptureQueriesContext(connection) as queries:
+            entry.approve()
+        reads = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and (
+                "chartofaccounts" in query["sql"]
+                or "customuser" in query["sql"]
+                or "coaeventlog" in query["sql"]
+            )
+        ]
+        self.assertEqual(len(reads), 1, "\n".join(reads))
+
+        self.cash.refresh_from_db()
+        self.assertEqual(self.cash.balance, 10)
+        log = CoAEventLog.objects.filter(chart_of_account=self.cash).latest("id")
+        self.assertEqual(log.changes["balance"], ["0.00", "10.00"])
+        self.assertEqual(log.user_id, self.user.pk)
+
+    def test_entry_denied_meanwhile_is_not_approved(self):
+        entry = self.add_entry(date(2024, 1, 2))
+        JournalEntry.objects.filter(pk=entry.pk).update(status="Denied")
+        entry.approve()
+        self.assertEqual(entry.status, "Denied")
+        self.cash.refresh_from_db()
+        self.assertEqual(self.cash.balance, 0)
+        self.assertFalse(GeneralLedger.objects.exists())
+
+    def test_entry_in_a_closed_period_stays_pending(self):
+        close_period(
+            FiscalPeriod.objects.create(
+                name="2023", start_date=date(2023, 1, 1), end_date=date(2023, 12, 31)
+            )
+        )
+        entry = self.add_entry(date(2023, 6, 1))
+        with self.assertRaises(ValidationError):
+            entry.approve()
+        self.assertEqual(entry.status, "Pending")
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "Pending")
+        self.cash.refresh_from_db()
+        self.assertEqual(self.cash.balance, 0)
+
+
+class BulkApprovalTests(TestCase):
+    """
+    Checks that approving groups in bulk posts the same account totals, ledger rows and logged account state
+    as approving their entries one at a time.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.accounts = [
+            create_account(user, "Cash", 101, "Left", "Assets"),
+            create_account(user, "Supplies", 102, "Left", "Assets"),
+            create_account(user, "Service Revenue", 401, "Right", "Revenue"),
+        ]
+        cash, supplies, revenue = cls.accounts
+        cls.group_ids = []
+        for number in range(12):
+            group = JournalEntryGroup.objects.create()
+            amount = Decimal(number * 7 % 30) + Decimal("1.10")
+            # Out of date order, several on the same day, and some split over two debit accounts
+            entry_date = date(2024, 3, 1) - timedelta(days=number * 5 % 11)
+            lines = [(cash, amount, 0), (revenue, 0, amount)]
+            if number % 3 == 0:
+                lines = [(cash, amount - 1, 0), (supplies, 1, 0), (revenue, 0, amount)]
+            JournalEntry.objects.bulk_create(
+                JournalEntry(
+                    group=group,
+                    account=account,
+                    debit=debit,
+                    credit=credit,
+                    date=entry_date,
+                )
+                for account, debit, credit in lines
+            )
+            cls.group_ids.append(group.pk)
+        # Some entries are already posted, so the batch lands around existing ledger rows
+        approve_groups(cls.group_ids[:3])
+
+    def posted_books(self):
+        """
+        Returns the account totals, the General Ledger rows and the account state rebuilt from the event log.
+        """
+        accounts = list(
+            ChartOfAccounts.objects.order_by("id").values_list(
+                "id", "debit", "credit", "balance"
+            )
+        )
+        ledger = list(
+            GeneralLedger.objects.order_by(
+                "account_id", "date_of_journal_entry", "journal_entry_id"
+            ).values_list(
+                "account_id",
+                "journal_entry_id",
+                "date_of_journal_entry",
+                "debit",
+                "credit",
+                "balance",
+            )
+        )
+        logged = [
+            CoAEventLog.objects.filter(chart_of_account=account)
+            .order_by("-timestamp", "-id")
+            .first()
+            .state_at()
+            for account in self.accounts
+        ]
+        return accounts, ledger, logged
+
+    def test_bulk_approval_matches_single_approvals(self):
+        pending = self.group_ids[3:]
+        with transaction.atomic():
+            approve_groups(pending)
+            bulk = self.posted_books()
+            transaction.set_rollback(True)
+
+        for entry in JournalEntry.objects.filter(group__in=pending).order_by("id"):
+            entry.approve()
+        self.assertEqual(self.posted_books(), bulk)
+        self.assertFalse(JournalEntry.objects.filter(status="Pending").exists())
+        for account, state in zip(self.accounts, bulk[2]):
+            account.refresh_from_db()
+            self.assertEqual(state, CoAEventLog.snapshot_of(account))
+
+
+class CoAEventLogTests(TestCase):
+    """
+    Checks that the event log keeps a checkpoint on every CHECKPOINT_INTERVAL-th event of an account,
+    whichever path logged the events, without counting the account's history.
+    """
+
+    def test_checkpoints_follow_the_event_counter(self):
+        user = CustomUser.objects.create_user("admin", "admin@example.com", "password")
+        cash = create_account(user, "Cash", 101, "Left", "Assets")
+        revenue = create_account(user, "Service Revenue", 401, "Right", "Revenue")
+        for number in range(CoAEventLog.CHECKPOINT_INTERVAL + 10):
+            cash.comment = f"Edit {number}"
+            cash.save()
+        group = JournalEntryGroup.objects.create()
+        JournalEntry.objects.create(
+            group=group, account=cash, debit=5, date=date(2024, 1, 1)
+        )
+        JournalEntry.objects.create(
+            group=group, account=revenue, credit=5, date=date(2024, 1, 1)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            approve_groups([group.pk])
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries.captured_queries
+                if "COUNT(" in query["sql"] and "coaeventlog" in query["sql"]
+            ]
+        )
+        JournalEntry.objects.create(
+            group=JournalEntryGroup.objects.create(),
+            account=cash,
+            debit=1,
+            date=date(2024, 1, 2),
+        ).approve()
+
+        for account in (cash, revenue):
+            account.refresh_from_db()
+            logs = list(
+                CoAEventLog.objects.filter(chart_of_account=account).order_by("id")
+            )
+            self.assertEqual(account.log_events, len(logs))
+            self.assertEqual(
+                [number for number, log in enumerate(logs) if log.snapshot],
+                list(range(0, len(logs), CoAEventLog.CHECKPOINT_INTERVAL)),
+            )
+            self.assertEqual(logs[-1].state_at(), CoAEventLog.snapshot_of(account))
+
+
+class ExportTests(TestCase):
+    """
+    Checks the CSV and XLSX exports of the journal and the General Ledger, and that invalid filters are refused.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.cash = create_account(cls.user, "Cash", 101, "Left", "Assets")
+        revenue = create_account(cls.user, "Service Revenue", 401, "Right", "Revenue")
+        group = JournalEntryGroup.objects.create()
+        JournalEntry.objects.bulk_create(
+            [
+                JournalEntry(
+                    group=group,
+                    account=cls.cash,
+                    debit=Decimal("42.50"),
+                    date=date(2024, 5, 1),
+                ),
+                JournalEntry(
+                    group=group,
+                    account=revenue,
+                    credit=Decimal("42.50"),
+                    date=date(2024, 5, 1),
+                ),
+            ]
+        )
+        approve_groups([group.pk])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def download(self, name, params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_csv_exports(self):
+        rows = list(
+            csv.reader(
+                self.download("export_journal_entries", {"account": self.cash.pk})
+                .decode()
+                .splitlines()
+            )
+        )
+        self.assertEqual(rows[0], [label for field, label in JOURNAL_COLUMNS])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][4:8], ["Cash", "42.50", "0.00", "Approved"])
+
+        rows = list(
+            csv.reader(
+                self.download(
+                    "export_general_ledger",
+                    {"start_date": "2024-05-01", "end_date": "2024-05-31"},
+                )
+                .decode()
+                .splitlines()
+            )
+        )
+        self.assertEqual(rows[0], [label for field, label in LEDGER_COLUMNS])
+        self.assertEqual([row[4] for row in rows[1:]], ["Cash", "Service Revenue"])
+
+    def test_xlsx_exports(self):
+        for name in ("export_journal_entries", "export_general_ledger"):
+            with self.subTest(name=name):
+                workbook = zipfile.ZipFile(
+                    BytesIO(self.download(name, {"format": "xlsx"}))
+                )
+                sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+                # The header and one row per line of the entry
+                self.assertEqual(sheet.count("<row "), 3)
+                self.assertIn("Service Revenue", sheet)
+                self.assertIn("<v>42.5</v>", sheet)
+
+    def test_invalid_filters_are_refused(self):
+        for params in (
+            {"account": "cash"},
+            {"account": "1.5"},
+            {"start_date": "2024-02-30"},
+            {"end_date": "yesterday"},
+        ):
+            for name in ("export_journal_entries", "export_general_ledger"):
+                with self.subTest(name=name, params=params):
+                    response = self.client.get(reverse(name), params)
+                    self.assertEqual(response.status_code, 400)
+
+
+class ReportCacheTests(TransactionTestCase):
+    """
+    Checks that expired and unreachable PDFs are pruned from the report cache, and that the statement pages
+    refuse invalid dates instead of queueing a report for them.
+    The statement pages read from the read replica when one is configured, which only sees committed rows; hence a TransactionTestCase.
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        self.client.force_login(self.user)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(REPORT_CACHE_DIR=cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def cached_pdf(self, statement, ledger_version, age):
+        path = cache_path(statement, None, None, ledger_version)
+        with open(path, "wb") as pdf:
+            pdf.write(b"%PDF-1.4")
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_prune_removes_expired_and_stale_reports(self):
+        version = get_version()
+        fresh = self.cached_pdf("trial_balance", version, 60)
+        expired = self.cached_pdf("balance_sheet", version, 7200)
+        stale = self.cached_pdf("income_statement", version - 1, 3600)
+        just_superseded = self.cached_pdf("retained_earnings", version - 1, 60)
+
+        self.assertEqual(prune_report_cache(max_age=3600), 2)
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(just_superseded))
+        self.assertFalse(os.path.exists(expired))
+        self.assertFalse(os.path.exists(stale))
+
+    def test_invalid_dates_are_not_queued(self):
+        for name in STATEMENT_CONTEXTS:
+            with self.subTest(statement=name):
+                url = reverse(name)
+                response = self.client.post(
+                    f"{url}?start_date=2024-02-30",
+                    {"email": "boss@example.com", "subject": "Report"},
+                )
+                self.assertRedirects(response, url, fetch_redirect_response=False)
+                self.assertContains(
+                    self.client.get(response.url), "2024-02-30 is not a valid date."
+                )
+        self.assertFalse(ReportJob.objects.exists())
+
+    @override_settings(REPORT_JOB_TIMEOUT=60)
+    def test_stalled_jobs_are_requeued_at_the_current_version(self):
+        queued_version = get_version()
+        stalled = ReportJob.objects.create(
+            statement="trial_balance",
+            ledger_version=queued_version,
+            status="Running",
+            started_at=timezone.now() - timedelta(seconds=120),
+        )
+        running = ReportJob.objects.create(
+            statement="balance_sheet",
+            ledger_version=queued_version,
+            status="Running",
+            started_at=timezone.now(),
+        )
+        # A dead worker's job is not handed out again, a live one is
+        self.assertNotEqual(request_report("trial_balance").pk, stalled.pk)
+        self.assertEqual(request_report("balance_sheet").pk, running.pk)
+
+        # A posting lands before the worker picks the jobs up
+        bump_version()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertEqual(render_pending(executor), (2, 0))
+        stalled.refresh_from_db()
+        self.assertEqual(stalled.status, "Done")
+        self.assertEqual(stalled.ledger_version, get_version())
+        self.assertEqual(
+            stalled.file_path, cache_path("trial_balance", None, None, get_version())
+        )
+        self.assertTrue(os.path.exists(stalled.file_path))
+        self.assertFalse(
+            os.path.exists(cache_path("trial_balance", None, None, queued_version))
+        )
+        running.refresh_from_db()
+        self.assertEqual(running.status, "Running")
+
+
+class BouncingEmailBackend(locmem.EmailBackend):
+    """
+    The locmem email backend, refusing mail to any address at bounce.example.com.
+    """
+
+    def send_messages(self, messages):
+        for message in messages:
+            refused = [
+                address
+                for address in message.to
+                if address.endswith("@bounce.example.com")
+            ]
+            if refused:
+                raise SMTPRecipientsRefused(
+                    {address: (550, b"Mailbox unavailable") for address in refused}
+                )
+        return super().send_messages(messages)
+
+
+class CrashingEmailBackend(locmem.EmailBackend):
+    """
+    The locmem email backend, killing the worker when it reaches an address at crash.example.com.
+    """
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith("@crash.example.com") for address in message.to):
+                raise KeyboardInterrupt
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="authenticate.tests.BouncingEmailBackend")
+class OutboxTests(TestCase):
+    """
+    Checks that the send_queued_email worker delivers the queued emails and retries, then fails, the ones that bounce,
+    and that the password expiry notifier queues its emails through the outbox.
+    """
+
+    def test_worker_sends_and_retries(self):
+        queue_mail("Welcome", "Hello", "", ["new@example.com"])
+        message = EmailMessage("Report", "Attached", None, ["boss@example.com"])
+        message.attach("report.pdf", b"%PDF-1.4", "application/pdf")
+        queue_message(message)
+        bounced = queue_mail("Reset", "Link", "", ["nobody@bounce.example.com"])
+
+        call_command("send_queued_email", "--max-attempts", "2", stdout=StringIO())
+
+        self.assertEqual(
+            [(sent.subject, sent.to) for sent in mail.outbox],
+            [("Welcome", ["new@example.com"]), ("Report", ["boss@example.com"])],
+        )
+        self.assertEqual(
+            mail.outbox[1].attachments,
+            [("report.pdf", b"%PDF-1.4", "application/pdf")],
+        )
+        self.assertEqual(
+            OutboundEmail.objects.filter(status="Sent", sent_at__isnull=False).count(),
+            2,
+        )
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), ("Pending", 1))
+        self.assertIn("nobody@bounce.example.com", bounced.last_error)
+        self.assertGreater(bounced.next_attempt_at, timezone.now())
+
+        # Nothing is due until the backoff has passed
+        self.assertEqual(deliver_pending(max_attempts=2), (0, 0))
+        OutboundEmail.objects.filter(pk=bounced.pk).update(
+            next_attempt_at=timezone.now()
+        )
+        self.assertEqual(deliver_pending(max_attempts=2), (0, 1))
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), ("Failed", 2))
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_BACKEND="authenticate.tests.CrashingEmailBackend")
+    def test_worker_crash_keeps_delivered_emails_and_leases_the_rest(self):
+        delivered = queue_mail("Welcome", "Hello", "", ["new@example.com"])
+        crashed = queue_mail("Reset", "Link", "", ["admin@crash.example.com"])
+        waiting = queue_mail("Notice", "Soon", "", ["later@example.com"])
+
+        with self.assertRaises(KeyboardInterrupt):
+            deliver_pending()
+
+        # The email sent before the crash is recorded, and the rest of the batch stays claimed until the lease runs out
+        delivered.refresh_from_db()
+        self.assertEqual(delivered.status, "Sent")
+        for email in (crashed, waiting):
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ("Pending", 1))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        OutboundEmail.objects.filter(pk=waiting.pk).update(
+            next_attempt_at=timezone.now()
+        )
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual([sent.subject for sent in mail.outbox], ["Welcome", "Notice"])
+
+    def test_password_expiry_notices_are_queued_once(self):
+        expiry = timezone.now().date() + timedelta(days=3)
+        for number in range(3):
+            CustomUser.objects.create_user(
+                f"user{number}", f"user{number}@example.com", "password"
+            )
+        CustomUser.objects.update(password_expiry=expiry)
+
+        for run in range(2):
+            call_command(
+                "send_password_expiry_notifications",
+                "--batch-size",
+                "2",
+                stdout=StringIO(),
+            )
+        # Queued together with their log rows, so the second run finds everyone already notified
+        self.assertEqual(
+            sorted(
+                address
+                for to in OutboundEmail.objects.values_list("to", flat=True)
+                for address in to
+            ),
+            ["user0@example.com", "user1@example.com", "user2@example.com"],
+        )
+        self.assertEqual(EmailNotification.objects.count(), 3)
+        self.assertEqual(mail.outbox, [])
+
+        deliver_pending()
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class ComparativeStatementTests(TransactionTestCase):
+    """
+    Checks that a comparative statement is summed in one query and that each column matches the statement over its period.
+    The page reads from the read replica when one is configured, which only sees committed rows; hence a TransactionTestCase.
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cash = create_account(self.user, "Cash", 101, "Left", "Assets", ["ratio_cash"])
+        unearned = create_account(
+            self.user,
+            "Unearned Revenue",
+            201,
+            "Right",
+            "Liabilities",
+            ["income_revenue"],
+        )
+        for number in range(24):
+            group = JournalEntryGroup.objects.create()
+            amount = Decimal(number * 13 % 90) + Decimal("0.25")
+            entry_date = date(2024, 1, 5) + timedelta(days=number * 17)
+            for line in JournalEntry.objects.bulk_create(
+                [
+                    JournalEntry(
+                        group=group, account=cash, debit=amount, date=entry_date
+                    ),
+                    JournalEntry(
+                        group=group, account=unearned, credit=amount, date=entry_date
+                    ),
+                ]
+            ):
+                line.approve()
+        self.client.force_login(self.user)
+
+    def test_page_costs_a_constant_number_of_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("comparative_statements"),
+                {
+                    "statement": "balance_sheet",
+                    "period": "month",
+                    "start_date": "2024-01-01",
+                    "end_date": "2024-12-31",
+                },
+            )
+        self.assertLessEqual(
+            len(queries),
+            COMPARATIVE_PAGE_QUERY_BUDGET,
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["report"]["columns"]), 12)
+
+    def test_columns_match_the_single_period_statements(self):
+        for statement in STATEMENT_CONTEXTS:
+            for period in ["month", "quarter", "year"]:
+                report = comparative_context(
+                    statement, date(2024, 2, 10), date(2025, 1, 20), period
+                )
+                for index, column in enumerate(report["columns"]):
+                    with self.subTest(statement=statement, column=column["label"]):
+                        single = STATEMENT_CONTEXTS[statement](
+                            column["start_date"], column["end_date"]
+                        )
+                        summary_keys = COMPARATIVE_LAYOUTS[statement][2]
+                        for line, (label, key) in zip(report["summary"], summary_keys):
+                            self.assertEqual(line["amounts"][index], single[key])
+
+
+class ConcurrentApprovalTests(TransactionTestCase):
+    """
+    Approves entries against one account from several processes at once and checks that no update is lost.
+    """
+
+    def setUp(self):
+        # Checked here rather than at import, once the runner has switched to the test database
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest(
+                "The worker processes need a test database they can all connect to."
+            )
+
+    def test_concurrent_approvals_keep_the_balance(self):
+        user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cash = create_account(user, "Cash", 101, "Left", "Assets")
+        group = JournalEntryGroup.objects.create()
+        entries = JournalEntry.objects.bulk_create(
+            JournalEntry(
+                group=group,
+                account=cash,
+                debit=Decimal(number % 7 + 1),
+                date=date(2024, 1, 1) + timedelta(days=number % 5),
+            )
+            for number in range(APPROVAL_WORKERS * APPROVALS_PER_WORKER)
+        )
+        # One entry is given to every worker, so it is also approved concurrently
+        shared = entries[0].pk
+        batches = [
+            [shared] + [entry.pk for entry in entries[worker::APPROVAL_WORKERS]]
+            for worker in range(APPROVAL_WORKERS)
+        ]
+
+        # The worker processes open their own connections, so none can be inherited by the fork
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=APPROVAL_WORKERS,
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            list(executor.map(approve_entries, batches))
+
+        cash.refresh_from_db()
+        expected = sum(entry.debit for entry in entries)
+        ledger = GeneralLedger.objects.filter(account=cash).aggregate(
+            debit=Sum("debit"), credit=Sum("credit")
+        )
+        self.assertEqual(
+            GeneralLedger.objects.filter(account=cash).count(), len(entries)
+        )
+        self.assertEqual(cash.debit, expected)
+        self.assertEqual(cash.debit, ledger["debit"])
+        self.assertEqual(cash.balance, ledger["debit"] - (ledger["credit"] or 0))
+        self.assertEqual(
+            GeneralLedger.objects.filter(account=cash)
+            .order_by("-date_of_journal_entry", "-id")
+            .values_list("balance", flat=True)
+            .first(),
+            cash.balance,
+        )
+
+
+class RegistryInvalidationTests(TestCase):
+    """
+    Checks that a Chart of Accounts change is seen at once by the transaction that made it, reaches the other
+    workers (through the CoA version) only once it commits, and leaves nothing behind when it is rolled back.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "admin", "admin@example.com", "password", is_staff=True
+        )
+        create_account(cls.user, "Cash", 101, "Left", "Assets")
+
+    def test_change_is_published_on_commit(self):
+        version = get_version(COA_VERSION_KEY)
+        self.assertIs(get_registry(), get_registry())
+        with self.captureOnCommitCallbacks(execute=True):
+            create_uncommitted_account(
+                self.user, "Service Revenue", 401, "Right", "Revenue"
+            )
+            self.assertIn("Service Revenue", get_registry().by_name)
+            self.assertEqual(get_version(COA_VERSION_KEY), version)
+        self.assertGreater(get_version(COA_VERSION_KEY), version)
+        registry = get_registry()
+        self.assertIn("Service Revenue", registry.by_name)
+        self.assertIs(get_registry(), registry)
+
+    def test_rolled_back_change_is_forgotten(self):
+        version = get_version(COA_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    create_uncommitted_account(
+                        self.user, "Service Revenue", 401, "Right", "Revenue"
+                    )
+                    self.assertIn("Service Revenue", get_registry().by_name)
+                    raise RuntimeError("Rolled back")
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_version(COA_VERSION_KEY), version)
+        self.assertNotIn("Service Revenue", get_registry().by_name)
+        self.assertIn("Cash", get_registry().by_name)
+
+
+class ReportingEngineTests(TestCase):
+    """
+    Checks that the statements pick their accounts by statement line, and that the NumPy reporting engine
+    gives the same statements and ratios as the ORM engine.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.cash = cash = create_account(
+            user, "Cash", 101, "Left", "Assets", ["ratio_cash"]
+        )
+        unearned = create_account(
+            user, "Unearned Revenue", 201, "Right", "Liabilities", ["income_revenue"]
+        )
+        revenue = create_account(
+            user, "Service Revenue", 401, "Right", "Revenue", ["retained_revenue"]
+        )
+        dividends = create_account(
+            user, "Dividends", 301, "Left", "Equity", ["retained_dividends"]
+        )
+        for number in range(30):
+            group = JournalEntryGroup.objects.create()
+            amount = Decimal(number * 37 % 500) + Decimal("0.35")
+            credit_account = [unearned, revenue][number % 2]
+            entry_date = date(2024, 1, 1) + timedelta(days=number * 11)
+            lines = [
+                JournalEntry(group=group, account=cash, debit=amount, date=entry_date),
+                JournalEntry(
+                    group=group, account=credit_account, credit=amount, date=entry_date
+                ),
+            ]
+            if number % 5 == 0:
+                lines[0].account = dividends
+            # Every third entry stays pending, so it must not be counted
+            for line in JournalEntry.objects.bulk_create(lines):
+                if number % 3:
+                    line.approve()
+
+    def setUp(self):
+        # The extract is kept per ledger version, which the rollback of the previous test does not bump
+        vectorized._extract = None
+
+    def test_engines_agree(self):
+        ranges = [
+            (None, None),
+            (date(2024, 3, 1), date(2024, 9, 30)),
+            (date(2024, 9, 30), None),
+            (None, date(2024, 2, 1)),
+        ]
+        for statement, build_context in STATEMENT_CONTEXTS.items():
+            for start_date, end_date in ranges:
+                with self.subTest(statement=statement, start=start_date, end=end_date):
+                    with self.settings(REPORTING_ENGINE="orm"):
+                        expected = build_context(start_date, end_date)
+                    with self.settings(REPORTING_ENGINE="numpy"):
+                        self.assertEqual(build_context(start_date, end_date), expected)
+        with self.settings(REPORTING_ENGINE="orm"):
+            expected = calculate_ratios()
+        with self.settings(REPORTING_ENGINE="numpy"):
+            self.assertEqual(calculate_ratios(), expected)
+
+    def assert_same_extract(self, extract, expected):
+        for field in (
+            "account_ids",
+            "opening",
+            "keys",
+            "debit_totals",
+            "credit_totals",
+        ):
+            self.assertEqual(
+                getattr(extract, field).tolist(), getattr(expected, field).tolist()
+            )
+        self.assertEqual(
+            (extract.last_id, extract.rows), (expected.last_id, expected.rows)
+        )
+
+    def test_extract_is_refreshed_with_the_new_rows(self):
+        extract = vectorized.JournalExtract.read(1)
+        account = create_account(
+            self.user, "Consulting Revenue", 402, "Right", "Revenue"
+        )
+        # Before, between and after the days already read, and on a new account
+        for number, entry_date in enumerate(
+            [date(2023, 12, 1), date(2024, 1, 1), date(2024, 6, 5), date(2025, 3, 1)]
+        ):
+            group = JournalEntryGroup.objects.create()
+            JournalEntry.objects.bulk_create(
+                [
+                    JournalEntry(
+                        group=group,
+                        account=self.cash,
+                        debit=number + 1,
+                        date=entry_date,
+                    ),
+                    JournalEntry(
+                        group=group, account=account, credit=number + 1, date=entry_date
+                    ),
+                ]
+            )
+            approve_groups([group.pk])
+
+        with CaptureQueriesContext(connection) as queries:
+            refreshed = extract.refreshed(2)
+        ledger_reads = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "generalledger" in query["sql"] and "COUNT(" not in query["sql"]
+        ]
+        self.assertEqual(len(ledger_reads), 1)
+        self.assertIn(f'"id" > {extract.last_id}', ledger_reads[0])
+        self.assertEqual(refreshed.rows, extract.rows + 8)
+        self.assert_same_extract(refreshed, vectorized.JournalExtract.read(2))
+
+        # A removed row cannot be merged, so the journal is read again
+        GeneralLedger.objects.filter(account=account).delete()
+        self.assert_same_extract(
+            refreshed.refreshed(3), vectorized.JournalExtract.read(3)
+        )
+
+    def test_closed_periods_match_the_unsnapshotted_sums(self):
+        ranges = [
+            (None, None),
+            (date(2024, 2, 1), date(2024, 5, 15)),
+            (date(2024, 4, 1), date(2024, 6, 30)),
+            (date(2024, 5, 1), date(2024, 11, 30)),
+            (date(2024, 7, 1), None),
+            (None, date(2024, 3, 31)),
+            # Reversed, on both sides of a close
+            (date(2024, 8, 1), date(2024, 2, 1)),
+        ]
+        expected = {}
+        for statement, build_context in STATEMENT_CONTEXTS.items():
+            for start_date, end_date in ranges:
+                expected[statement, start_date, end_date] = build_context(
+                    start_date, end_date
+                )
+
+        for start_date, end_date in [
+            (date(2024, 1, 1), date(2024, 3, 31)),
+            (date(2024, 4, 1), date(2024, 6, 30)),
+        ]:
+            close_period(
+                FiscalPeriod.objects.create(
+                    name=f"Through {end_date}",
+                    start_date=start_date,
+                    end_date=end_date,
+                )
+            )
+
+        for (statement, start_date, end_date), context in expected.items():
+            for engine in ["orm", "numpy"]:
+                with self.subTest(
+                    statement=statement, start=start_date, end=end_date, engine=engine
+                ), self.settings(REPORTING_ENGINE=engine):
+                    self.assertEqual(
+                        STATEMENT_CONTEXTS[statement](start_date, end_date), context
+                    )
+        self.assertEqual(period_totals(date(2024, 8, 1), date(2024, 2, 1)), {})
+
+    def test_new_classified_account_is_reported(self):
+        account = create_account(
+            self.user,
+            "Consulting Revenue",
+            402,
+            "Right",
+            "Revenue",
+            ["income_revenue", "retained_revenue"],
+        )
+        group = JournalEntryGroup.objects.create()
+        for line in JournalEntry.objects.bulk_create(
+            [
+                JournalEntry(
+                    group=group, account=self.cash, debit=100, date=date(2025, 1, 2)
+                ),
+                JournalEntry(
+                    group=group, account=account, credit=100, date=date(2025, 1, 2)
+                ),
+            ]
+        ):
+            line.approve()
+
+        for engine in ["orm", "numpy"]:
+            with self.subTest(engine=engine), self.settings(REPORTING_ENGINE=engine):
+                income = STATEMENT_CONTEXTS["income_statement"](
+                    date(2025, 1, 1), date(2025, 1, 31)
+                )
+                self.assertEqual(
+                    [
+                        row["account__account_name"]
+                        for row in income["revenue_accounts"]
+                    ],
+                    ["Consulting Revenue"],
+                )
+                self.assertEqual(income["total_revenue"], Decimal("100"))
+                retained = STATEMENT_CONTEXTS["retained_earnings"](
+                    date(2025, 1, 1), date(2025, 1, 31)
+                )
+                self.assertEqual(retained["net_income"], Decimal("100"))
+
+
+class RatioCacheTests(TestCase):
+    """
+    Checks that the cached financial ratios are served without queries until an approval commits,
+    and are then calculated again from the new balances.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cls.cash = create_account(user, "Cash", 101, "Left", "Assets")
+        cls.payable = create_account(
+            user, "Accounts Payable", 201, "Right", "Liabilities"
+        )
+        cls.capital = create_account(user, "Owner's Capital", 301, "Right", "Equity")
+        cls.revenue = create_account(user, "Service Revenue", 401, "Right", "Revenue")
+
+    def approve(self, debit_account, credit_account, amount):
+        group = JournalEntryGroup.objects.create()
+        entries = JournalEntry.objects.bulk_create(
+            [
+                JournalEntry(
+                    group=group,
+                    account=debit_account,
+                    debit=amount,
+                    date=date(2024, 1, 2),
+                ),
+                JournalEntry(
+                    group=group,
+                    account=credit_account,
+                    credit=amount,
+                    date=date(2024, 1, 2),
+                ),
+            ]
+        )
+        # Committed as far as the versioning can tell, so the cached ratios are invalidated as between requests
+        with self.captureOnCommitCallbacks(execute=True):
+            for entry in entries:
+                entry.approve()
+
+    def test_approval_invalidates_the_cached_ratios(self):
+        self.approve(self.cash, self.payable, 100)
+        self.approve(self.cash, self.capital, 100)
+        ratios = cached_ratios()
+        self.assertEqual(ratios["current_ratio"]["value"], -2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(cached_ratios(), ratios)
+        self.assertFalse(queries.captured_queries)
+
+        self.approve(self.cash, self.revenue, 50)
+        ratios = cached_ratios()
+        self.assertEqual(ratios["current_ratio"]["value"], Decimal("-2.5"))
+        self.assertEqual(ratios, calculate_ratios())
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Checks that the reporting views read the books from the replica, and that an approver reads from the primary right after.
+    The page test needs a replica: run the tests with REPLICA_DATABASE_URL set (the test replica mirrors the test database).
+    The replica is another connection, so it only sees committed rows; hence a TransactionTestCase.
+    """
+
+    databases = "__all__"
+
+    def test_router_only_sends_the_books_to_the_replica(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(JournalEntry), "default")
+        with read_from(REPLICA_ALIAS):
+            self.assertEqual(router.db_for_read(JournalEntry), REPLICA_ALIAS)
+            self.assertEqual(router.db_for_read(ChartOfAccounts), REPLICA_ALIAS)
+            self.assertEqual(router.db_for_read(CustomUser), "default")
+            self.assertEqual(router.db_for_write(JournalEntry), "default")
+        self.assertEqual(router.db_for_read(JournalEntry), "default")
+        self.assertIs(router.allow_migrate(REPLICA_ALIAS, "authenticate"), False)
+        self.assertIsNone(router.allow_migrate("default", "authenticate"))
+
+    def test_replica_ratios_are_not_served_from_the_primary(self):
+        if not replica_configured():
+            self.skipTest("No read replica configured.")
+        user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        create_account(user, "Cash", 101, "Left", "Assets", ["ratio_cash"])
+        get_registry()
+        with read_from(REPLICA_ALIAS):
+            ratios = cached_ratios()
+
+        # A user pinned to the primary calculates the ratios again, and caches them apart
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(cached_ratios(), ratios)
+        self.assertTrue(queries.captured_queries)
+        with CaptureQueriesContext(connection) as queries:
+            cached_ratios()
+        self.assertFalse(queries.captured_queries)
+
+    def test_approver_is_pinned_to_the_primary(self):
+        if not replica_configured():
+            self.skipTest("No read replica configured.")
+        user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password", is_staff=True
+        )
+        cash = create_account(user, "Cash", 101, "Left", "Assets")
+        revenue = create_account(user, "Service Revenue", 401, "Right", "Revenue")
+        group = JournalEntryGroup.objects.create()
+        JournalEntry.objects.bulk_create(
+            [
+                JournalEntry(group=group, account=cash, debit=5, date=date(2024, 1, 2)),
+                JournalEntry(
+                    group=group, account=revenue, credit=5, date=date(2024, 1, 2)
+                ),
+            ]
+        )
+        self.client.force_login(user)
+
+        def rollup_reads(alias):
+            with CaptureQueriesContext(connections[alias]) as queries:
+                self.client.get(reverse("trial_balance"), {"end_date": "2024-12-31"})
+            return [
+                query["sql"]
+                for query in queries.captured_queries
+                if "authenticate_accountbalance" in query["sql"]
+            ]
+
+        self.assertTrue(rollup_reads(REPLICA_ALIAS))
+        self.assertFalse(rollup_reads("default"))
+
+        self.client.post(
+            reverse("journal_entry_page"), {"approve": "1", "group_id": group.pk}
+        )
+        self.assertTrue(rollup_reads("default"))
+        self.assertFalse(rollup_reads(REPLICA_ALIAS))
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1)
+class ProfilingTests(TestCase):
+    """
+    Checks that the profiler records the queries and time of each request per view, adds up the requests to unknown
+    paths under one name, and removes itself when profiling is disabled.
+    """
+
+    def setUp(self):
+        reset_stats()
+        self.addCleanup(reset_stats)
+
+    def test_request_is_profiled(self):
+        user = CustomUser.objects.create_user(
+            "accountant", "accountant@example.com", "password"
+        )
+        self.client.force_login(user)
+        log_file = os.path.join(tempfile.mkdtemp(), "profile.jsonl")
+        with override_settings(PROFILING_LOG_FILE=log_file):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse("chart_of_accounts"))
+            # Counted now, as the next request clears the connection's query log
+            query_count = len(queries)
+            for number in range(3):
+                self.client.get(f"/no-such-page-{number}/")
+
+        stats = {row["view"]: row for row in stats_summary()}
+        self.assertEqual(set(stats), {"chart_of_accounts", UNRESOLVED_VIEW})
+        self.assertEqual(stats[UNRESOLVED_VIEW]["requests"], 3)
+        row = stats["chart_of_accounts"]
+        self.assertEqual(row["requests"], 1)
+        self.assertEqual(row["avg_sql_count"], query_count)
+        self.assertGreater(row["avg_sql_ms"], 0)
+        self.assertGreater(row["avg_template_ms"], 0)
+        self.assertGreaterEqual(row["avg_total_ms"], row["avg_sql_ms"])
+        with open(log_file) as log:
+            self.assertEqual(len(log.readlines()), 4)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_profiler_removes_itself(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
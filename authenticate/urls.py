@@ -46,12 +46,20 @@ urlpatterns = [
     ),  # View Chart of Accounts logs page
     # ----------------------- Other URLs -------------------------------- #
     path("help/", views.help, name="help"),  # Help page
+    path(
+        "profiling/stats/", views.profiling_stats, name="profiling_stats"
+    ),  # Request profiler totals (staff only)
     path(
         "journal-entries/", views.journal_entry_page, name="journal_entry_page"
     ),  # Journal entries page
     path(
         "journal-entry/add/", views.add_journal_entry, name="add_journal_entry"
     ),  # Add journal entry page
+    path(
+        "journal-entries/import/",
+        views.import_journal_entries,
+        name="import_journal_entries",
+    ),  # Bulk journal import page (staff only)
     path(
         "entry_details/<int:entry_id>/", views.entry_details, name="entry_details"
     ),  # Journal entry details page
@@ -72,11 +80,29 @@ urlpatterns = [
     path(
         "retained-earnings/", views.retained_earnings, name="retained_earnings"
     ),  # Retained earnings page
+    path(
+        "comparative-statements/",
+        views.comparative_statements,
+        name="comparative_statements",
+    ),  # Statements of several months, quarters or years side by side
     # ----------------------- Export Email URLs -------------------------------- #
     path(
         "export_to_pdf/", views.export_to_pdf, name="export_to_pdf"
     ),  # Export to PDF action
+    path(
+        "report-jobs/<int:job_id>/", views.report_job, name="report_job"
+    ),  # Poll a queued PDF report (returns the PDF once rendered)
     path(
         "email_report/", views.email_report, name="email_report"
     ),  # Email report action
+    path(
+        "export/journal-entries/",
+        views.export_journal_entries,
+        name="export_journal_entries",
+    ),  # Journal entries CSV/XLSX export
+    path(
+        "export/general-ledger/",
+        views.export_general_ledger,
+        name="export_general_ledger",
+    ),  # General Ledger CSV/XLSX export
 ]
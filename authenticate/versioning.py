@@ -0,0 +1,46 @@
+"""
+This file contains the version counters used to invalidate cached data built from the books.
+Cached values (like the dashboard ratios) are keyed by the current ledger version, so bumping the
+version after an approval or a Chart of Accounts change makes every older cache entry unreachable at once.
+
+The counters live in Django's cache, so with a shared backend (file or database) every worker sees the same version.
+The CoA version is used the same way by the in-memory Chart of Accounts registry (see registry.py).
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+LEDGER_VERSION_KEY = "ledger_version"
+COA_VERSION_KEY = "coa_version"
+
+
+def get_version(key=LEDGER_VERSION_KEY):
+    """
+    Returns the current value of a version counter.
+    A missing counter (first use, or evicted) starts from the current time so it never repeats an older version.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key=LEDGER_VERSION_KEY):
+    """
+    Moves a version counter forward, invalidating everything cached under the old version.
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_version_on_commit(key=LEDGER_VERSION_KEY):
+    """
+    Bumps a version counter once the current transaction commits, so no request can cache
+    data from before the change under the new version.
+    """
+    transaction.on_commit(lambda: bump_version(key))
@@ -2,22 +2,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.contrib.admin.views.decorators import user_passes_test
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.sites.shortcuts import get_current_site
-from django.template.loader import render_to_string, get_template
+from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.core.mail import EmailMultiAlternatives
 from django.contrib.auth.decorators import login_required
-from django.utils.timezone import now
-from django.core.serializers.json import DjangoJSONEncoder
-from django.core.serializers import serialize
 from django.db.models import Sum, Q
 from django.contrib.auth.hashers import check_password
-from django.http import HttpResponseRedirect, FileResponse, HttpResponse
+from django.http import (
+    Http404,
+    HttpResponseRedirect,
+    FileResponse,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 
 
 # Local imports
@@ -30,23 +37,47 @@ from .forms import (
     ContactForm,
     ContactFormAdmin,
     CommentForm,
+    CoALogFilterForm,
+    JournalFilterForm,
+    JournalImportForm,
 )
 from .models import (
     CustomUser,
     ChartOfAccounts,
     CoAEventLog,
+    GeneralLedger,
     JournalEntry,
-    JournalEntryGroup,
+    ReportJob,
+)
+from .exports import journal_export, ledger_export, stream_csv, write_xlsx
+from .imports import IMPORT_COLUMNS, IMPORT_REJECTS_SHOWN, import_journal
+from .outbox import queue_mail, queue_message
+from .pagination import keyset_paginate
+from .posting import approve_groups, create_journal_entry
+from .profiling import stats_summary
+from .registry import get_registry
+from .reporting import (
+    COMPARATIVE_LAYOUTS,
+    COMPARATIVE_PERIODS,
+    as_date,
+    balance_sheet_context,
+    comparative_context,
+    filter_date_range,
+    filter_journal,
+    income_statement_context,
+    retained_earnings_context,
+    trial_balance_context,
 )
+from .reports import STATEMENT_TEMPLATES, cached_report, request_report
+from .routers import pin_to_primary, read_replica_for, reading_replica, replica_reads
 from .tokens import account_activation_token
+from .versioning import get_version
 
 # Other imports
-import json
-from decimal import Decimal
+import io
+from decimal import Decimal, InvalidOperation
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-from io import BytesIO
-from xhtml2pdf import pisa
 
 # ---------------------------- Login Section  ----------------------------
 
@@ -191,7 +222,7 @@ def activate(request, uidb64, token):
         message = EmailMultiAlternatives(
             mail_subject, mail_content, from_email, [to_email]
         )
-        message.send()
+        queue_message(message)
         messages.success(request, "User account is now active.")
         return redirect("home")
     # outputs an error message if the activation link is invalid
@@ -313,7 +344,9 @@ def home(request):
     """
     # Fetch the pending journal entries
     pending_entries = journal_entry_data(request)
-    ratios = calculate_ratios()  # Call the function to get the ratios
+    # Get the ratios, from the cache when the books have not changed (or else from the read replica)
+    with read_replica_for(request):
+        ratios = cached_ratios()
     context = {
         "ratios": ratios,
         "pending_entries": pending_entries,
@@ -379,7 +412,7 @@ def chart_of_accounts(request):
 
 
                 """
-            send_mail(
+            queue_mail(
                 subject=subject,
                 message=full_message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
@@ -426,32 +459,19 @@ def edit_account(request, account_id):
     """
     Definition that handles editing an account in the Chart of Accounts.
 
-    This one is also handling the JSON serialization of the before and after changes. Which can be viewed in the view_coa_logs.html page.
+    The change is logged by the CoA signals, which store the edited fields. They can be viewed in the view_coa_logs.html page.
     """
 
     # grabs the account from the database
     account = get_object_or_404(ChartOfAccounts, id=account_id)
 
-    # Check if the request method is POST then save the form and log the changes
+    # Check if the request method is POST then save the form (the change is logged by the signals)
     if request.method == "POST":
         form = ChartOfAccountForm(request.POST, instance=account)
         if form.is_valid():
-            before_edit_snapshot = serialize_account(
-                account
-            )  # Serialize before making changes
+            # The CoA signals log the change (only the edited fields are stored), credited to the editor
+            account._log_user = request.user
             form.save()
-            after_edit_snapshot = serialize_account(
-                account
-            )  # Serialize after saving changes
-
-            # Log the change
-            CoAEventLog.objects.create(
-                user=request.user,
-                action="modified",
-                before_change=before_edit_snapshot,
-                after_change=after_edit_snapshot,
-                chart_of_account=account,
-            )
             messages.success(request, "Account updated successfully!")
             return redirect("chart_of_accounts")
     else:
@@ -479,23 +499,12 @@ def deactivate_account(request, account_id):
         )
         return redirect("chart_of_accounts")
 
-    before_change = serialize("json", [account])
-
+    # The change is logged in the CoAEventLog table by the CoA signals
+    account._log_action = "deactivated"
+    account._log_user = request.user
     account.is_active = False
     account.save()
 
-    after_change = serialize("json", [account])
-
-    # Log the change in the CoAEventLog table in the database
-    CoAEventLog.objects.create(
-        user=request.user,
-        action="deactivated",
-        before_change=before_change,
-        after_change=after_change,
-        timestamp=now(),
-        chart_of_account=account,
-    )
-
     return redirect("chart_of_accounts")
 
 
@@ -504,67 +513,89 @@ def activate_account(request, account_id):
     """
     Definition that handles activating an account in the Chart of Accounts.
 
-    This one is also handling the JSON serialization of the before and after changes. Which can be viewed in the view_coa_logs.html page.
+    The change is logged by the CoA signals, which store the changed fields. They can be viewed in the view_coa_logs.html page.
     """
 
     # grabs the account from the database
     account = get_object_or_404(ChartOfAccounts, id=account_id)
-    before_change = serialize("json", [account])
-
+    # The change is logged in the CoAEventLog table by the CoA signals
+    account._log_action = "activated"
+    account._log_user = request.user
     account.is_active = True
     account.save()
 
-    after_change = serialize("json", [account])
-
-    # Log the change in the CoAEventLog table in the database
-    CoAEventLog.objects.create(
-        user=request.user,
-        action="activated",
-        before_change=before_change,
-        after_change=after_change,
-        timestamp=now(),
-        chart_of_account=account,
-    )
-
     return redirect("chart_of_accounts")
 
 
+@replica_reads
 def view_coa_logs(request):
     """
     Definition that handles viewing the Chart of Accounts event logs.
 
-    This one is also handling the JSON serialization of the before and after changes.
-    However, the JSON data is currently not correctly in the view_coa_logs.html page.
-    This one needs to be fixed if we have time!!!!!!!!!!!!!!!!
+    It lists one page of log rows, newest first, filtered by the optional account, action, start_date and end_date
+    parameters and paginated with the "after" and "before" cursors (keyset pagination on timestamp and id).
+    The user and account of every row are fetched in the same query, and the checkpoint snapshots are not
+    loaded at all: each row shows the field-level changes that were stored when it was written.
 
+    With format=json the same page is returned as JSON, with the cursors of the previous and next pages.
     """
-    # Fetch all log changes
-    logs = CoAEventLog.objects.all()
+    filter_form = CoALogFilterForm(request.GET or None)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
 
-    # Serialize the before_change and after_change fields as JSON strings
-    serialized_logs = []
-    for log in logs:
-        before_change = log.before_change
-        after_change = log.after_change
-
-        # Parse JSON strings into Python objects
-        before_change_data = json.loads(before_change) if before_change else None
-        after_change_data = json.loads(after_change) if after_change else None
+    logs = filter_date_range(
+        CoAEventLog.objects.select_related("user", "chart_of_account").defer(
+            "snapshot"
+        ),
+        filters.get("start_date"),
+        filters.get("end_date"),
+        "timestamp__date",
+    )
+    if filters.get("account"):
+        logs = logs.filter(chart_of_account=filters["account"])
+    if filters.get("action"):
+        logs = logs.filter(action=filters["action"])
+
+    page = keyset_paginate(
+        logs,
+        "timestamp",
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        descending=True,
+    )
 
-        serialized_logs.append(
+    if request.GET.get("format") == "json":
+        return JsonResponse(
             {
-                "user": log.user.username,
-                "action": log.action,
-                "timestamp": log.timestamp,
-                "before_change": before_change_data,
-                "after_change": after_change_data,
+                "logs": [
+                    {
+                        "id": log.pk,
+                        "user": log.user.username,
+                        "account": log.chart_of_account.account_name,
+                        "action": log.action,
+                        "timestamp": log.timestamp,
+                        "changes": log.changes,
+                    }
+                    for log in page
+                ],
+                "next": page.next_cursor,
+                "previous": page.previous_cursor,
             }
         )
 
+    # The filters are carried over to the Previous and Next links
+    filter_query = request.GET.copy()
+    filter_query.pop("after", None)
+    filter_query.pop("before", None)
+
     return render(
         request,
         "main_page/chart_of_accounts/view_coa_logs.html",
-        {"logs": serialized_logs},
+        {
+            "logs": page.rows,
+            "page": page,
+            "filter_form": filter_form,
+            "filter_query": filter_query.urlencode(),
+        },
     )
 
 
@@ -584,24 +615,33 @@ def format_change_data(data):
 def journal_entry_page(request):
     """
     Definition that handles the journal entry page.
+
+    A POST approves or rejects a journal entry group. A GET lists one page of journal entries, filtered by the
+    optional status, start_date, end_date and account parameters and paginated with the "after" and "before" cursors
+    (keyset pagination on date and id). The account and group of every row are fetched in the same query, so the page
+    runs a fixed number of queries however many entries there are.
     """
     # Fetch all journal entries
     if request.method == "POST":
         if "approve" in request.POST:
-            group_id = request.POST.get("group_id")
-            print(group_id)
-            entries = JournalEntry.objects.filter(group_id=group_id)
-            add_comment(request, group_id)
-            for entry in entries:
-                entry.approve()
-                # Perform the calculation here after the entry has been approved
-                account = entry.account
-                account.save()
+            # One or more groups can be approved at once in a single transaction
+            group_ids = request.POST.getlist("group_id")
+            for group_id in group_ids:
+                add_comment(request, group_id)
+            try:
+                approve_groups(
+                    group_ids, request.user if request.user.is_authenticated else None
+                )
+                # The approver's reports read from the primary until the replica has the approval
+                pin_to_primary(request.user)
+            except ValidationError as error:
+                # e.g. the entries are dated in a closed fiscal period
+                for message in error.messages:
+                    messages.error(request, message)
 
         # Reject the journal entry
         elif "reject" in request.POST:
             group_id = request.POST.get("group_id")
-            print(group_id)
             entries = JournalEntry.objects.filter(group_id=group_id)
             for entry in entries:
                 add_comment(request, group_id)
@@ -610,140 +650,172 @@ def journal_entry_page(request):
 
         return redirect("journal_entry_page")
 
-    # Fetch all journal entries
+    # Fetch one page of the filtered journal entries
     else:
-        journal_entries = JournalEntry.objects.all()
+        filter_form = JournalFilterForm(request.GET or None)
+        filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+        entries = filter_journal(
+            JournalEntry.objects.select_related("account", "group"), **filters
+        )
+        page = keyset_paginate(
+            entries,
+            "date",
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        )
+
+        # The filters are carried over to the Previous and Next links
+        filter_query = request.GET.copy()
+        filter_query.pop("after", None)
+        filter_query.pop("before", None)
+
         is_admin = request.user.is_staff
         return render(
             request,
             "main_page/journal_entry/journal_entry_page.html",
-            {"journal_entries": journal_entries, "is_admin": is_admin},
+            {
+                "journal_entries": page.rows,
+                "page": page,
+                "filter_form": filter_form,
+                "filter_query": filter_query.urlencode(),
+                "is_admin": is_admin,
+            },
         )
 
 
 # ---------------------------- Journal Entry Section ----------------------------
 
 
+def journal_entry_lines(request):
+    """
+    Reads the lines of a journal entry from the add journal entry form.
+
+    Each line is posted as account<n>, debit<n>, credit<n>, date<n>, comments<n> and attachment<n>, numbered from 1.
+    Rows left completely blank are skipped, so the form can have spare rows.
+
+    Raises:
+        ValidationError: If an amount or a date cannot be read.
+    """
+    numbers = sorted(
+        int(key[len("account") :])
+        for key in request.POST
+        if key.startswith("account") and key[len("account") :].isdigit()
+    )
+    lines = []
+    for number in numbers:
+        account_name = request.POST.get(f"account{number}", "").strip()
+        debit_str = request.POST.get(f"debit{number}", "").strip()
+        credit_str = request.POST.get(f"credit{number}", "").strip()
+        if not account_name and not debit_str and not credit_str:
+            continue
+        try:
+            debit = Decimal(debit_str or 0)
+            credit = Decimal(credit_str or 0)
+        except InvalidOperation:
+            debit = credit = None
+        # Decimal() also reads NaN and Infinity, which would slip past the amount checks
+        if debit is None or not debit.is_finite() or not credit.is_finite():
+            raise ValidationError(
+                f"Line {number} has an invalid debit or credit value."
+            )
+        try:
+            entry_date = parse_date(request.POST.get(f"date{number}") or "")
+        except ValueError:
+            entry_date = None
+        lines.append(
+            {
+                "account_name": account_name,
+                "debit": debit,
+                "credit": credit,
+                "date": entry_date,
+                "comments": request.POST.get(f"comments{number}"),
+                "attachment": request.FILES.get(f"attachment{number}"),
+            }
+        )
+    return lines
+
+
 def add_journal_entry(request):
     """
     Handles the creation of a journal entry in the database.
 
-    This function is called when a POST request is made to the corresponding URL. It extracts the account names, debit and credit values, dates, comments, and attachments from the request.
+    This function is called when a POST request is made to the corresponding URL. It reads any number of lines from the form (see journal_entry_lines),
+    each with an account name, a debit or a credit, a date, comments and an attachment.
 
-    It then performs several checks:
-    - It checks if the debit and credit values were entered. If not, it returns an error message and re-renders the form page.
-    - It checks if the debit and credit values are greater than 0. If not, it returns an error message and re-renders the form page.
-    - It checks if the debit and credit values match. If not, it returns an error message and re-renders the form page.
-    - It checks if the accounts exist in the Chart of Accounts. If not, it returns an error message and re-renders the form page.
-    - It checks if account1 is a normal side left account and if account2 is a normal side right account. If not, it returns an error message and re-renders the form page.
+    The lines are checked and saved by create_journal_entry:
+    - Every line must have an account, a date and either a debit or a credit greater than 0.
+    - The total debits and credits must match.
+    - Every account must exist in the Chart of Accounts (all the names are looked up with one query).
 
-    If all checks pass, it creates a JournalEntryGroup and two JournalEntries, one for each account. The JournalEntries are linked to the JournalEntryGroup and have a status of "Pending".
+    If a check fails, it shows the error message and re-renders the form page. Otherwise it creates a JournalEntryGroup
+    and inserts all the lines with one bulk insert, each with a status of "Pending".
 
     Finally, it sends an email with the details of the journal entry and redirects to the journal entry page.
 
     If the request method is not POST, it simply renders the form page.
     """
-    # Check if the request method is POST then save the form and log the changes in the CoAEventLog table
     if request.method == "POST":
-        account1_name = request.POST.get("account1")
-        debit_str = request.POST.get("debit1", 0)
-        date1 = request.POST.get("date1")
-        comments1 = request.POST.get("comments1")
-        attachment1 = request.FILES.get("attachment1")
-
-        account2_name = request.POST.get("account2")
-        credit_str = request.POST.get("credit2", 0)
-        date2 = request.POST.get("date2")
-        comments2 = request.POST.get("comments2")
-        attachment2 = request.FILES.get("attachment2")
-
-        # Check if debit and credit values were entered
-        if not debit_str or not credit_str:
-            messages.error(request, "Debit and credit values must be entered.")
+        try:
+            entries = create_journal_entry(journal_entry_lines(request))
+        except ValidationError as error:
+            for message in error.messages:
+                messages.error(request, message)
             return render(
                 request, "main_page/journal_entry/add_journal_entry_page.html"
             )
+        journalEntryEmail(request, entries)
+        return redirect("journal_entry_page")
+    else:
+        return render(request, "main_page/journal_entry/add_journal_entry_page.html")
 
-        # Convert debit and credit values to Decimal
-        debit = Decimal(debit_str)
-        credit = Decimal(credit_str)
 
-        # Check if debit and credit values are greater than 0
-        if debit <= 0 or credit <= 0:
-            messages.error(request, "Debit and credit values must be greater than 0.")
-            return render(
-                request, "main_page/journal_entry/add_journal_entry_page.html"
-            )
+@user_passes_test(is_staff_user)
+def import_journal_entries(request):
+    """
+    Handles the bulk import of journal entries from an uploaded CSV file. Only staff users can use it.
 
-        # Check if debit and credit values match
-        if debit != credit:
-            messages.error(request, "The total debit and credit values must match.")
-            return render(
-                request, "main_page/journal_entry/add_journal_entry_page.html"
-            )
+    On POST, the uploaded file is read one row at a time by import_journal: each group of rows is checked against the
+    Chart of Accounts and must balance, and the valid groups are saved as pending entries in batches.
+    The page then shows how many entries were imported and the rejected rows with their reasons.
 
-        try:
-            # Check if accounts exist in the Chart of Accounts
-            account1 = ChartOfAccounts.objects.get(account_name=account1_name)
-            account2 = ChartOfAccounts.objects.get(account_name=account2_name)
-
-            # Check if account1 is a normal side left account
-            if account1.normal_side != "Left":
-                messages.error(request, "Account 1 must be a normal side left account.")
-                return render(
-                    request, "main_page/journal_entry/add_journal_entry_page.html"
-                )
-            elif account2.normal_side != "Right":
-                messages.error(
-                    request, "Account 2 must be a normal side right account."
+    On GET, it renders the upload form with the expected columns.
+    """
+    report = None
+    if request.method == "POST":
+        form = JournalImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            upload.seek(0)
+            csv_file = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            try:
+                report = import_journal(csv_file)
+            except (ValidationError, UnicodeDecodeError) as error:
+                message = (
+                    " ".join(error.messages)
+                    if isinstance(error, ValidationError)
+                    else "The file must be a UTF-8 encoded CSV file."
                 )
-                return render(
-                    request, "main_page/journal_entry/add_journal_entry_page.html"
+                messages.error(request, message)
+            else:
+                messages.success(
+                    request,
+                    f"Imported {report.groups} journal entries ({report.lines} lines).",
                 )
-
-            # Create a JournalEntryGroup
-            group = JournalEntryGroup.objects.create()
-
-            # Create the Journal Entries
-            JournalEntry.objects.create(
-                account=account1,
-                debit=debit,
-                date=date1,
-                comments=comments1,
-                attachment=attachment1,
-                status="Pending",
-                group=group,
-            )
-            JournalEntry.objects.create(
-                account=account2,
-                credit=credit,
-                date=date2,
-                comments=comments2,
-                attachment=attachment2,
-                status="Pending",
-                group=group,
-            )
-
-        except ChartOfAccounts.DoesNotExist:
-            # Handle the case where the account does not exist
-            messages.error(
-                request, "One or more accounts do not exist in the Chart of Accounts."
-            )
-            return render(
-                request, "main_page/journal_entry/add_journal_entry_page.html"
-            )
-        journalEntryEmail(
-            request,
-            account1,
-            debit,
-            comments1,
-            account2,
-            credit,
-            comments2,
-        )
-        return redirect("journal_entry_page")
+            finally:
+                csv_file.detach()
     else:
-        return render(request, "main_page/journal_entry/add_journal_entry_page.html")
+        form = JournalImportForm()
+
+    return render(
+        request,
+        "main_page/journal_entry/import_journal_entries.html",
+        {
+            "form": form,
+            "columns": IMPORT_COLUMNS,
+            "report": report,
+            "rejected": report.rejected[:IMPORT_REJECTS_SHOWN] if report else [],
+        },
+    )
 
 
 def add_comment(request, group_id):
@@ -757,35 +829,34 @@ def add_comment(request, group_id):
 # ---------------------------- Ledger Section ----------------------------
 
 
+@replica_reads
 def ledger(request, account_id):
     """
     Handles the display of a ledger for a specific account.
 
-    This function is called when a GET request is made to the corresponding URL with an account_id parameter. It retrieves the account with the given ID from the Chart of Accounts. If no such account exists, it returns a 404 error.
+    This function is called when a GET request is made to the corresponding URL with an account_id parameter. It looks up the account with the given ID in the Chart of Accounts registry (no query). If no such account exists, it returns a 404 error.
 
-    It then retrieves all journal entries for the account, ordered by date.
+    It then retrieves one page of the account's General Ledger rows, ordered by date. The running balance of each row is stored on the row when the journal entry is approved, so nothing is recalculated here.
 
-    It calculates the balance for each journal entry by adding the debit amount and subtracting the credit amount from the current balance. The initial balance is the account's initial balance.
+    The page is selected with the "after" or "before" cursor from the request (keyset pagination on date and id), so every page is one indexed query however long the account's history is.
 
-    Finally, it renders the ledger page with the journal entries and the account as context variables.
+    Finally, it renders the ledger page with the ledger rows, the page cursors and the account as context variables.
     """
-    account = get_object_or_404(ChartOfAccounts, id=account_id)
-
-    # Filter journal entries by account and order by date
-    journal_entries = JournalEntry.objects.filter(account=account).order_by("date")
+    account = get_registry().by_id.get(account_id)
+    if account is None:
+        raise Http404("No account matches the given query.")
 
-    initial_balance = account.initial_balance
-    current_balance = initial_balance
-
-    for entry in journal_entries:
-        # Calculate the balance for each entry
-        entry.balance = current_balance + entry.debit - entry.credit
-        current_balance = entry.balance
+    page = keyset_paginate(
+        GeneralLedger.objects.filter(account_id=account_id),
+        "date_of_journal_entry",
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+    )
 
     return render(
         request,
         "main_page/ledger/ledger.html",
-        {"journal_entries": journal_entries, "account": account},
+        {"journal_entries": page.rows, "page": page, "account": account},
     )
 
 
@@ -805,84 +876,83 @@ def entry_details(request, entry_id):
 # ---------------------------- Forms Section ----------------------------
 
 
+def statement_dates(request):
+    """
+    Returns the start_date and end_date GET parameters of a statement page as dates (None when left empty),
+    or None if either is not a valid date, after adding the error to the messages shown on the page.
+    """
+    try:
+        start_date = as_date(request.GET.get("start_date"))
+        end_date = as_date(request.GET.get("end_date"))
+    except ValidationError as error:
+        for message in error.messages:
+            messages.error(request, message)
+        return None
+    return start_date, end_date
+
+
+@replica_reads
 def trial_balance(request):
     """
     Handles the trial balance page.
 
     This function is called when a GET or POST request is made to the corresponding URL.
 
-    For a GET request, it retrieves the start_date and end_date parameters from the request. It then retrieves all journal entries that fall within the specified date range, or all journal entries if no date range is specified.
+    For a GET request, it retrieves the start_date and end_date parameters from the request. It then sums the daily account balance rollup over the specified date range, or over all dates if no date range is specified.
 
-    It groups the journal entries by account and calculates the total debit and credit for each account. It also calculates the total debit and credit for all accounts.
+    This gives the total debit and credit for each account. It also calculates the total debit and credit for all accounts.
 
     It then renders the trial balance page with the accounts, total debit, total credit, and a contact form as context variables.
 
     For a POST request, it validates the contact form and sends an email with the trial balance data if the form is valid. It then redirects to the trial balance page.
     """
     formSelection = ContactForm
-    start_date = request.GET.get("start_date")
-    end_date = request.GET.get("end_date")
+    dates = statement_dates(request)
+    if dates is None:
+        return HttpResponseRedirect(request.path_info)
+    start_date, end_date = dates
 
-    if start_date and end_date:
-        journal_entries = JournalEntry.objects.filter(
-            Q(date__gte=start_date) & Q(date__lte=end_date)
-        )
-    elif start_date:
-        journal_entries = JournalEntry.objects.filter(date__gte=start_date)
-    elif end_date:
-        journal_entries = JournalEntry.objects.filter(date__lte=end_date)
-    else:
-        journal_entries = JournalEntry.objects.all()
+    # Per-account debit and credit totals and the grand totals, from the daily balance rollup
+    context = trial_balance_context(start_date, end_date)
+    context["form"] = formSelection
 
-    # Group by account and aggregate debit and credit values
-    accounts = journal_entries.values("account__account_name").annotate(
-        total_debit=Sum("debit"), total_credit=Sum("credit")
-    )
-
-    # Calculate total debit and credit
-    total_debit = sum(account["total_debit"] for account in accounts)
-    total_credit = sum(account["total_credit"] for account in accounts)
-
-    context = {
-        "accounts": accounts,
-        "total_debit": total_debit,
-        "total_credit": total_credit,
-        "form": formSelection,
-    }
     if request.method == "POST":
         form = ContactForm(request.POST)
         if form.is_valid():
             email = form.cleaned_data.get("email")
             subject = form.cleaned_data.get("subject")
-            template = get_template("main_page/forms/trial_balance.html")
-            html = template.render(context)
-            # body = json.loads(html)
             full_message = f"""
                     Received message below from {email}, {subject}
                     ________________________
                     {context}
                     """
-            msg = EmailMultiAlternatives(
-                subject, full_message, email, ["myin1@students.kennesaw.edu"]
+            # The PDF is rendered by the render_reports worker, which then queues the email
+            request_report(
+                "trial_balance",
+                start_date,
+                end_date,
+                user=request.user if request.user.is_authenticated else None,
+                email_from=email,
+                email_to=["myin1@students.kennesaw.edu"],
+                email_subject=subject,
+                email_body=full_message,
             )
-
-            msg.attach(html, "application/pdf")
-            msg.send()
             messages.success(request, "Email sent!")
             return HttpResponseRedirect(request.path_info)
 
     return render(request, "main_page/forms/trial_balance.html", context)
 
 
+@replica_reads
 def income_statement(request):
     """
     Handles the Income Statement page.
 
     This function is called when a GET or POST request is made to the corresponding URL.
 
-    For a GET request, it retrieves the start_date and end_date parameters from the request. It then retrieves all journal entries that fall within the specified date range, or all journal entries if no date range is specified.
+    For a GET request, it retrieves the start_date and end_date parameters from the request. It then sums the daily account balance rollup over the specified date range, or over all dates if no date range is specified.
 
-    It groups the journal entries by account and calculates the total debit and credit for each account. It then filters the accounts into revenue and expense accounts based on predefined account names.
+    This gives the total debit and credit for each account. It then filters the accounts into revenue and expense accounts based on predefined account names.
 
     It calculates the total revenue, total expenses, and net income, and renders the income statement page with these values, the revenue and expense accounts, the start and end dates, and a contact form as context variables.
 
@@ -896,98 +966,51 @@ def income_statement(request):
     """
     # Define the form to use based on the user's role (admin or user)
     formSelection = ContactForm
-    start_date = request.GET.get("start_date")
-    end_date = request.GET.get("end_date")
-
-    if start_date and end_date:
-        journal_entries = JournalEntry.objects.filter(
-            date__range=[start_date, end_date]
-        )
-    elif start_date:
-        journal_entries = JournalEntry.objects.filter(date__gte=start_date)
-    elif end_date:
-        journal_entries = JournalEntry.objects.filter(date__lte=end_date)
-    else:
-        journal_entries = JournalEntry.objects.all()
+    dates = statement_dates(request)
+    if dates is None:
+        return HttpResponseRedirect(request.path_info)
+    start_date, end_date = dates
 
-    # Group by account and calculate net income
-    accounts = journal_entries.values("account__account_name").annotate(
-        total_debit=Sum("debit"), total_credit=Sum("credit")
-    )
-
-    # Define revenue and expense account names
-    revenue_account_names = ["Unearned Revenue"]
-    expense_account_names = ["Accrued Expense", "Prepaid Expenses"]
-
-    # Filter accounts based on revenue and expense account names
-    revenue_accounts = [
-        account
-        for account in accounts
-        if account["account__account_name"] in revenue_account_names
-    ]
-    expense_accounts = [
-        account
-        for account in accounts
-        if account["account__account_name"] in expense_account_names
-    ]
-
-    # Calculate total revenue
-    total_revenue = sum(
-        account["total_credit"] - account["total_debit"] for account in revenue_accounts
-    )
-
-    # Calculate total expenses
-    total_expenses = sum(
-        account["total_debit"] - account["total_credit"] for account in expense_accounts
-    )
-
-    # Calculate net income
-    net_income = total_revenue - total_expenses
-
-    context = {
-        "revenue_accounts": revenue_accounts,
-        "expense_accounts": expense_accounts,
-        "total_revenue": total_revenue,
-        "total_expenses": total_expenses,
-        "net_income": net_income,
-        "start_date": start_date,
-        "end_date": end_date,
-        "form": formSelection,
-    }
+    # Revenue and expense accounts, their totals, and the net income, from the daily balance rollup
+    context = income_statement_context(start_date, end_date)
+    context["form"] = formSelection
 
     if request.method == "POST":
         form = ContactForm(request.POST)
         if form.is_valid():
             email = form.cleaned_data.get("email")
             subject = form.cleaned_data.get("subject")
-            template = get_template("main_page/forms/income_statement.html")
-            html = template.render(context)
-            # body = json.loads(html)
             full_message = f"""
                     Received message below from {email}, {subject}
                     ________________________
                     {context}
                     """
-            msg = EmailMultiAlternatives(
-                subject, full_message, email, ["myin1@students.kennesaw.edu"]
+            # The PDF is rendered by the render_reports worker, which then queues the email
+            request_report(
+                "income_statement",
+                start_date,
+                end_date,
+                user=request.user if request.user.is_authenticated else None,
+                email_from=email,
+                email_to=["myin1@students.kennesaw.edu"],
+                email_subject=subject,
+                email_body=full_message,
             )
-
-            msg.attach(html, "application/pdf")
-            msg.send()
             messages.success(request, "Email sent!")
             return HttpResponseRedirect(request.path_info)
     return render(request, "main_page/forms/income_statement.html", context)
 
 
+@replica_reads
 def balance_sheet(request):
     """
     Handles the Balance Sheet page.
 
     This function is called when a GET or POST request is made to the corresponding URL.
 
-    For a GET request, it retrieves the start_date and end_date parameters from the request. It then retrieves all journal entries that fall within the specified date range, or all journal entries if no date range is specified.
+    For a GET request, it retrieves the start_date and end_date parameters from the request. It then sums the daily account balance rollup over the specified date range, or over all dates if no date range is specified.
 
-    It groups the journal entries by account and calculates the total debit and credit for each account. It then filters the accounts into assets, liabilities, and equity accounts based on predefined account categories.
+    This gives the total debit and credit for each account, fetched with one query and split into assets, liabilities, and equity accounts based on predefined account categories.
 
     It calculates the total assets, total liabilities, total equity, and total liabilities and equity, and renders the balance sheet page with these values, the asset, liability, and equity accounts, the start and end dates, and a contact form as context variables.
 
@@ -995,59 +1018,14 @@ def balance_sheet(request):
     """
     # Define the form to use based on the user's role (admin or user)
     formSelection = ContactForm
-    start_date = request.GET.get("start_date")
-    end_date = request.GET.get("end_date")
+    dates = statement_dates(request)
+    if dates is None:
+        return HttpResponseRedirect(request.path_info)
+    start_date, end_date = dates
 
-    # Filter journal entries based on start and end dates if provided or get all journal entries if not provided
-    if start_date and end_date:
-        journal_entries = JournalEntry.objects.filter(
-            Q(date__gte=start_date) & Q(date__lte=end_date)
-        )
-    elif start_date:
-        journal_entries = JournalEntry.objects.filter(date__gte=start_date)
-    elif end_date:
-        journal_entries = JournalEntry.objects.filter(date__lte=end_date)
-    else:
-        journal_entries = JournalEntry.objects.all()
-
-    # Define categories
-    assets_categories = ["Assets"]
-    liabilities_categories = ["Liabilities"]
-    equity_categories = ["Equity"]
-
-    # Filter journal entries based on categories
-    asset_entries = journal_entries.filter(
-        account__account_category__in=assets_categories
-    )
-    liability_entries = journal_entries.filter(
-        account__account_category__in=liabilities_categories
-    )
-    equity_entries = journal_entries.filter(
-        account__account_category__in=equity_categories
-    )
-
-    # Calculate totals
-    total_assets = sum(entry.debit - entry.credit for entry in asset_entries)
-    total_liabilities = sum(entry.credit - entry.debit for entry in liability_entries)
-    total_equity = sum(entry.credit - entry.debit for entry in equity_entries)
-
-    # Total Liabilities and Stockholders' Equity
-    total_liabilities_and_equity = total_liabilities + total_equity
-
-    # Define context for the template to render the balance sheet page with the data calculated above
-    context = {
-        "asset_entries": asset_entries,
-        "liability_entries": liability_entries,
-        "equity_entries": equity_entries,
-        "total_assets": total_assets,
-        "total_liabilities": total_liabilities,
-        "total_equity": total_equity,
-        "total_liabilities_and_equity": total_liabilities_and_equity,
-        "start_date": start_date,
-        "end_date": end_date,
-        "journal_entries": journal_entries,
-        "form": formSelection,
-    }
+    # Asset, liability, and equity accounts and their totals, from the daily balance rollup
+    context = balance_sheet_context(start_date, end_date)
+    context["form"] = formSelection
 
     # Handle POST request to send email with balance sheet data if form is valid and redirect to balance sheet page after sending email successfully
     if request.method == "POST":
@@ -1055,35 +1033,38 @@ def balance_sheet(request):
         if form.is_valid():
             email = form.cleaned_data.get("email")
             subject = form.cleaned_data.get("subject")
-            template = get_template("main_page/forms/balance_Sheet.html")
-            html = template.render(context)
-            # body = json.loads(html)
             full_message = f"""
                     Received message below from {email}, {subject}
                     ________________________
                     {context}
                     """
-            msg = EmailMultiAlternatives(
-                subject, full_message, email, ["myin1@students.kennesaw.edu"]
+            # The PDF is rendered by the render_reports worker, which then queues the email
+            request_report(
+                "balance_sheet",
+                start_date,
+                end_date,
+                user=request.user if request.user.is_authenticated else None,
+                email_from=email,
+                email_to=["myin1@students.kennesaw.edu"],
+                email_subject=subject,
+                email_body=full_message,
             )
-
-            msg.attach(html, "application/pdf")
-            msg.send()
             messages.success(request, "Email sent!")
             return HttpResponseRedirect(request.path_info)
 
     return render(request, "main_page/forms/balance_sheet.html", context)
 
 
+@replica_reads
 def retained_earnings(request):
     """
     Handles the Retained Earnings page.
 
     This function is called when a GET or POST request is made to the corresponding URL.
 
-    For a GET request, it retrieves the start_date and end_date parameters from the request. It then retrieves all journal entries that fall within the specified date range, or all journal entries if no date range is specified.
+    For a GET request, it retrieves the start_date and end_date parameters from the request. It then sums the daily account balance rollup over the specified date range, or over all dates if no date range is specified.
 
-    It filters the journal entries into revenue, expense, and dividends entries based on predefined account names.
+    It totals the revenue, expense, and dividends accounts (based on predefined account names) in a single conditional aggregation query.
 
     It calculates the total revenue, total expenses, total dividends, net income, and retained earnings, and renders the retained earnings page with these values, the start and end dates, and a contact form as context variables.
 
@@ -1097,123 +1078,235 @@ def retained_earnings(request):
     """
 
     # Define the form to use based on the user's role (admin or user)
-    start_date = request.GET.get("start_date")
-    end_date = request.GET.get("end_date")
+    dates = statement_dates(request)
+    if dates is None:
+        return HttpResponseRedirect(request.path_info)
+    start_date, end_date = dates
 
-    if start_date and end_date:
-        journal_entries = JournalEntry.objects.filter(
-            Q(date__gte=start_date) & Q(date__lte=end_date)
-        )
-    elif start_date:
-        journal_entries = JournalEntry.objects.filter(date__gte=start_date)
-    elif end_date:
-        journal_entries = JournalEntry.objects.filter(date__lte=end_date)
-    else:
-        journal_entries = JournalEntry.objects.all()
-
-    # Define accounts
-    revenue_accounts = ["Interest Revenue", "Service Revenue"]
-    expense_accounts = ["Supplies Expense", "Salaries Expense", "Utilities Expense"]
-    dividends_account = ["Dividends"]
-
-    # Filter journal entries based on accounts
-    revenue_entries = journal_entries.filter(account__account_name__in=revenue_accounts)
-    expense_entries = journal_entries.filter(account__account_name__in=expense_accounts)
-    dividends_entries = journal_entries.filter(
-        account__account_name__in=dividends_account
-    )
-
-    # Calculate totals
-    total_revenue = sum(entry.credit for entry in revenue_entries)
-    total_expenses = sum(entry.debit for entry in expense_entries)
-    total_dividends = sum(entry.debit for entry in dividends_entries)
-
-    # Calculate net income and retained earnings
-    net_income = total_revenue - total_expenses
-    retained_earnings = net_income - total_dividends
+    # Net income, dividends, and retained earnings, from the daily balance rollup
+    context = retained_earnings_context(start_date, end_date)
 
     formSelection = ContactForm
-
-    context = {
-        "net_income": net_income,
-        "total_dividends": total_dividends,
-        "retained_earnings": retained_earnings,
-        "start_date": start_date,
-        "end_date": end_date,
-        "form": formSelection,
-    }
+    context["form"] = formSelection
 
     if request.method == "POST":
         form = ContactForm(request.POST)
         if form.is_valid():
             email = form.cleaned_data.get("email")
             subject = form.cleaned_data.get("subject")
-            template = get_template("main_page/forms/retained_earnings.html")
-            html = template.render(context)
-            # body = json.loads(html)
             full_message = f"""
                     Received message below from {email}, {subject}
                     ________________________
                     {context}
                     """
-            msg = EmailMultiAlternatives(
-                subject, full_message, email, ["myin1@students.kennesaw.edu"]
+            # The PDF is rendered by the render_reports worker, which then queues the email
+            request_report(
+                "retained_earnings",
+                start_date,
+                end_date,
+                user=request.user if request.user.is_authenticated else None,
+                email_from=email,
+                email_to=["myin1@students.kennesaw.edu"],
+                email_subject=subject,
+                email_body=full_message,
             )
-
-            msg.attach(html, "application/pdf")
-            msg.send()
             messages.success(request, "Email sent!")
             return HttpResponseRedirect(request.path_info)
     return render(request, "main_page/forms/retained_earnings.html", context)
 
 
+@replica_reads
+def comparative_statements(request):
+    """
+    Handles the Comparative Statements page.
+
+    This function is called when a GET request is made to the corresponding URL.
+
+    It retrieves the statement, period (month, quarter or year), start_date and end_date parameters from the request. Without them, it shows the income statement of each month of the current year to date.
+
+    The statement is built for every period of the date range side by side, with all the columns summed from the daily account balance rollup in one grouped query. If a parameter is invalid, the error is shown instead of the report.
+
+    Parameters:
+        request (HttpRequest): The HTTP request sent to the server.
+
+    Returns:
+        HttpResponse: The HTTP response to send to the client.
+    """
+    today = timezone.now().date()
+    statement = request.GET.get("statement") or "income_statement"
+    period = request.GET.get("period") or "month"
+    start_date = (
+        request.GET.get("start_date") or today.replace(month=1, day=1).isoformat()
+    )
+    end_date = request.GET.get("end_date") or today.isoformat()
+
+    context = {
+        "statements": [(key, layout[0]) for key, layout in COMPARATIVE_LAYOUTS.items()],
+        "periods": list(COMPARATIVE_PERIODS),
+        "statement": statement,
+        "period": period,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    try:
+        context["report"] = comparative_context(statement, start_date, end_date, period)
+    except ValidationError as error:
+        for message in error.messages:
+            messages.error(request, message)
+    return render(request, "main_page/forms/comparative_statements.html", context)
+
+
 def export_to_pdf(request):
     """
-    Handles the export of data to a PDF file.
+    Handles the export of a financial statement to a PDF file.
 
     This function is called when a GET request is made to the corresponding URL.
 
-    It retrieves the start_date and end_date parameters from the request and loads the PDF template.
+    It retrieves the statement, start_date and end_date parameters from the request. If the PDF for this statement and period has already been rendered for the current ledger version, it is returned straight from the report cache.
+
+    Otherwise a report job is queued for the render_reports worker, and a JSON response with a status of 202 is returned with the URL to poll for the PDF.
+
+    Parameters:
+        request (HttpRequest): The HTTP request sent to the server.
+
+    Returns:
+        FileResponse: The PDF file to send to the client.
+        JsonResponse: The queued report job, or an error message if the parameters are invalid.
+    """
+    statement = request.GET.get("statement", "trial_balance")
+    if statement not in STATEMENT_TEMPLATES:
+        return JsonResponse({"error": "Unknown statement."}, status=400)
+    try:
+        start_date = as_date(request.GET.get("start_date"))
+        end_date = as_date(request.GET.get("end_date"))
+    except ValidationError:
+        return JsonResponse({"error": "Invalid date."}, status=400)
+
+    path = cached_report(statement, start_date, end_date)
+    if path:
+        return FileResponse(
+            open(path, "rb"), as_attachment=True, filename=f"{statement}.pdf"
+        )
+
+    job = request_report(
+        statement,
+        start_date,
+        end_date,
+        user=request.user if request.user.is_authenticated else None,
+    )
+    return report_job_response(job)
 
-    It defines the context for the template with the start_date and end_date, and renders the template with this context.
 
-    It creates a BytesIO object and generates the PDF using the pisa library. If there is an error during this process, it returns a HTTP response with a status of 500 and an error message.
+def report_job(request, job_id):
+    """
+    Handles the polling of a queued report job.
 
-    If the PDF is generated successfully, it returns the PDF as a file response with the filename "report.pdf".
+    It returns the rendered PDF once the job is done, or a JSON response with the status of the job while it is pending or running, or after it failed.
 
     Parameters:
         request (HttpRequest): The HTTP request sent to the server.
+        job_id (int): The id of the report job.
 
     Returns:
         FileResponse: The PDF file to send to the client.
-        HttpResponse: An error message if there was an error generating the PDF.
+        JsonResponse: The status of the report job.
     """
+    job = get_object_or_404(ReportJob, pk=job_id)
+    if job.status == "Done" and not job.email_to:
+        try:
+            return FileResponse(
+                open(job.file_path, "rb"),
+                as_attachment=True,
+                filename=f"{job.statement}.pdf",
+            )
+        except FileNotFoundError:
+            pass
+    return report_job_response(job)
 
-    print("export_to_pdf view was called")  # This will print to the console
-    start_date = request.GET.get("start_date")
-    end_date = request.GET.get("end_date")
 
-    # Load the template
-    template = get_template("main_page/pdf_template.html")
+def report_job_response(job):
+    """
+    Returns the JSON status of a report job. Jobs that are still waiting answer with a status of 202, failed jobs with 500.
+    """
+    status = {"Failed": 500, "Done": 200}.get(job.status, 202)
+    return JsonResponse(
+        {
+            "job": job.pk,
+            "status": job.status,
+            "error": job.error,
+            "url": reverse("report_job", args=[job.pk]),
+        },
+        status=status,
+    )
 
-    # Define the context for the template
-    context = {
-        "start_date": start_date,
-        "end_date": end_date,
-    }
 
-    # Render the template with the context
-    html = template.render(context)
+def export_filters(request):
+    """
+    Returns the start_date, end_date and account GET parameters of an export, parsed.
 
-    # Create a BytesIO object and generate the PDF
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("ISO-8859-1")), result)
+    Raises:
+        ValidationError: If a date is not a valid date or the account is not an account id.
+    """
+    account = request.GET.get("account") or None
+    if account is not None and not account.isdigit():
+        raise ValidationError(f"{account} is not a valid account id.")
+    return (
+        as_date(request.GET.get("start_date")),
+        as_date(request.GET.get("end_date")),
+        account and int(account),
+    )
 
-    # If there was an error, return a HTTP response
-    if not pdf.err:
-        return FileResponse(result, as_attachment=True, filename="report.pdf")
-    else:
-        return HttpResponse("Error generating PDF", status=500)
+
+@login_required
+def export_journal_entries(request):
+    """
+    Exports the journal entries as CSV (streamed) or XLSX.
+
+    The optional GET parameters start_date, end_date, account (the account id) and status filter the rows, and format picks "csv" (the default) or "xlsx".
+    Invalid filters are answered with a status of 400.
+    """
+    try:
+        start_date, end_date, account = export_filters(request)
+    except ValidationError as error:
+        return HttpResponse(" ".join(error.messages), status=400)
+    header, rows = journal_export(
+        start_date, end_date, account, request.GET.get("status")
+    )
+    return export_response(request, header, rows, "journal_entries")
+
+
+@login_required
+def export_general_ledger(request):
+    """
+    Exports the General Ledger as CSV (streamed) or XLSX.
+
+    The optional GET parameters start_date, end_date and account (the account id) filter the rows, and format picks "csv" (the default) or "xlsx".
+    Invalid filters are answered with a status of 400.
+    """
+    try:
+        start_date, end_date, account = export_filters(request)
+    except ValidationError as error:
+        return HttpResponse(" ".join(error.messages), status=400)
+    header, rows = ledger_export(start_date, end_date, account)
+    return export_response(request, header, rows, "general_ledger")
+
+
+def export_response(request, header, rows, name):
+    """
+    Builds the download response for an export. CSV is streamed row by row; XLSX is written row by row to a temporary file first.
+    """
+    if request.GET.get("format") == "xlsx":
+        try:
+            output = write_xlsx(header, rows, sheet_name=name)
+        except ImportError:
+            return HttpResponse("XLSX export needs the XlsxWriter package.", status=501)
+        return FileResponse(output, as_attachment=True, filename=f"{name}.xlsx")
+
+    return StreamingHttpResponse(
+        stream_csv(header, rows),
+        content_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{name}.csv"'},
+    )
 
 
 # ---------------------------- Home Page Data Analytics  ----------------------------
@@ -1223,7 +1316,7 @@ def calculate_ratios():
     """
     Calculates various financial ratios based on Chart of Accounts data.
 
-    This function retrieves all accounts from the Chart of Accounts and initializes variables for ratio calculations. It assigns values to these variables based on the account name or category.
+    This function retrieves the balance of every account from the Chart of Accounts and initializes variables for ratio calculations. It assigns values to these variables based on the ratio lines the account is classified on (see AccountClassification), or else its category.
 
     It then calculates various financial ratios, including liquidity ratios, leverage financial ratios, efficiency ratios, and profitability ratios. Each ratio is rounded to two decimal places and assigned a color based on its value.
 
@@ -1238,58 +1331,69 @@ def calculate_ratios():
     YELLOW = "#ffc107"
     RED = "#dc3545"
 
-    # Retrieve all accounts
-    accounts = ChartOfAccounts.objects.all()
+    # Retrieve the balance of every account; the names and categories come from the Chart of Accounts registry
+    registry = get_registry()
+    if settings.REPORTING_ENGINE == "numpy":
+        from .vectorized import account_balances
+
+        balances = account_balances().items()
+    else:
+        balances = ChartOfAccounts.objects.values_list("id", "balance")
+    accounts = [
+        (registry.by_id[account_id], balance)
+        for account_id, balance in balances
+        if account_id in registry.by_id
+    ]
+
+    # The ratio inputs taken from the accounts classified on each ratio line (see AccountClassification)
+    ratio_lines = {
+        "ratio_cash": "cash",
+        "ratio_operating_cash": "operating_cash_flow",
+        "ratio_total_debt_service": "total_debt_service",
+        "ratio_operating_income": "operating_income",
+        "ratio_interest_expense": "interest_expenses",
+        "ratio_net_sales": "net_sales",
+        "ratio_cost_of_goods_sold": "cost_of_goods_sold",
+        "ratio_gross_profit": "gross_profit",
+        "ratio_net_income": "net_income",
+        "ratio_inventory": "inventory",
+    }
+    inputs = dict.fromkeys(ratio_lines.values(), 0)
 
     # Initialize variables for ratio calculations
     current_assets = 0
     current_liabilities = 0
-    cash = 0
-    operating_cash_flow = 0
     total_liabilities = 0
     total_assets = 0
     shareholder_equity = 0
-    operating_income = 0
-    interest_expenses = 0
-    total_debt_service = 0
-    net_sales = 0
-    cost_of_goods_sold = 0
-    gross_profit = 0
-    net_income = 0
-    inventory = 0
     net_credit_sales = 0
     average_accounts_receivable = 0
 
-    # Assign values based on account name or category
-    for account in accounts:
-        if account.account_name == "Cash":
-            cash = round(account.balance, 2)
-        elif account.account_name == "Operating Cash":
-            operating_cash_flow = round(account.balance, 2)
-        elif account.account_name == "Total Debt Service":
-            total_debt_service = round(account.balance, 2)
-        elif account.account_name == "Operating Income":
-            operating_income = round(account.balance, 2)
-        elif account.account_name == "Interest Expense":
-            interest_expenses = round(account.balance, 2)
-        elif account.account_name == "Net Sales":
-            net_sales = round(account.balance, 2)
-        elif account.account_name == "Cost of Goods Sold":
-            cost_of_goods_sold = round(account.balance, 2)
-        elif account.account_name == "Gross Profit":
-            gross_profit = round(account.balance, 2)
-        elif account.account_name == "Net Income":
-            net_income = round(account.balance, 2)
-        elif account.account_name == "Inventory":
-            inventory = round(account.balance, 2)
+    # Assign values based on the account's ratio lines, or else its category
+    for account, balance in accounts:
+        lines = [line for line in account.lines if line in ratio_lines]
+        if lines:
+            for line in lines:
+                inputs[ratio_lines[line]] += round(balance, 2)
         elif account.account_category == "Assets":
-            current_assets += round(account.balance, 2)
-            total_assets += round(account.balance, 2)
+            current_assets += round(balance, 2)
+            total_assets += round(balance, 2)
         elif account.account_category == "Liabilities":
-            current_liabilities += round(account.balance, 2)
-            total_liabilities += round(account.balance, 2)
+            current_liabilities += round(balance, 2)
+            total_liabilities += round(balance, 2)
         elif account.account_category == "Equity":
-            shareholder_equity += round(account.balance, 2)
+            shareholder_equity += round(balance, 2)
+
+    cash = inputs["cash"]
+    operating_cash_flow = inputs["operating_cash_flow"]
+    total_debt_service = inputs["total_debt_service"]
+    operating_income = inputs["operating_income"]
+    interest_expenses = inputs["interest_expenses"]
+    net_sales = inputs["net_sales"]
+    cost_of_goods_sold = inputs["cost_of_goods_sold"]
+    gross_profit = inputs["gross_profit"]
+    net_income = inputs["net_income"]
+    inventory = inputs["inventory"]
 
     # Calculate ratios and round to two decimal places
     ratios = {}
@@ -1473,19 +1577,60 @@ def calculate_ratios():
     return ratios
 
 
+def cached_ratios():
+    """
+    Returns the financial ratios, calculating them only when the books have changed.
+
+    The ratios are cached under the current ledger version, which is bumped whenever an entry is approved or an account in the Chart of Accounts changes. A cache hit costs two cache lookups and no database queries.
+
+    Ratios calculated on the read replica may miss a change it has not received yet, so they are only kept for REPLICA_LAG_SECONDS,
+    and apart from the ones calculated on the primary, so a user pinned to the primary after an approval never gets them.
+    """
+    key = f"financial_ratios:{get_version()}"
+    if reading_replica():
+        key += ":replica"
+    ratios = cache.get(key)
+    if ratios is None:
+        ratios = calculate_ratios()
+        timeout = settings.RATIOS_CACHE_TIMEOUT
+        if reading_replica():
+            timeout = min(timeout, settings.REPLICA_LAG_SECONDS)
+        cache.set(key, ratios, timeout)
+    return ratios
+
+
+@user_passes_test(is_staff_user)
+def profiling_stats(request):
+    """
+    Returns the request profiler's totals for this process as JSON, averaged per view and slowest first.
+
+    Only staff users can see it. The totals are empty unless PROFILING_ENABLED is set.
+    """
+    return JsonResponse(
+        {
+            "enabled": settings.PROFILING_ENABLED,
+            "sample_rate": settings.PROFILING_SAMPLE_RATE,
+            "views": stats_summary(),
+        }
+    )
+
+
 def journal_entry_data(request):
     """
     Retrieves and returns all pending journal entries.
 
     This function is called when a GET request is made to the corresponding URL.
 
-    It retrieves all JournalEntry objects from the database that have a status of "Pending". It then prints these entries to the console for debugging purposes.
+    It retrieves all JournalEntry objects from the database that have a status of "Pending", ordered by date so the partial index on pending entries can serve the query. The account of each entry is fetched in the same query.
 
     Finally, it returns the QuerySet of pending entries. This function is typically used as a helper function in other views to get the data needed for rendering templates.
     """
-    # Retrieve pending journal entries
-    pending_entries = JournalEntry.objects.filter(status="Pending")
-    print(pending_entries)
+    # Retrieve pending journal entries, with the account shown next to each one
+    pending_entries = (
+        JournalEntry.objects.filter(status="Pending")
+        .select_related("account")
+        .order_by("date", "id")
+    )
     # Return the QuerySet directly
     return pending_entries
 
@@ -1501,7 +1646,7 @@ def activationEmail(request, user, username):
 
     It then creates an email with a subject and a message. The message is rendered from the "authenticate/activationAccount.html" template with the username, user email, domain, user ID, token, and protocol as context variables.
 
-    Finally, it sends the email to the specified address.
+    Finally, it queues the email for the specified address; the send_queued_email worker delivers it.
     """
     # Generate an account activation token and construct the activation link
     mail_subject = "A new user has registered to your site."
@@ -1516,11 +1661,11 @@ def activationEmail(request, user, username):
             "protcol": "https" if request.is_secure() else "http",
         },
     )
-    # Construct the email message and send it to the specified address using the EmailMultiAlternatives class
+    # Construct the email message and queue it for the specified address using the EmailMultiAlternatives class
     email = EmailMultiAlternatives(
         mail_subject, message, to=["jochoa2@students.kennesaw.edu"]
     )
-    email.send()
+    queue_message(email)
 
 
 def email(request, email, subject, message):
@@ -1548,7 +1693,7 @@ def email(request, email, subject, message):
 
                 {message}
                 """
-            send_mail(
+            queue_mail(
                 subject="Received contact form submission",
                 message=full_message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
@@ -1578,12 +1723,11 @@ def send_email_view(request, user_id):
             # Send an email to the user
             subject = form.cleaned_data["subject"]
             message = form.cleaned_data["message"]
-            send_mail(
+            queue_mail(
                 subject,
                 message,
                 settings.EMAIL_HOST_USER,
                 [user.email],
-                fail_silently=False,
             )
             # Save the email notification
             messages.success(request, "Email sent!")
@@ -1594,41 +1738,38 @@ def send_email_view(request, user_id):
     return render(request, "admin_custom/send_email.html", {"form": form, "user": user})
 
 
-def journalEntryEmail(
-    request,
-    account1Name,
-    acct1debit,
-    account1,
-    account2Name,
-    acct2credit,
-    account2,
-):
+def journalEntryEmail(request, entries):
     """
     Sends an email notification when a new journal entry is posted.
 
-    This function is called when a new journal entry is created. It constructs a subject and a message for the email. The message is rendered from the "main_page/journal_entry/journalEntryEmail.html" template with the account names, debit and credit amounts, accounts, and domain as context variables.
+    This function is called when a new journal entry is created. It constructs a subject and a message for the email. The message is rendered from the "main_page/journal_entry/journalEntryEmail.html" template with the lines of the entry (account names, debit and credit amounts and comments) and domain as context variables.
 
-    It then creates an email with the subject and message, and sends the email to a specified recipient.
+    It then creates an email with the subject and message, and queues the email for a specified recipient.
     """
     # Construct the email subject and message using the render_to_string function
     mail_subject = "A new journal entry has been posted to your site."
+    registry = get_registry()
+    lines = [
+        {
+            "account_name": registry.by_id[entry.account_id].account_name,
+            "debit": entry.debit,
+            "credit": entry.credit,
+            "comments": entry.comments,
+        }
+        for entry in entries
+    ]
     message = render_to_string(
         "main_page/journal_entry/journalEntryEmail.html",
         {
-            "account1Name": account1Name,
-            "account1Debit": acct1debit,
-            "account1": account1,
-            "account2Name": account2Name,
-            "account2Credit": acct2credit,
-            "account2": account2,
+            "lines": lines,
             "domain": get_current_site(request).domain,
         },
     )
-    # Create an email message using the EmailMultiAlternatives class and send it to the specified address
+    # Create an email message using the EmailMultiAlternatives class and queue it for the specified address
     email = EmailMultiAlternatives(
         mail_subject, message, to=["myin1@students.kennesaw.edu"]
     )
-    email.send()
+    queue_message(email)
 
 
 def email_report(request):
@@ -1667,64 +1808,5 @@ def email_report(request):
                 subject, full_message, email, ["myin1@students.kennesaw.edu"]
             )
             msg.attach_alternative("document.pdf", message, "application/pdf")
-            msg.send()
+            queue_message(msg)
     return HttpResponse("Email sent successfully!")
-
-
-# ---------------------------- Account Serialization ----------------------------
-
-
-def serialize_account(instance):
-    """
-    Serializes an account instance into JSON format.
-
-    This function takes an account instance as input and constructs a dictionary with the account's fields. It converts the DateTimeField to ISO format and the DecimalFields to float. It also fetches the related user instance and includes the user's ID and username in the serialized data.
-
-    Finally, it serializes the dictionary into JSON format using Django's JSON encoder and returns the serialized JSON.
-
-    Parameters:
-        instance (Account): The account instance to serialize.
-
-    Returns:
-        str: The serialized account data in JSON format.
-    """
-    # Fetch related user instance
-    user = instance.user_id
-
-    # Convert DateTimeField to ISO format
-    date_time_account_added = (
-        instance.date_time_account_added.isoformat()
-        if instance.date_time_account_added
-        else None
-    )
-
-    # Construct a dictionary of fields to serialize
-    serialized_data = {
-        "account_name": instance.account_name,
-        "account_number": instance.account_number,
-        "account_description": instance.account_description,
-        "is_active": instance.is_active,
-        "normal_side": instance.normal_side,
-        "account_category": instance.account_category,
-        "account_subcategory": instance.account_subcategory,
-        "initial_balance": (
-            float(instance.initial_balance)
-            if instance.initial_balance is not None
-            else None
-        ),
-        "debit": float(instance.debit) if instance.debit is not None else None,
-        "credit": float(instance.credit) if instance.credit is not None else None,
-        "balance": float(instance.balance) if instance.balance is not None else None,
-        "date_time_account_added": date_time_account_added,
-        "user_id": {
-            "id": user.id,
-            "username": user.username,
-        },
-        "order": instance.order,
-        "statement": instance.statement,
-        "comment": instance.comment,
-    }
-
-    # Serialize data using Django's JSON encoder
-    serialized_json = json.dumps(serialized_data, cls=DjangoJSONEncoder)
-    return serialized_json
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Opt-in request profiler, removes itself unless PROFILING_ENABLED is set (see below)
+    "authenticate.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -57,6 +59,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Request profiling (authenticate/profiling.py). Off by default. When on, PROFILING_SAMPLE_RATE of the requests
+# (0 to 1) are profiled, appended as JSON lines to PROFILING_LOG_FILE (if set) and summed up on /profiling/stats/.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() in ("true", "1")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0.1))
+PROFILING_LOG_FILE = os.getenv("PROFILING_LOG_FILE", "")
+
 ROOT_URLCONF = "mysite.urls"
 
 AUTH_USER_MODEL = "authenticate.CustomUser"
@@ -97,6 +105,59 @@ import dj_database_url
 
 DATABASES = {"default": dj_database_url.config(default=os.environ.get("DATABASE_URL"))}
 
+# Read replica (authenticate/routers.py). When REPLICA_DATABASE_URL is set, the reporting views read the books from it,
+# except for a user who approved entries in the last REPLICA_LAG_SECONDS, whose reads stay on the primary.
+# The tests use the primary test database for the replica as well.
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL", "")
+if REPLICA_DATABASE_URL:
+    DATABASES["replica"] = dj_database_url.parse(REPLICA_DATABASE_URL)
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+REPLICA_LAG_SECONDS = int(os.getenv("REPLICA_LAG_SECONDS", 10))
+DATABASE_ROUTERS = ["authenticate.routers.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Local memory is the default. Set CACHE_BACKEND to "file" or "db" to share the cache (and the
+# ledger version used to invalidate it) between gunicorn workers. The "db" backend needs
+# "python manage.py createcachetable" once.
+
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "ledgerlogic"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.path.join(BASE_DIR, "cache"),
+    ),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "ledgerlogic_cache"),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[
+    os.getenv("CACHE_BACKEND", "locmem")
+]
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_DEFAULT_LOCATION),
+    }
+}
+
+# How long (in seconds) the dashboard ratios are kept; they are also invalidated on every posting
+RATIOS_CACHE_TIMEOUT = int(os.getenv("RATIOS_CACHE_TIMEOUT", 3600))
+
+# How the financial statements and the dashboard ratios are summed: "orm" reads the daily balance rollup with
+# database queries (authenticate/reporting.py), "numpy" keeps the approved journal in memory as NumPy arrays
+# (authenticate/vectorized.py). Both give the same numbers; see the benchmark_reporting_engines command.
+REPORTING_ENGINE = os.getenv("REPORTING_ENGINE", "orm")
+
+# Folder of the rendered statement PDFs (see authenticate/reports.py and the render_reports command)
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(BASE_DIR, "report_cache"))
+
+# Seconds a rendered PDF is kept in the report cache before the render_reports worker removes it
+REPORT_CACHE_MAX_AGE = int(os.getenv("REPORT_CACHE_MAX_AGE", 86400))
+
+# Seconds a report job may stay Running before it is taken for a dead worker's and queued again
+REPORT_JOB_TIMEOUT = int(os.getenv("REPORT_JOB_TIMEOUT", 600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators